@@ -6,8 +6,18 @@ import os
 from datetime import datetime
 from colorama import init, Fore, Style
 from dotenv import load_dotenv
-from openai import OpenAI
+from utils.llm_client import get_openai_client
 from utils.prompt_instructions import get_air_quality_system_prompt
+from utils.aqi_utils import build_basic_alert, get_aqi_category
+from utils.notifications import enqueue_alert_notifications
+from utils.alert_pipeline import run_alert_pipeline, format_stage_timings
+from utils.area_summary import generate_area_alerts
+from utils.snapshots import update_manifest
+from utils.view_model import write_view_model
+from utils.alert_store import index_alerts, index_readings
+from utils.bm25_index import index_pipeline_outputs
+from utils.map_artifacts import render_map_artifact
+from utils.alert_stream import ProgressiveAlertFile, stream_alert_completion, is_streaming_enabled
 
 # Initialize
 load_dotenv()
@@ -16,6 +26,8 @@ init()  # Initialize colorama
 # Constants
 API_TOKEN = os.getenv("AQI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL")
+ALERT_STREAMING = is_streaming_enabled(os.getenv("ALERT_STREAMING"))
+ALERT_AGGREGATION = os.getenv("ALERT_AGGREGATION", "").strip().lower()  # '', 'city', 'district' or 'grid'
 
 API_ENDPOINTS = {
     'search': "https://api.waqi.info/v2/map/bounds",
@@ -31,15 +43,6 @@ BANGKOK_BOUNDS = {
     'latlng': [13.4963, 100.3270, 13.9876, 100.9378]  # [south lat, west lng, north lat, east lng]
 }
 
-AQI_THRESHOLDS = {
-    'Good': (0, 50),
-    'Moderate': (51, 100),
-    'Unhealthy for Sensitive Groups': (101, 150),
-    'Unhealthy': (151, 200),
-    'Very Unhealthy': (201, 300),
-    'Hazardous': (301, float('inf'))
-}
-
 def ensure_directories():
     """Create necessary output directories if they don't exist"""
     for directory in DIRECTORIES.values():
@@ -47,25 +50,6 @@ def ensure_directories():
             os.makedirs(directory)
             print(f"{Fore.GREEN}Created directory: {directory}{Style.RESET_ALL}")
 
-def get_aqi_category(aqi):
-    """Determine AQI category based on value"""
-    if aqi is None:
-        return "Unknown"
-    for category, (min_val, max_val) in AQI_THRESHOLDS.items():
-        if min_val <= aqi <= max_val:
-            return category
-    return "Unknown"
-
-def get_alert_level(aqi):
-    """Determine alert level based on AQI value"""
-    if aqi is None:
-        return "unknown"
-    if aqi <= 100:
-        return "info"
-    elif aqi <= 150:
-        return "warning"
-    return "danger"
-
 def make_api_request(url, params):
     """Make API request with error handling"""
     try:
@@ -145,35 +129,24 @@ def process_station_data(raw_data, station_info):
         print(f"{Fore.RED}Error processing data for station {station_info.get('uid')}: {e}{Style.RESET_ALL}")
         return None
 
-def generate_alerts(records):
-    """Generate alerts for stations with AQI >= 50"""
-    # Filter records with valid AQI >= 50
-    alert_worthy_records = []
-    for record in records:
-        try:
-            aqi_value = record.get('aqi')
-            if aqi_value and str(aqi_value).strip() != '-':  # Check for '-' string
-                aqi_float = float(aqi_value)
-                if aqi_float >= 50:
-                    record['aqi'] = aqi_float  # Store as float
-                    alert_worthy_records.append(record)
-        except (ValueError, TypeError):
-            continue
-    
-    # Sort by AQI value in descending order
-    alert_worthy_records = sorted(
-        alert_worthy_records, 
-        key=lambda x: float(x['aqi']), 
-        reverse=True
-    )
-    
-    if not alert_worthy_records:
-        print(f"{Fore.YELLOW}No stations found with valid AQI >= 50{Style.RESET_ALL}")
-        return []
+def generate_alerts(alert_worthy_records, sink=None, client=None):
+    """Generate alerts for the stations kept by filter_alert_worthy()
 
+    With ALERT_STREAMING enabled the reply is parsed as it streams and each
+    completed alert is pushed to `sink` straight away. With ALERT_AGGREGATION
+    set, the model writes advice per area and it is fanned out to the stations.
+    """
     print(f"{Fore.YELLOW}Generating alerts for {len(alert_worthy_records)} stations with AQI >= 50{Style.RESET_ALL}")
     
-    client = OpenAI()
+    client = client or get_openai_client()
+    
+    if ALERT_AGGREGATION:
+        try:
+            return generate_area_alerts(client, OPENAI_MODEL, alert_worthy_records, level=ALERT_AGGREGATION,
+                                        sink=sink, streaming=ALERT_STREAMING)
+        except Exception as e:
+            print(f"{Fore.RED}Error generating area alerts with OpenAI: {e}{Style.RESET_ALL}")
+            return generate_basic_alerts(alert_worthy_records)
     
     aqi_data = {
         'query_timestamp': get_rounded_hour_timestamp(),
@@ -183,14 +156,23 @@ def generate_alerts(records):
         'data': alert_worthy_records
     }
     
+    messages = [
+        {"role": "system", "content": get_air_quality_system_prompt()},
+        {"role": "user", "content": f"Generate air quality alerts from this data:\n{json.dumps(aqi_data, ensure_ascii=False, indent=2)}"}
+    ]
+    
     try:
+        if ALERT_STREAMING:
+            alerts, timings = stream_alert_completion(client, OPENAI_MODEL, messages, sink=sink)
+            if timings['time_to_first_alert'] is not None:
+                print(f"{Fore.GREEN}First alert after {timings['time_to_first_alert']:.2f}s "
+                      f"(full reply {timings['total']:.2f}s){Style.RESET_ALL}")
+            return alerts.get('alerts', [])
+        
         response = client.chat.completions.create(
             model=OPENAI_MODEL,
             response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": get_air_quality_system_prompt()},
-                {"role": "user", "content": f"Generate air quality alerts from this data:\n{json.dumps(aqi_data, ensure_ascii=False, indent=2)}"}
-            ],
+            messages=messages,
             temperature=0.3
         )
         alerts = json.loads(response.choices[0].message.content)
@@ -206,66 +188,9 @@ def generate_basic_alerts(records):
     for record in records:
         if record['aqi'] is None:
             continue
-            
-        aqi = float(record['aqi'])
-        aqi_category = get_aqi_category(aqi)
-        alert_level = get_alert_level(aqi)
-        
-        alerts.append({
-            'timestamp': record['timestamp'],
-            'station_name': record['station_name'],
-            'city': record['city'],
-            'aqi': aqi,
-            'pm25_level': record['pm25'],
-            'pm25_type': 'Normal' if record['pm25'] <= 50 else 'Above Threshold',
-            'pm10_level': record['pm10'],
-            'pm10_type': 'Normal' if record['pm10'] <= 100 else 'Above Threshold',
-            'temperature_level': record['temperature'],
-            'temperature_type': 'Normal',
-            'humidity_level': record['humidity'],
-            'humidity_type': 'Normal',
-            'latitude': record['latitude'],
-            'longitude': record['longitude'],
-            'aqi_level': aqi_category,
-            'alert_type': f'Air Quality {alert_level.title()}',
-            'health_implications': get_health_implications(aqi_category),
-            'recommended_actions': get_recommended_actions(aqi_category)
-        })
+        alerts.append(build_basic_alert(record))
     return alerts
 
-def get_health_implications(aqi_category):
-    """Get health implications based on AQI category"""
-    implications = {
-        'Moderate': 'Air quality is acceptable; however, some pollutants may affect very sensitive individuals.',
-        'Unhealthy for Sensitive Groups': 'Members of sensitive groups may experience health effects. General public is less likely to be affected.',
-        'Unhealthy': 'Everyone may begin to experience health effects; members of sensitive groups may experience more serious health effects.',
-        'Very Unhealthy': 'Health alert: The risk of health effects is increased for everyone.',
-        'Hazardous': 'Health warning of emergency conditions: everyone is more likely to be affected.'
-    }
-    return implications.get(aqi_category, 'Air quality is generally good.')
-
-def get_recommended_actions(aqi_category):
-    """Get recommended actions based on AQI category"""
-    base_actions = [
-        {'action': '😷 Wear masks when outdoors', 'priority': 'Immediate'},
-        {'action': '🪟 Keep windows closed during peak pollution', 'priority': 'Preventive'}
-    ]
-    
-    if aqi_category in ['Unhealthy', 'Very Unhealthy', 'Hazardous']:
-        return [
-            {'action': '🚫 Avoid outdoor activities', 'priority': 'Immediate'},
-            {'action': '🏠 Stay indoors with air purifiers', 'priority': 'Immediate'},
-            {'action': '😷 Wear N95 masks if outdoors', 'priority': 'Immediate'},
-            {'action': '⚕️ Monitor health symptoms', 'priority': 'Immediate'}
-        ]
-    elif aqi_category == 'Unhealthy for Sensitive Groups':
-        return [
-            {'action': '🌳 Sensitive groups should limit outdoor exposure', 'priority': 'Immediate'},
-            {'action': '🌬️ Use air purifiers indoors', 'priority': 'Preventive'}
-        ] + base_actions
-    else:
-        return base_actions
-
 def get_rounded_hour_timestamp():
     """Get current timestamp rounded down to the nearest hour"""
     rounded = datetime.now().replace(minute=0, second=0, microsecond=0)
@@ -282,6 +207,15 @@ def save_json_file(data, filepath):
         json.dump(data, f, indent=2, ensure_ascii=False)
     print(f"{Fore.GREEN}Data saved to '{filepath}'{Style.RESET_ALL}")
 
+def render_hourly_map(hourly_data, hourly_file):
+    """Render the dashboard map for this snapshot once; returns the artifact path, or None if it failed"""
+    try:
+        return render_map_artifact(hourly_file, hourly_data)
+    except Exception as e:
+        # The dashboard renders it on first load instead
+        print(f"{Fore.YELLOW}Could not prerender the map: {e}{Style.RESET_ALL}")
+        return None
+
 def print_summary_statistics(df):
     """Print summary statistics of the collected data"""
     print(f"\n{Fore.CYAN}Summary Statistics:{Style.RESET_ALL}")
@@ -363,28 +297,52 @@ def main():
             if record:
                 records.append(record)
     
-    # Generate and sort alerts
-    alerts = generate_alerts(records)
-    alerts = sorted(alerts, key=lambda x: x.get('aqi', 0), reverse=True)
-    
     # Get timestamps
     timestamp = get_rounded_hour_timestamp()
     filename_timestamp = get_filename_timestamp()
+    alerts_file = os.path.join(DIRECTORIES['alerts'], f'bangkok_alerts_{filename_timestamp}.json')
+    hourly_file = os.path.join(DIRECTORIES['hourly'], f'bangkok_aqi_data_{filename_timestamp}.json')
     
-    # Save files
-    save_json_file({
+    # Save raw readings and index them for the chat assistant's data tools
+    hourly_data = {
         'query_timestamp': timestamp,
         'city': 'Bangkok',
         'total_stations': len(stations),
         'total_data_points': len(records),
         'data': records
-    }, os.path.join(DIRECTORIES['hourly'], f'bangkok_aqi_data_{filename_timestamp}.json'))
+    }
+    save_json_file(hourly_data, hourly_file)
+    index_readings(hourly_data, hourly_file)
+    artifacts = {'hourly': hourly_file}
+    map_file = render_hourly_map(hourly_data, hourly_file)
+    if map_file:
+        artifacts['map'] = map_file
+    update_manifest(**artifacts)
+    
+    # Filter, generate, rank and write alerts in one pass; when streaming, the
+    # alert file fills in as alerts arrive before the final atomic write
+    result = run_alert_pipeline(
+        load=lambda: (records, 'waqi-api'),
+        generate=lambda alert_worthy, sink: {'alerts': generate_alerts(alert_worthy, sink=sink)},
+        output_file=alerts_file,
+        metadata={'timestamp': timestamp},
+        sink_factory=(lambda path: ProgressiveAlertFile(path, {'timestamp': timestamp})) if ALERT_STREAMING else None
+    )
+    alerts = result.alerts
+    # Precompute what the dashboard renders so page cost does not grow with alert count
+    view_model_file = write_view_model(alerts, alerts_file)
+    index_alerts(alerts, alerts_file)
+    index_pipeline_outputs(alerts, alerts_file, records, hourly_file)
+    update_manifest(alerts=alerts_file, view_model=view_model_file)
+    if not result.alert_worthy:
+        print(f"{Fore.YELLOW}No stations found with valid AQI >= 50{Style.RESET_ALL}")
+    print(f"{Fore.GREEN}Alerts saved to '{alerts_file}'{Style.RESET_ALL}")
+    print(f"{Fore.CYAN}Alert stage timings: {format_stage_timings(result.timings)}{Style.RESET_ALL}")
     
-    save_json_file({
-        'timestamp': timestamp,
-        'total_alerts': len(alerts),
-        'alerts': alerts
-    }, os.path.join(DIRECTORIES['alerts'], f'bangkok_alerts_{filename_timestamp}.json'))
+    # Queue outbound notifications; delivery happens in script/03-send-notifications.py
+    queued = enqueue_alert_notifications(alerts)
+    if queued:
+        print(f"{Fore.GREEN}Queued {queued} alert notifications{Style.RESET_ALL}")
     
     # Generate and save statistics
     df = pd.DataFrame(records)
@@ -1,16 +1,18 @@
 import streamlit as st
 import warnings
-import base64
 import json
 import os
-from openai import OpenAI
-from datetime import datetime
 from pathlib import Path
-from st_aggrid import AgGrid, GridOptionsBuilder
 
-from utils.message_utils import message_func
-from utils.openai_utils import generate_response
+from utils.message_utils import display_message, display_stored_chat, get_chat_session_id, new_message, streaming_message
+from utils.chat_store import get_chat_store
+from utils.openai_utils import answer_question
 from utils.custom_css_banner import get_chat_assistant_banner
+from utils.snapshots import get_latest_artifact, load_json_snapshot
+from utils.view_model import load_view_model
+from utils.alert_store import get_alert_store
+from utils.live_refresh import live_fragment, memo_for_version
+from utils.render_cache import image_data_uri, render_timer, show_render_profile, versioned_fragment
 
 # Set page config
 st.set_page_config(page_title="💡 Command Center", page_icon="", layout="wide")
@@ -60,53 +62,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def get_latest_alert_file():
-    """Get the most recent alert file from the output/alerts directory"""
-    alerts_dir = Path("output/alerts")
-    # Change the pattern to match your actual file naming
-    alert_files = list(alerts_dir.glob("bangkok_alerts_*.json"))
-    
-    if not alert_files:
+    """Get the most recent alert file, as named by the snapshot manifest"""
+    latest_file = get_latest_artifact('alerts')
+    if not latest_file:
         print("No alert files found matching pattern 'bangkok_alerts_*.json'")
-        # List all files in the directory for debugging
-        all_files = list(alerts_dir.glob("*.json"))
-        if all_files:
-            print(f"Files found in directory: {[f.name for f in all_files]}")
         return None
-    
-    latest_file = max(alert_files, key=lambda x: x.stat().st_mtime)
-    print(f"Found latest alert file: {latest_file}")
-    return latest_file
+    return Path(latest_file)
 
-def load_alerts():
-    """Load the latest alert data"""
-    latest_file = get_latest_alert_file()
-    if not latest_file:
-        st.warning("No alert files found in output/alerts directory")
-        return None
-    
-    print(f"Loading alerts from: {latest_file}")  # Debug print
-    
+def load_dashboard_view(version):
+    """Load the precomputed dashboard view model, re-read only when the data version changes"""
     try:
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            print(f"Loaded data structure: {list(data.keys())}")  # Debug print
-            
-            if data and "alerts" in data and data["alerts"]:
-                alerts = data["alerts"]
-                if alerts:
-                    first_alert = alerts[0]
-                    
-                    # Handle empty city name
-                    if not first_alert.get("city"):
-                        first_alert["city"] = first_alert.get("station_name", "Bangkok")
-                    
-                    print(f"Found {len(alerts)} alerts")
-                    print(f"First alert AQI: {first_alert.get('aqi')}")
-                    return first_alert
-            else:
-                st.warning("No alerts found in the data file")
-                print(f"Alert data structure: {data}")
-                return None
+        view_model = memo_for_version("view_model", version, load_view_model)
     except Exception as e:
         st.error(f"Error loading alerts: {str(e)}")
         print(f"Exception details: {str(e)}")
@@ -114,87 +80,86 @@ def load_alerts():
         print(f"Traceback: {traceback.format_exc()}")
         return None
 
-# Load and display alert information
-alert_data = load_alerts()
-if alert_data:
+    if not view_model:
+        st.warning("No alert files found in output/alerts directory")
+        return None
+    if not view_model.get("headline"):
+        st.warning("No alerts found in the data file")
+        return None
+    return view_model
+
+@versioned_fragment
+def render_headline_card(icon, title, body):
+    """HTML for the alert or health implications card"""
+    return f"""
+    <div style="background: linear-gradient(to bottom, rgba(255, 75, 75, 0.1), rgba(255, 75, 75, 0.05)); 
+                padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); height: 100%;">
+        <div style="display: flex; align-items: center; margin-bottom: 0.8rem;">
+            <span style="font-size: 1.4rem; margin-right: 0.5rem;">{icon}</span>
+            <span style="font-weight: 700; color: #FF4B4B; font-size: 1.2rem;">{title}</span>
+        </div>
+        <p style="font-size: 0.9rem; color: #666; margin: 0; line-height: 1.5;">
+            {body}
+        </p>
+    </div>
+    """
+
+@versioned_fragment
+def render_metric_card(value, label, color, unit=""):
+    """HTML for one metric card"""
+    return f"""
+    <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center;">
+        <div style="font-size: 2.5rem; font-weight: 800; color: {color}; margin-bottom: 0.5rem;">{value}{unit}</div>
+        <div style="color: #333; font-size: 1rem; font-weight: 600;">{label}</div>
+    </div>
+    """
+
+@versioned_fragment
+def render_action_card(action, priority, color, icon):
+    """HTML for one recommended action, styled by its precomputed priority color"""
+    return f"""
+    <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: flex; justify-content: space-between; align-items: center; height: 100%; margin-bottom: 1rem;">
+        <div style="flex-grow: 1;">
+            <div style="display: flex; align-items: center; gap: 0.5rem;">
+                <span style="color: {color}; font-size: 1.4rem;">{icon}</span>
+                <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action}</span>
+            </div>
+        </div>
+        <div style="background: white; color: #333; border: 1px solid {color}; padding: 0.5rem 1.2rem; border-radius: 6px; font-size: 0.9rem; margin-left: 1rem; font-weight: 500;">
+            {priority}
+        </div>
+    </div>
+    """
+
+def render_alerts_section(view_model, version):
+    """Headline alert, metric cards and required actions; card HTML is built once per data version"""
+    alert_data = view_model["headline"]
+
     # Alert and Health Implications in two columns
     col_alert, col_health = st.columns([1, 1])
     
     # Alert Card (Left Column)
     with col_alert:
-        location_name = alert_data.get("city") or alert_data.get("station_name", "Bangkok")
-        alert_type = alert_data.get("alert_type", "Air Quality Warning")
-        
-        st.markdown(f"""
-        <div style="background: linear-gradient(to bottom, rgba(255, 75, 75, 0.1), rgba(255, 75, 75, 0.05)); 
-                    padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); height: 100%;">
-            <div style="display: flex; align-items: center; margin-bottom: 0.8rem;">
-                <span style="font-size: 1.4rem; margin-right: 0.5rem;">⚠️</span>
-                <span style="font-weight: 700; color: #FF4B4B; font-size: 1.2rem;">{alert_type}</span>
-            </div>
-            <p style="font-size: 0.9rem; color: #666; margin: 0; line-height: 1.5;">
-                <span style="margin-right: 0.5rem;">📍</span>
-                {location_name}
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
+        location = f'<span style="margin-right: 0.5rem;">📍</span>\n            {alert_data["location_name"]}'
+        st.markdown(render_headline_card(version, "⚠️", alert_data["alert_type"], location), unsafe_allow_html=True)
 
     # Health Implications Card (Right Column)
     with col_health:
-        st.markdown("""
-        <div style="background: linear-gradient(to bottom, rgba(255, 75, 75, 0.1), rgba(255, 75, 75, 0.05)); 
-                    padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); height: 100%;">
-            <div style="display: flex; align-items: center; margin-bottom: 0.8rem;">
-                <span style="font-size: 1.4rem; margin-right: 0.5rem;">🛡</span>
-                <span style="font-weight: 700; color: #FF4B4B; font-size: 1.2rem;">Health Implications</span>
-            </div>
-            <p style="font-size: 0.9rem; color: #666; margin: 0; line-height: 1.5;">
-                {health}
-            </p>
-        </div>
-        """.format(health=alert_data["health_implications"]), unsafe_allow_html=True)
+        st.markdown(render_headline_card(version, "🛡", "Health Implications", alert_data["health_implications"]), unsafe_allow_html=True)
 
     # Add some spacing
     st.markdown("<br>", unsafe_allow_html=True)
 
     # Create columns for the metric cards
-    col1, col2, col3, col4 = st.columns(4)
-    
-    # AQI Card
-    with col1:
-        st.markdown("""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center;">
-            <div style="font-size: 2.5rem; font-weight: 800; color: #FF4B4B; margin-bottom: 0.5rem;">{aqi}</div>
-            <div style="color: #333; font-size: 1rem; font-weight: 600;">Current AQI</div>
-        </div>
-        """.format(aqi=alert_data["aqi"]), unsafe_allow_html=True)
-
-    # PM2.5 Card
-    with col2:
-        st.markdown("""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center;">
-            <div style="font-size: 2.5rem; font-weight: 800; color: #FF8B3D; margin-bottom: 0.5rem;">{pm25} <span style="font-size: 1rem;">μg/m³</span></div>
-            <div style="color: #333; font-size: 1rem; font-weight: 600;">PM2.5 Level</div>
-        </div>
-        """.format(pm25=alert_data["pm25_level"]), unsafe_allow_html=True)
-
-    # Temperature Card
-    with col3:
-        st.markdown("""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center;">
-            <div style="font-size: 2.5rem; font-weight: 800; color: #3B82F6; margin-bottom: 0.5rem;">{temp}°C</div>
-            <div style="color: #333; font-size: 1rem; font-weight: 600;">Temperature</div>
-        </div>
-        """.format(temp=alert_data["temperature_level"]), unsafe_allow_html=True)
-
-    # Humidity Card
-    with col4:
-        st.markdown("""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center;">
-            <div style="font-size: 2.5rem; font-weight: 800; color: #3B82F6; margin-bottom: 0.5rem;">{humidity}%</div>
-            <div style="color: #333; font-size: 1rem; font-weight: 600;">Humidity</div>
-        </div>
-        """.format(humidity=alert_data["humidity_level"]), unsafe_allow_html=True)
+    metric_cards = [
+        (alert_data["aqi"], "Current AQI", "#FF4B4B", ""),
+        (alert_data["pm25_level"], "PM2.5 Level", "#FF8B3D", ' <span style="font-size: 1rem;">μg/m³</span>'),
+        (alert_data["temperature_level"], "Temperature", "#3B82F6", "°C"),
+        (alert_data["humidity_level"], "Humidity", "#3B82F6", "%")
+    ]
+    for column, card in zip(st.columns(4), metric_cards):
+        with column:
+            st.markdown(render_metric_card(version, *card), unsafe_allow_html=True)
 
     # Add some spacing
     st.markdown("<br>", unsafe_allow_html=True)
@@ -210,302 +175,228 @@ if alert_data:
             <span style="color: #FF4B4B; font-size: 0.9rem; font-weight: 500;">{} Critical Actions</span>
         </div>
     </div>
-    """.format(len(alert_data["recommended_actions"])), unsafe_allow_html=True)
-
-    # Priority color mapping
-    priority_colors = {
-        "Immediate": {"bg": "rgba(255, 75, 75, 0.05)", "text": "#FF4B4B", "icon": ""},
-        "Preventive": {"bg": "rgba(255, 193, 7, 0.05)", "text": "#FFC107", "icon": ""},
-        "Long-Term": {"bg": "rgba(59, 130, 246, 0.05)", "text": "#3B82F6", "icon": ""}
-    }
-
-    # First row
-    col1, col2 = st.columns(2)
-    
-    # First row - First card
-    with col1:
-        action_data = alert_data["recommended_actions"][0]
-        priority_style = priority_colors.get(action_data["priority"], priority_colors["Immediate"])
-        st.markdown(f"""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: flex; justify-content: space-between; align-items: center; height: 100%; margin-bottom: 1rem;">
-            <div style="flex-grow: 1;">
-                <div style="display: flex; align-items: center; gap: 0.5rem;">
-                    <span style="color: {priority_style['text']}; font-size: 1.4rem;">{priority_style['icon']}</span>
-                    <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action_data["action"]}</span>
-                </div>
-            </div>
-            <div style="background: white; color: #333; border: 1px solid {priority_style['text']}; padding: 0.5rem 1.2rem; border-radius: 6px; font-size: 0.9rem; margin-left: 1rem; font-weight: 500;">
-                {action_data["priority"]}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    # First row - Second card
-    with col2:
-        action_data = alert_data["recommended_actions"][1]
-        priority_style = priority_colors.get(action_data["priority"], priority_colors["Immediate"])
-        st.markdown(f"""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: flex; justify-content: space-between; align-items: center; height: 100%; margin-bottom: 1rem;">
-            <div style="flex-grow: 1;">
-                <div style="display: flex; align-items: center; gap: 0.5rem;">
-                    <span style="color: {priority_style['text']}; font-size: 1.4rem;">{priority_style['icon']}</span>
-                    <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action_data["action"]}</span>
-                </div>
-            </div>
-            <div style="background: white; color: #333; border: 1px solid {priority_style['text']}; padding: 0.5rem 1.2rem; border-radius: 6px; font-size: 0.9rem; margin-left: 1rem; font-weight: 500;">
-                {action_data["priority"]}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    """.format(alert_data["action_count"]), unsafe_allow_html=True)
 
-    # Second row
-    col3, col4 = st.columns(2)
-    
-    # Second row - First card
-    with col3:
-        action_data = alert_data["recommended_actions"][2]
-        priority_style = priority_colors.get(action_data["priority"], priority_colors["Immediate"])
-        st.markdown(f"""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: flex; justify-content: space-between; align-items: center; height: 100%; margin-bottom: 1rem;">
-            <div style="flex-grow: 1;">
-                <div style="display: flex; align-items: center; gap: 0.5rem;">
-                    <span style="color: {priority_style['text']}; font-size: 1.4rem;">{priority_style['icon']}</span>
-                    <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action_data["action"]}</span>
-                </div>
-            </div>
-            <div style="background: white; color: #333; border: 1px solid {priority_style['text']}; padding: 0.5rem 1.2rem; border-radius: 6px; font-size: 0.9rem; margin-left: 1rem; font-weight: 500;">
-                {action_data["priority"]}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-
-    # Second row - Second card
-    with col4:
-        action_data = alert_data["recommended_actions"][3]
-        priority_style = priority_colors.get(action_data["priority"], priority_colors["Immediate"])
-        st.markdown(f"""
-        <div style="background: white; padding: 1rem; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); display: flex; justify-content: space-between; align-items: center; height: 100%; margin-bottom: 1rem;">
-            <div style="flex-grow: 1;">
-                <div style="display: flex; align-items: center; gap: 0.5rem;">
-                    <span style="color: {priority_style['text']}; font-size: 1.4rem;">{priority_style['icon']}</span>
-                    <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action_data["action"]}</span>
-                </div>
-            </div>
-            <div style="background: white; color: #333; border: 1px solid {priority_style['text']}; padding: 0.5rem 1.2rem; border-radius: 6px; font-size: 0.9rem; margin-left: 1rem; font-weight: 500;">
-                {action_data["priority"]}
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    # Action cards arrive grouped two per row, with priority colors already resolved
+    for action_row in view_model["action_rows"]:
+        columns = st.columns(2)
+        for column, action_data in zip(columns, action_row):
+            with column:
+                card = render_action_card(version, action_data["action"], action_data["priority"], action_data["color"], action_data["icon"])
+                st.markdown(card, unsafe_allow_html=True)
 
     # After the Required Actions section and before the Chat Assistant section
     st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Detailed Measurements Header
-    st.markdown("""
-    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1.5rem;">
-        <div style="display: flex; align-items: center;">
-            <span style="font-size: 1.4rem; margin-right: 0.5rem;">📊</span>
-            <span style="font-weight: 700; color: #3B82F6; font-size: 1.2rem;">Detailed Measurements</span>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
 
-    # Load all alerts from the file
-    latest_file = get_latest_alert_file()
-    if latest_file:
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            all_data = json.load(f)
-            alerts_data = all_data.get("alerts", [])
-
-            if alerts_data:
-                # Create a list of dictionaries for the table
-                table_data = []
-                for index, alert in enumerate(alerts_data, 1):
-                    table_data.append({
-                        "No.": index,
-                        # Location Information
-                        "Station": alert.get("station_name", ""),
-                        "City": alert.get("city", ""),
-                        # "Latitude": alert.get("latitude", ""),
-                        # "Longitude": alert.get("longitude", ""),
-                        # Air Quality Metrics
-                        "AQI": alert.get("aqi", ""),
-                        "AQI Level": alert.get("aqi_level", ""),
-                        "PM2.5 (μg/m³)": alert.get("pm25_level", ""),
-                        # "PM2.5 Status": alert.get("pm25_type", ""),
-                        # "PM10 (μg/m³)": alert.get("pm10_level", ""),
-                        # "PM10 Status": alert.get("pm10_type", ""),
-                        # Environmental Conditions
-                        "Temperature (°C)": alert.get("temperature_level", ""),
-                        # "Temperature Status": alert.get("temperature_type", ""),
-                        "Humidity (%)": alert.get("humidity_level", ""),
-                        # "Humidity Status": alert.get("humidity_type", ""),
-                        # Alert Information
-                        "Alert Type": alert.get("alert_type", ""),
-                        "Timestamp": datetime.fromisoformat(alert.get("timestamp", "").replace("Z", "+00:00")).strftime("%Y-%m-%d %H:%M:%S")
-                    })
-
-                # Convert to DataFrame
-                import pandas as pd
-                df = pd.DataFrame(table_data)
-
-                # Calculate number of pages
-                rows_per_page = 20
-                total_rows = len(df)
-                total_pages = (total_rows + rows_per_page - 1) // rows_per_page
-
-                # Add page selector to session state if not exists
-                if "current_page" not in st.session_state:
-                    st.session_state.current_page = 0
-
-                # Calculate start and end indices for current page
-                start_idx = st.session_state.current_page * rows_per_page
-                end_idx = min(start_idx + rows_per_page, total_rows)
-
-                # Pagination controls with better styling
-                col1, col2, col3 = st.columns([2, 3, 2])
-
-                with col2:
-                    if total_pages > 1:
-                        st.markdown("""
-                        <div style="display: flex; justify-content: center; align-items: center; gap: 1rem; margin: 1rem 0;">
-                        """, unsafe_allow_html=True)
-                        
-                        pagination = st.columns([1, 2, 1])
-                        
-                        with pagination[0]:
-                            if st.button("← Previous", 
-                                       disabled=st.session_state.current_page == 0,
-                                       use_container_width=True):
-                                st.session_state.current_page -= 1
-                                st.rerun()
-
-                        with pagination[1]:
-                            st.markdown(f"""
-                            <div style="text-align: center; color: #666; font-size: 0.9rem; padding: 0.5rem;">
-                                Page {st.session_state.current_page + 1} of {total_pages}
-                            </div>
-                            """, unsafe_allow_html=True)
-
-                        with pagination[2]:
-                            if st.button("Next →", 
-                                       disabled=st.session_state.current_page == total_pages - 1,
-                                       use_container_width=True):
-                                st.session_state.current_page += 1
-                                st.rerun()
-
-                # Calculate appropriate height for the table
-                row_height = 35  # approximate height per row in pixels
-                header_height = 38  # height for the header
-                padding = 10  # extra padding
-                num_rows = len(df.iloc[start_idx:end_idx])
-                calculated_height = (num_rows * row_height) + header_height + padding
-
-                # Style the dataframe with Excel-like appearance and calculated height
-                st.data_editor(
-                    df.iloc[start_idx:end_idx],
-                    hide_index=True,
-                    use_container_width=True,
-                    height=calculated_height,  # Dynamic height based on content
-                    column_config={
-                        # Row Number
-                        "No.": st.column_config.NumberColumn(
-                            "No.",
-                            help="Record number",
-                            format="%d"
-                        ),
-                        # Location Information
-                        "Station": st.column_config.TextColumn(
-                            "Station",
-                            help="Monitoring station name"
-                        ),
-                        "City": st.column_config.TextColumn(
-                            "City",
-                            help="City name"
-                        ),
-                        "Latitude": st.column_config.NumberColumn(
-                            "Latitude",
-                            help="Station latitude",
-                            format="%.4f"
-                        ),
-                        "Longitude": st.column_config.NumberColumn(
-                            "Longitude",
-                            help="Station longitude",
-                            format="%.4f"
-                        ),
-                        # Air Quality Metrics
-                        "AQI": st.column_config.NumberColumn(
-                            "AQI",
-                            help="Air Quality Index",
-                            format="%d"
-                        ),
-                        "AQI Level": st.column_config.TextColumn(
-                            "AQI Level",
-                            help="AQI severity level"
-                        ),
-                        # ... rest of your column configs ...
-                    },
-                    disabled=True  # Makes it read-only like a regular table
-                )
-
-else:
+def render_missing_alerts():
+    """Explain why there is nothing to show, with the raw file when there is one"""
     st.warning("No alert data available")
     # Debug information
     latest_file = get_latest_alert_file()
     if latest_file:
         st.info(f"Latest alert file found: {latest_file}")
         try:
-            with open(latest_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                st.code(json.dumps(data, indent=2), language='json')
+            data = load_json_snapshot(latest_file)
+            st.code(json.dumps(data, indent=2), language='json')
         except Exception as e:
             st.error(f"Error reading alert file: {str(e)}")
     else:
         st.error("No alert files found in output/alerts directory")
 
-# Chat Assistant Section
-# Initialize OpenAI client
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+def render_table_section(view_model):
+    """Detailed Measurements table with filters and pagination"""
+    # Detailed Measurements Header
+    st.markdown("""
+    <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1.5rem;">
+        <div style="display: flex; align-items: center;">
+            <span style="font-size: 1.4rem; margin-right: 0.5rem;">📊</span>
+            <span style="font-weight: 700; color: #3B82F6; font-size: 1.2rem;">Detailed Measurements</span>
+        </div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Filters and pages are served by the indexed alert store, one page per query
+    alert_store = get_alert_store()
+    snapshot_id = alert_store.ensure_snapshot(view_model["source_file"])
+    cities, levels = alert_store.filter_options(snapshot_id)
+
+    filter_cols = st.columns([2, 2, 3])
+    with filter_cols[0]:
+        city_filter = st.selectbox("City", ["All cities"] + cities)
+    with filter_cols[1]:
+        level_filter = st.selectbox("AQI Level", ["All levels"] + levels)
+    with filter_cols[2]:
+        station_search = st.text_input("Search stations", placeholder="Station name")
+
+    filters = {
+        "city": None if city_filter == "All cities" else city_filter,
+        "level": None if level_filter == "All levels" else level_filter,
+        "search": station_search.strip() or None
+    }
 
-# Function to convert images to base64
-def get_image_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    return f"data:image/png;base64,{encoded_string}"
+    # Add page selector to session state if not exists; new filters start from the first page
+    if "current_page" not in st.session_state or st.session_state.get("table_filters") != (snapshot_id, filters):
+        st.session_state.current_page = 0
+        st.session_state.table_filters = (snapshot_id, filters)
+
+    rows_per_page = 20
+    page_rows, total_rows = alert_store.query_page(
+        snapshot_id, page=st.session_state.current_page, page_size=rows_per_page, **filters)
+    if not total_rows:
+        st.info("No alerts match the selected filters")
+    else:
+        import pandas as pd
+
+        # Calculate number of pages
+        total_pages = (total_rows + rows_per_page - 1) // rows_per_page
+        df = pd.DataFrame(page_rows)
+
+        # Pagination controls with better styling
+        col1, col2, col3 = st.columns([2, 3, 2])
+
+        with col2:
+            if total_pages > 1:
+                st.markdown("""
+                <div style="display: flex; justify-content: center; align-items: center; gap: 1rem; margin: 1rem 0;">
+                """, unsafe_allow_html=True)
+                
+                pagination = st.columns([1, 2, 1])
+                
+                with pagination[0]:
+                    if st.button("← Previous", 
+                               disabled=st.session_state.current_page == 0,
+                               use_container_width=True):
+                        st.session_state.current_page -= 1
+                        st.rerun(scope="fragment")
+
+                with pagination[1]:
+                    st.markdown(f"""
+                    <div style="text-align: center; color: #666; font-size: 0.9rem; padding: 0.5rem;">
+                        Page {st.session_state.current_page + 1} of {total_pages}
+                    </div>
+                    """, unsafe_allow_html=True)
+
+                with pagination[2]:
+                    if st.button("Next →", 
+                               disabled=st.session_state.current_page == total_pages - 1,
+                               use_container_width=True):
+                        st.session_state.current_page += 1
+                        st.rerun(scope="fragment")
+
+        # Calculate appropriate height for the table
+        row_height = 35  # approximate height per row in pixels
+        header_height = 38  # height for the header
+        padding = 10  # extra padding
+        num_rows = len(df)
+        calculated_height = (num_rows * row_height) + header_height + padding
+
+        # Style the dataframe with Excel-like appearance and calculated height
+        st.data_editor(
+            df,
+            hide_index=True,
+            use_container_width=True,
+            height=calculated_height,  # Dynamic height based on content
+            column_config={
+                # Row Number
+                "No.": st.column_config.NumberColumn(
+                    "No.",
+                    help="Record number",
+                    format="%d"
+                ),
+                # Location Information
+                "Station": st.column_config.TextColumn(
+                    "Station",
+                    help="Monitoring station name"
+                ),
+                "City": st.column_config.TextColumn(
+                    "City",
+                    help="City name"
+                ),
+                # Air Quality Metrics
+                "AQI": st.column_config.NumberColumn(
+                    "AQI",
+                    help="Air Quality Index",
+                    format="%d"
+                ),
+                "AQI Level": st.column_config.TextColumn(
+                    "AQI Level",
+                    help="AQI severity level"
+                ),
+            },
+            disabled=True  # Makes it read-only like a regular table
+        )
+
+# Data sections poll for a new snapshot on their own and rerun without a page reload
+@live_fragment()
+def alerts_fragment(version):
+    with render_timer("command_center", "alerts"):
+        view_model = load_dashboard_view(version)
+        if view_model:
+            render_alerts_section(view_model, version)
+        else:
+            render_missing_alerts()
+
+@live_fragment()
+def table_fragment(version):
+    # Pagination and filters rerun only this fragment
+    with render_timer("command_center", "table"):
+        view_model = memo_for_version("view_model", version, load_view_model)
+        if view_model and view_model.get("headline"):
+            render_table_section(view_model)
+
+alerts_fragment()
+table_fragment()
+
+# Chat Assistant Section
+# The OpenAI client is created on the first message and shared by the process (utils/openai_utils.py)
 
 # Set assistant ID
 assistant_id = "asst_cIHPEgKEw7XtmMcn8ovvCxSx"
 
 warnings.filterwarnings("ignore")
 
-# Initialize session state for chat history
-if "chat_messages" not in st.session_state:
-    st.session_state.chat_messages = [
-        {"role": "assistant", "content": "Welcome to the Air Quality Command Center! 👋\n\nI'm your dedicated Air Quality Assistant, how can I assist you today?"}
-    ]
+# Chat transcripts live in the chat store; the session only holds its id
+chat_store = get_chat_store()
+chat_session_id = get_chat_session_id()
+if chat_store.count(chat_session_id) == 0:
+    chat_store.append(chat_session_id, new_message("assistant", "Welcome to the Air Quality Command Center! 👋\n\nI'm your dedicated Air Quality Assistant, how can I assist you today?"))
+if "thread_id" not in st.session_state and chat_store.get_thread(chat_session_id):
+    # Continue the assistant thread of a restored session
+    st.session_state["thread_id"] = chat_store.get_thread(chat_session_id)
 
-# Load user and assistant icons
+# Load user and assistant icons (encoded once per file version)
 user_icon_path = "image/user_icon.png"
 assistant_icon_path = "image/air_quality_assistant_icon.png"
-user_icon_base64 = get_image_base64(user_icon_path)
-assistant_icon_base64 = get_image_base64(assistant_icon_path)
-
-# Display chat interface
-st.markdown("### Air Quality Assistant")
-
-# Display the chat history
-for message in st.session_state.chat_messages:
-    is_user = message["role"] == "user"
-    message_func(message["content"], user_icon_base64, assistant_icon_base64, is_user=is_user)
-
-# Accept user input
-prompt = st.chat_input("Your message")
-
-# Handle user input
-if prompt:
-    st.session_state.chat_messages.append({"role": "user", "content": prompt})
-    message_func(prompt, user_icon_base64, assistant_icon_base64, is_user=True)
-
-    response = generate_response(prompt, assistant_id, None)
-    st.session_state.chat_messages.append({"role": "assistant", "content": response})
-    message_func(response, user_icon_base64, assistant_icon_base64)
\ No newline at end of file
+user_icon_base64 = image_data_uri(user_icon_path)
+assistant_icon_base64 = image_data_uri(assistant_icon_path)
+
+@st.fragment
+def chat_fragment():
+    # Sending a message reruns only the chat, not the alert cards or the table
+    st.markdown("### Air Quality Assistant")
+
+    # Display the chat history
+    with render_timer("command_center", "chat history"):
+        display_stored_chat(chat_store, chat_session_id, user_icon_base64, assistant_icon_base64, key="command_center_chat")
+
+    # Accept user input
+    prompt = st.chat_input("Your message")
+
+    # Handle user input
+    if prompt:
+        user_message = chat_store.append(chat_session_id, new_message("user", prompt))
+        display_message(user_message, user_icon_base64, assistant_icon_base64)
+
+        # Draw the reply as it streams in, then swap in the stored message
+        reply_placeholder, on_text = streaming_message(user_icon_base64, assistant_icon_base64)
+        response, cached = answer_question(prompt, assistant_id, None, on_text=on_text,
+                                           user_id=chat_session_id)
+        assistant_message = chat_store.append(chat_session_id, new_message("assistant", response, cached=cached))
+        if st.session_state.get("thread_id"):
+            chat_store.set_thread(chat_session_id, st.session_state["thread_id"])
+        display_message(assistant_message, user_icon_base64, assistant_icon_base64, container=reply_placeholder)
+
+chat_fragment()
+
+# Per-section render timings, shown when RENDER_PROFILE is set
+show_render_profile("command_center")
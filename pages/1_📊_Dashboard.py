@@ -1,11 +1,11 @@
 import streamlit as st
-import json
-import pandas as pd
-from datetime import datetime
-from pathlib import Path
 from utils.custom_css_banner import get_dashboard_banner
-from utils.custom_css_style import get_dashboard_css, get_priority_colors
+from utils.custom_css_style import get_dashboard_css
 from utils.create_folium_map import create_aqi_heat_map
+from utils.view_model import load_view_model
+from utils.alert_store import get_alert_store
+from utils.live_refresh import live_fragment, memo_for_version
+from utils.render_cache import render_timer, show_render_profile, versioned_fragment
 
 # Page Configuration
 def setup_page():
@@ -14,29 +14,18 @@ def setup_page():
     st.markdown(get_dashboard_css(), unsafe_allow_html=True)
 
 # Data Loading Functions
-def get_latest_alert_file():
-    alerts_dir = Path("output/alerts")
-    alert_files = list(alerts_dir.glob("bangkok_alerts_*.json"))
-    return max(alert_files, key=lambda x: x.stat().st_mtime) if alert_files else None
-
-def load_alert_data():
-    latest_file = get_latest_alert_file()
-    if not latest_file:
-        return None
-    
+def load_dashboard_view(version):
     try:
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Precomputed by the alert pipeline and shared across sessions; treat as read-only
+        return memo_for_version("view_model", version, load_view_model)
     except Exception as e:
         st.error(f"Error loading alert data: {str(e)}")
         return None
 
 # UI Component Functions
-def display_alert_card(alert_data):
-    location_name = alert_data.get("city") or alert_data.get("station_name", "Bangkok")
-    alert_type = alert_data.get("alert_type", "Air Quality Warning")
-    
-    st.markdown(f"""
+@versioned_fragment
+def alert_card_html(alert_type, location_name):
+    return f"""
     <div class="alert-section">
         <div style="display: flex; align-items: center; margin-bottom: 0.8rem;">
             <span style="font-size: 1.4rem; margin-right: 0.5rem;">⚠️</span>
@@ -47,54 +36,76 @@ def display_alert_card(alert_data):
             {location_name}
         </p>
     </div>
-    """, unsafe_allow_html=True)
+    """
 
-def display_metric_card(value, label, color="#FF4B4B", unit=""):
-    st.markdown(f"""
+@versioned_fragment
+def metric_card_html(value, label, color, unit):
+    return f"""
     <div class="metric-card">
         <div class="metric-value" style="color: {color}">{value}{unit}</div>
         <div class="metric-label">{label}</div>
     </div>
-    """, unsafe_allow_html=True)
+    """
+
+def display_alert_card(headline, version=None):
+    st.markdown(alert_card_html(version, headline["alert_type"], headline["location_name"]), unsafe_allow_html=True)
+
+def display_metric_card(value, label, color="#FF4B4B", unit="", version=None):
+    st.markdown(metric_card_html(version, value, label, color, unit), unsafe_allow_html=True)
 
-def display_metrics_row(alert_data):
+def display_metrics_row(alert_data, version=None):
     col1, col2, col3, col4 = st.columns(4)
     with col1:
-        display_metric_card(alert_data["aqi"], "Current AQI")
+        display_metric_card(alert_data["aqi"], "Current AQI", version=version)
     with col2:
-        display_metric_card(alert_data["pm25_level"], "PM2.5 Level", "#FF8B3D", " μg/m³")
+        display_metric_card(alert_data["pm25_level"], "PM2.5 Level", "#FF8B3D", " μg/m³", version=version)
     with col3:
-        display_metric_card(alert_data["temperature_level"], "Temperature", "#3B82F6", "°C")
+        display_metric_card(alert_data["temperature_level"], "Temperature", "#3B82F6", "°C", version=version)
     with col4:
-        display_metric_card(alert_data["humidity_level"], "Humidity", "#3B82F6", "%")
-
-def create_alerts_table(alerts_data):
-    table_data = []
-    for index, alert in enumerate(alerts_data, 1):
-        table_data.append({
-            "No.": index,
-            "Station": alert.get("station_name", ""),
-            "City": alert.get("city", ""),
-            "AQI": alert.get("aqi", ""),
-            "AQI Level": alert.get("aqi_level", ""),
-            "PM2.5 (μg/m³)": alert.get("pm25_level", ""),
-            "Temperature (°C)": alert.get("temperature_level", ""),
-            "Humidity (%)": alert.get("humidity_level", ""),
-            "Alert Type": alert.get("alert_type", ""),
-            "Timestamp": datetime.fromisoformat(alert.get("timestamp", "").replace("Z", "+00:00")).strftime("%Y-%m-%d %H:%M:%S")
-        })
-    return pd.DataFrame(table_data)
-
-def display_paginated_table(df):
-    rows_per_page = 20
-    total_rows = len(df)
-    total_pages = (total_rows + rows_per_page - 1) // rows_per_page
+        display_metric_card(alert_data["humidity_level"], "Humidity", "#3B82F6", "%", version=version)
+
+def display_level_summary(counts_by_level, version=None):
+    """One metric card per AQI level that currently has alerts"""
+    if not counts_by_level:
+        return
+    columns = st.columns(len(counts_by_level))
+    for column, (level, count) in zip(columns, counts_by_level.items()):
+        with column:
+            display_metric_card(count, level, "#3B82F6", version=version)
 
-    if "current_page" not in st.session_state:
+def display_table_filters(cities, levels):
+    col1, col2, col3 = st.columns([2, 2, 3])
+    with col1:
+        city = st.selectbox("City", ["All cities"] + cities, key="table_city")
+    with col2:
+        level = st.selectbox("AQI Level", ["All levels"] + levels, key="table_level")
+    with col3:
+        search = st.text_input("Search stations", placeholder="Station name", key="table_search")
+    return {
+        "city": None if city == "All cities" else city,
+        "level": None if level == "All levels" else level,
+        "search": search.strip() or None
+    }
+
+def display_paginated_table(source_file):
+    # Pages come from the indexed alert store, so only the visible rows are ever loaded
+    alert_store = get_alert_store()
+    snapshot_id = alert_store.ensure_snapshot(source_file)
+    filters = display_table_filters(*alert_store.filter_options(snapshot_id))
+
+    if "current_page" not in st.session_state or st.session_state.get("table_filters") != (snapshot_id, filters):
         st.session_state.current_page = 0
+        st.session_state.table_filters = (snapshot_id, filters)
+
+    rows_per_page = 20
+    page_rows, total_rows = alert_store.query_page(
+        snapshot_id, page=st.session_state.current_page, page_size=rows_per_page, **filters)
+    if not total_rows:
+        st.info("No alerts match the selected filters")
+        return
 
     start_idx = st.session_state.current_page * rows_per_page
-    end_idx = min(start_idx + rows_per_page, total_rows)
+    end_idx = start_idx + len(page_rows)
 
     # Pagination controls
     col1, col2, col3 = st.columns([2, 3, 2])
@@ -105,9 +116,10 @@ def display_paginated_table(df):
         </div>
         """, unsafe_allow_html=True)
 
-    # Display table
+    import pandas as pd
+
     st.dataframe(
-        df.iloc[start_idx:end_idx],
+        pd.DataFrame(page_rows),
         use_container_width=True,
         column_config=get_column_config()
     )
@@ -126,7 +138,22 @@ def get_column_config():
         "Timestamp": st.column_config.TextColumn("Timestamp")
     }
 
-def display_required_actions(alert_data):
+@versioned_fragment
+def action_card_html(action, priority, color, icon):
+    """HTML for a single action card"""
+    return f"""
+    <div class="action-card">
+        <div class="action-content">
+            <span style="color: {color}; font-size: 1.4rem;">{icon}</span>
+            <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action}</span>
+        </div>
+        <div class="priority-badge" style="color: #333; border: 1px solid {color};">
+            {priority}
+        </div>
+    </div>
+    """
+
+def display_required_actions(headline, action_rows, version=None):
     """Display the required actions section with action cards"""
     # Required Actions Header
     st.markdown(f"""
@@ -136,55 +163,41 @@ def display_required_actions(alert_data):
             <span style="font-weight: 700; color: #3B82F6; font-size: 1.2rem;">Required Actions</span>
         </div>
         <div class="action-count">
-            <span style="color: #FF4B4B; font-size: 0.9rem; font-weight: 500;">{len(alert_data["recommended_actions"])} Critical Actions</span>
+            <span style="color: #FF4B4B; font-size: 0.9rem; font-weight: 500;">{headline["action_count"]} Critical Actions</span>
         </div>
     </div>
     """, unsafe_allow_html=True)
 
-    def create_action_card(action_data):
-        """Helper function to create a single action card"""
-        priority_style = get_priority_colors().get(action_data["priority"], get_priority_colors()["Immediate"])
-        return f"""
-        <div class="action-card">
-            <div class="action-content">
-                <span style="color: {priority_style['text']}; font-size: 1.4rem;">{priority_style['icon']}</span>
-                <span style="color: #333; font-weight: 500; font-size: 1.1rem;">{action_data["action"]}</span>
-            </div>
-            <div class="priority-badge" style="color: #333; border: 1px solid {priority_style['text']};">
-                {action_data["priority"]}
-            </div>
-        </div>
-        """
-
-    # Display action cards in two rows of two
-    actions = alert_data["recommended_actions"]
-    for i in range(0, len(actions), 2):
-        col1, col2 = st.columns(2)
-        with col1:
-            if i < len(actions):
-                st.markdown(create_action_card(actions[i]), unsafe_allow_html=True)
-        with col2:
-            if i + 1 < len(actions):
-                st.markdown(create_action_card(actions[i + 1]), unsafe_allow_html=True)
-
-def main():
-    setup_page()
-
-    # Add AQI Map
-    create_aqi_heat_map()
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    data = load_alert_data()
-    if not data or "alerts" not in data or not data["alerts"]:
+    # Action cards arrive grouped two per row with their priority colors resolved
+    for action_row in action_rows:
+        columns = st.columns(2)
+        for column, action_data in zip(columns, action_row):
+            with column:
+                card = action_card_html(version, action_data["action"], action_data["priority"], action_data["color"], action_data["icon"])
+                st.markdown(card, unsafe_allow_html=True)
+
+@live_fragment()
+def map_section(version):
+    with render_timer("dashboard", "map"):
+        create_aqi_heat_map(version)
+
+@live_fragment()
+def alerts_section(version):
+    with render_timer("dashboard", "alerts"):
+        render_alerts(version)
+
+def render_alerts(version):
+    view_model = load_dashboard_view(version)
+    if not view_model or not view_model.get("headline"):
         st.warning("No alert data available")
         return
 
-    first_alert = data["alerts"][0]
+    first_alert = view_model["headline"]
     
     # Display main dashboard components
     col_alert, col_health = st.columns([1, 1])
     with col_alert:
-        display_alert_card(first_alert)
+        display_alert_card(first_alert, version)
     with col_health:
         st.markdown(f"""
         <div class="alert-section">
@@ -199,13 +212,17 @@ def main():
         """, unsafe_allow_html=True)
 
     st.markdown("<br>", unsafe_allow_html=True)
-    display_metrics_row(first_alert)
+    display_metrics_row(first_alert, version)
     st.markdown("<br>", unsafe_allow_html=True)
 
 
     
     # Add Required Actions section
-    display_required_actions(first_alert)
+    display_required_actions(first_alert, view_model["action_rows"], version)
+    st.markdown("<br>", unsafe_allow_html=True)
+
+    # Alerts per AQI level across all stations
+    display_level_summary(view_model["counts_by_level"], version)
     st.markdown("<br>", unsafe_allow_html=True)
 
 
@@ -217,8 +234,18 @@ def main():
     # </div>
     # """, unsafe_allow_html=True)
 
-    # df = create_alerts_table(data["alerts"])
-    # display_paginated_table(df)
+    # display_paginated_table(view_model["source_file"])
+
+def main():
+    setup_page()
+
+    # Map and alert sections each poll for a new snapshot and rerun on their own
+    map_section()
+    st.markdown("<br>", unsafe_allow_html=True)
+    alerts_section()
+
+    # Per-section render timings, shown when RENDER_PROFILE is set
+    show_render_profile("dashboard")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,11 +1,11 @@
 import streamlit as st
 import warnings
-import base64
-from openai import OpenAI
 
-from utils.message_utils import message_func
-from utils.openai_utils import generate_response
+from utils.message_utils import display_message, display_stored_chat, get_chat_session_id, new_message, streaming_message
+from utils.chat_store import get_chat_store
+from utils.openai_utils import answer_question, get_alert_attachment
 from utils.custom_css_banner import get_chat_assistant_banner
+from utils.render_cache import image_data_uri
 
 # Set page config
 st.set_page_config(page_title="💬 Chat Assistant", page_icon="", layout="wide")
@@ -13,47 +13,49 @@ st.set_page_config(page_title="💬 Chat Assistant", page_icon="", layout="wide"
 # Display the custom banner in the UI
 st.markdown(get_chat_assistant_banner(), unsafe_allow_html=True)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
 # Set assistant ID (customized assistant)
 assistant_id = "asst_cIHPEgKEw7XtmMcn8ovvCxSx"  # air quality chat assistant
 
 warnings.filterwarnings("ignore")
 
-# Initialize session state for chat history
-if "chat_messages" not in st.session_state:
-    st.session_state.chat_messages = [
-        {"role": "assistant", "content": "Welcome to the Air Quality Command Center! 👋\n\nI'm your dedicated Air Quality Assistant, how can I assist you today?"}
-    ]
-
-# Load user and assistant icons
-def get_image_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        encoded_string = base64.b64encode(image_file.read()).decode()
-    return f"data:image/png;base64,{encoded_string}"
+# Chat transcripts live in the chat store; the session only holds its id
+chat_store = get_chat_store()
+chat_session_id = get_chat_session_id()
+if chat_store.count(chat_session_id) == 0:
+    chat_store.append(chat_session_id, new_message("assistant", "Welcome to the Air Quality Command Center! 👋\n\nI'm your dedicated Air Quality Assistant, how can I assist you today?"))
+if "thread_id" not in st.session_state and chat_store.get_thread(chat_session_id):
+    # Continue the assistant thread of a restored session
+    st.session_state["thread_id"] = chat_store.get_thread(chat_session_id)
 
+# Load user and assistant icons (encoded once per file version)
 user_icon_path = "image/user_icon.png"
 assistant_icon_path = "image/air_quality_assistant_icon.png"
-user_icon_base64 = get_image_base64(user_icon_path)
-assistant_icon_base64 = get_image_base64(assistant_icon_path)
+user_icon_base64 = image_data_uri(user_icon_path)
+assistant_icon_base64 = image_data_uri(assistant_icon_path)
 
 # Display the chat history
-for message in st.session_state.chat_messages:
-    is_user = message["role"] == "user"
-    message_func(message["content"], user_icon_base64, assistant_icon_base64, is_user=is_user)
+display_stored_chat(chat_store, chat_session_id, user_icon_base64, assistant_icon_base64, key="assistant_chat")
+
+# Optionally hand the latest alert file to the assistant's code interpreter and file search
+attach_alerts = st.toggle("Attach latest alert data", value=False,
+                          help="Lets the assistant analyse the full alert file; answers take longer")
 
 # Accept user input
 prompt = st.chat_input("Your message")
 
 # Handle user input
 if prompt:
-    st.session_state.chat_messages.append({"role": "user", "content": prompt})
-    message_func(prompt, user_icon_base64, assistant_icon_base64, is_user=True)
-
-    # Generate response using the assistant
-    response = generate_response(prompt, assistant_id, None)
-    st.session_state.chat_messages.append({"role": "assistant", "content": response})
-    message_func(response, user_icon_base64, assistant_icon_base64)
+    user_message = chat_store.append(chat_session_id, new_message("user", prompt))
+    display_message(user_message, user_icon_base64, assistant_icon_base64)
+
+    # Generate response using the assistant, drawing the reply as it streams in
+    reply_placeholder, on_text = streaming_message(user_icon_base64, assistant_icon_base64)
+    file_id = get_alert_attachment() if attach_alerts else None
+    response, cached = answer_question(prompt, assistant_id, file_id, on_text=on_text,
+                                       user_id=chat_session_id)
+    assistant_message = chat_store.append(chat_session_id, new_message("assistant", response, cached=cached))
+    if st.session_state.get("thread_id"):
+        chat_store.set_thread(chat_session_id, st.session_state["thread_id"])
+    display_message(assistant_message, user_icon_base64, assistant_icon_base64, container=reply_placeholder)
 
 
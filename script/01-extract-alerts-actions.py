@@ -2,13 +2,23 @@ import json
 import os
 from datetime import datetime
 import glob
-from openai import OpenAI
+from utils.llm_client import get_openai_client
 from utils.prompt_instructions import get_air_quality_system_prompt
+from utils.notifications import enqueue_alert_notifications
+from utils.alert_pipeline import run_alert_pipeline, format_stage_timings
+from utils.area_summary import generate_area_alerts
+from utils.snapshots import update_manifest
+from utils.view_model import write_view_model
+from utils.alert_store import index_alerts
+from utils.bm25_index import index_pipeline_outputs
+from utils.alert_stream import ProgressiveAlertFile, stream_alert_completion, is_streaming_enabled
 from dotenv import load_dotenv
 
 load_dotenv()
 
 llm_model = os.getenv('OPENAI_MODEL')
+alert_streaming = is_streaming_enabled(os.getenv('ALERT_STREAMING'))
+alert_aggregation = os.getenv('ALERT_AGGREGATION', '').strip().lower()  # '', 'city', 'district' or 'grid'
 
 def get_latest_aqi_data():
     """Get the latest AQI data file from the output/hourly directory"""
@@ -22,9 +32,9 @@ def get_latest_aqi_data():
     
     return data, latest_file
 
-def generate_alerts(aqi_data):
-    """Generate alerts using OpenAI API"""
-    client = OpenAI()
+def generate_alerts(aqi_data, sink=None, client=None):
+    """Generate alerts using OpenAI API, streaming each alert to `sink` when streaming is enabled"""
+    client = client or get_openai_client()
     
     # Prepare the system prompt
     system_prompt = get_air_quality_system_prompt()
@@ -32,13 +42,21 @@ def generate_alerts(aqi_data):
     # Convert data to a clean string format
     data_str = json.dumps(aqi_data, ensure_ascii=False, indent=2)
     
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Generate air quality alerts from this data:\n{data_str}"}
+    ]
+    
+    if alert_streaming:
+        alerts, timings = stream_alert_completion(client, llm_model, messages, sink=sink)
+        if timings['time_to_first_alert'] is not None:
+            print(f"First alert after {timings['time_to_first_alert']:.2f}s (full reply {timings['total']:.2f}s)")
+        return alerts
+    
     response = client.chat.completions.create(
         model=llm_model,  # Using the latest model that's good at JSON
         response_format={ "type": "json_object" },  # Enforce JSON output
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Generate air quality alerts from this data:\n{data_str}"}
-        ],
+        messages=messages,
         temperature=0.3  # Low temperature for consistent output
     )
     
@@ -46,68 +64,58 @@ def generate_alerts(aqi_data):
     alerts = json.loads(response.choices[0].message.content)
     return alerts
 
-def save_alerts(alerts, source_file):
-    """Save alerts to a JSON file"""
-    # Create alerts directory if it doesn't exist
-    os.makedirs('output/alerts', exist_ok=True)
-    
-    # Extract timestamp from source file
-    # Get just the filename without path
+def get_alerts_filename(source_file):
+    """Build the alerts filename that shares the source file's timestamp"""
     source_filename = os.path.basename(source_file)
     timestamp = source_filename.replace('bangkok_aqi_data_', '').replace('.json', '')
-    
-    # Generate filename using the same timestamp as source
-    filename = os.path.join('output', 'alerts', f'bangkok_aqi_alerts_{timestamp}.json')
-    
-    # Save alerts with metadata
-    output = {
-        "generated_at": datetime.now().isoformat(),
-        "source_file": source_file,
-        **alerts
-    }
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
-    
-    return filename
-
-def sort_and_save_alerts(filename):
-    """Read the alerts file, sort by AQI, and save it back"""
-    # Read the file
-    with open(filename, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Sort the alerts by AQI in descending order
-    data['alerts'] = sorted(data['alerts'], key=lambda x: x['aqi'], reverse=True)
-    
-    # Save the sorted data back to the file
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    
-    return data
+    return os.path.join('output', 'alerts', f'bangkok_aqi_alerts_{timestamp}.json')
 
 def main():
     try:
-        # Get latest AQI data
-        print("Reading latest AQI data...")
-        aqi_data, source_file = get_latest_aqi_data()
+        snapshot = {}
+        metadata = {"generated_at": datetime.now().isoformat()}
+        
+        def load():
+            print("Reading latest AQI data...")
+            snapshot['aqi_data'], source_file = get_latest_aqi_data()
+            metadata['source_file'] = source_file
+            return snapshot['aqi_data'].get('data', []), source_file
+        
+        def generate(alert_worthy, sink):
+            print(f"Generating alerts for {len(alert_worthy)} stations...")
+            if alert_aggregation:
+                # Area-level advice keeps the prompt size proportional to the number of areas
+                alerts = generate_area_alerts(get_openai_client(), llm_model, alert_worthy,
+                                              level=alert_aggregation, sink=sink, streaming=alert_streaming)
+                return {'alerts': alerts}
+            aqi_data = {**snapshot['aqi_data'], 'total_data_points': len(alert_worthy), 'data': alert_worthy}
+            return generate_alerts(aqi_data, sink=sink)
         
-        # Generate alerts
-        print("Generating alerts...")
-        alerts = generate_alerts(aqi_data)
+        # Load, filter, generate, rank and write in one pass; when streaming, the
+        # alert file fills in as alerts arrive before the final atomic write
+        result = run_alert_pipeline(
+            load=load,
+            generate=generate,
+            output_file=get_alerts_filename,
+            metadata=metadata,
+            sink_factory=(lambda path: ProgressiveAlertFile(path, metadata)) if alert_streaming else None
+        )
         
-        # Save alerts
-        print("Saving alerts...")
-        output_file = save_alerts(alerts, source_file)
+        # Precompute what the dashboard renders so page cost does not grow with alert count
+        view_model_file = write_view_model(result.alerts, result.output_file)
+        index_alerts(result.alerts, result.output_file)
+        index_pipeline_outputs(result.alerts, result.output_file)
+        update_manifest(alerts=result.output_file, view_model=view_model_file)
         
-        # Sort alerts by AQI
-        print("Sorting alerts by AQI...")
-        sorted_data = sort_and_save_alerts(output_file)
+        # Queue outbound notifications; delivery happens in script/03-send-notifications.py
+        queued = enqueue_alert_notifications(result.alerts)
         
-        print(f"Alerts successfully generated, sorted, and saved to: {output_file}")
-        print(f"Number of alerts: {len(sorted_data['alerts'])}")
+        print(f"Alerts successfully generated, sorted, and saved to: {result.output_file}")
+        print(f"Stage timings: {format_stage_timings(result.timings)}")
+        print(f"Notifications queued: {queued}")
+        print(f"Number of alerts: {len(result.alerts)}")
         print("\nTop 5 highest AQI locations:")
-        for alert in sorted_data['alerts'][:5]:
+        for alert in result.alerts[:5]:
             print(f"- {alert['station_name']}: AQI {alert['aqi']}")
         
     except Exception as e:
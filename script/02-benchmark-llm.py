@@ -0,0 +1,127 @@
+import argparse
+import copy
+import importlib.util
+import os
+import random
+import statistics
+import time
+
+# Benchmarks run against the local stand-in unless told otherwise
+os.environ.setdefault('OPENAI_BACKEND', 'local')
+
+from utils.alert_pipeline import filter_alert_worthy
+from utils.llm_client import get_openai_client, run_assistant_turn
+
+PIPELINE_SCRIPT = '00-get-extract-data-alert.py'
+ASSISTANT_ID = 'asst_local_benchmark'
+
+def load_pipeline_module():
+    """Import the hourly pipeline script, whose file name is not a valid module name"""
+    spec = importlib.util.spec_from_file_location('alert_pipeline_script', PIPELINE_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_synthetic_records(count, seed=42):
+    """Generate station records shaped like process_station_data() output"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        records.append({
+            'station_name': f'Benchmark Station {i}, Bangkok, Thailand',
+            'station_id': 10000 + i,
+            'city': f'District {i % 12}',
+            'latitude': round(13.5 + rng.random() * 0.5, 4),
+            'longitude': round(100.3 + rng.random() * 0.6, 4),
+            'timestamp': '2024-01-01 12:00:00',
+            'aqi': float(rng.randint(30, 320)),
+            'pm25': rng.randint(10, 250),
+            'pm10': rng.randint(10, 200),
+            'temperature': round(rng.uniform(24, 36), 1),
+            'humidity': round(rng.uniform(40, 90), 1)
+        })
+    return records
+
+def summarize(label, samples):
+    """Print latency percentiles for a list of samples in seconds"""
+    if not samples:
+        print(f"{label}: no successful samples")
+        return
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"{label}: n={len(ordered)} p50={statistics.median(ordered) * 1000:.1f}ms "
+          f"p95={p95 * 1000:.1f}ms max={ordered[-1] * 1000:.1f}ms")
+
+def benchmark_alerts(pipeline, client, records, runs, streaming):
+    pipeline.ALERT_STREAMING = streaming
+    totals, first_alerts = [], []
+    for _ in range(runs):
+        first_alert_at = []
+        started = time.perf_counter()
+
+        def record_first_alert(alert):
+            if not first_alert_at:
+                first_alert_at.append(time.perf_counter() - started)
+
+        pipeline.generate_alerts(copy.deepcopy(records), sink=record_first_alert, client=client)
+        totals.append(time.perf_counter() - started)
+        first_alerts.extend(first_alert_at[:1])
+    mode = 'streaming' if streaming else 'blocking'
+    summarize(f"generate_alerts ({mode}) total", totals)
+    if streaming:
+        summarize(f"generate_alerts ({mode}) time-to-first-alert", first_alerts)
+
+def benchmark_chat(client, runs, streaming):
+    latencies, first_text, failures = [], [], 0
+    usage = getattr(client, 'usage', None) or {}
+    polls_before = usage.get('run_polls', 0)
+    for i in range(runs):
+        thread = client.beta.threads.create()
+        first_text_at = []
+        started = time.perf_counter()
+
+        def record_first_text(text):
+            if not first_text_at:
+                first_text_at.append(time.perf_counter() - started)
+
+        try:
+            run_assistant_turn(client, thread.id, f"What is the AQI at station {i}?", ASSISTANT_ID,
+                               on_text=record_first_text, stream=streaming)
+            latencies.append(time.perf_counter() - started)
+            first_text.extend(first_text_at[:1])
+        except Exception as e:
+            failures += 1
+            print(f"Chat run failed: {e}")
+    mode = 'streaming' if streaming else 'polling'
+    summarize(f"run_assistant_turn ({mode}) total", latencies)
+    summarize(f"run_assistant_turn ({mode}) time-to-first-text", first_text)
+    if 'run_polls' in usage:
+        print(f"run_assistant_turn ({mode}) run polls: {usage['run_polls'] - polls_before}")
+    if failures:
+        print(f"run_assistant_turn ({mode}) failures: {failures}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark alert generation and chat latency")
+    parser.add_argument('--runs', type=int, default=10, help="iterations per scenario")
+    parser.add_argument('--stations', type=int, default=60, help="synthetic stations per alert run")
+    parser.add_argument('--skip-chat', action='store_true', help="only benchmark alert generation")
+    args = parser.parse_args()
+
+    client = get_openai_client()
+    print(f"Backend: {os.getenv('OPENAI_BACKEND')} ({type(client).__name__})")
+
+    pipeline = load_pipeline_module()
+    records = filter_alert_worthy(make_synthetic_records(args.stations))
+    benchmark_alerts(pipeline, client, records, args.runs, streaming=False)
+    benchmark_alerts(pipeline, client, records, args.runs, streaming=True)
+
+    if not args.skip_chat:
+        benchmark_chat(client, args.runs, streaming=False)
+        benchmark_chat(client, args.runs, streaming=True)
+
+    usage = getattr(client, 'usage', None)
+    if usage:
+        print(f"Token usage: {usage}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+
+from utils.geofence import load_subscriptions
+from utils.notifications import NotificationDispatcher, NotificationQueue, build_sink, load_recipients
+
+def print_metrics(metrics):
+    print(f"Delivered: {metrics['delivered']} in {metrics['batches']} batches "
+          f"({metrics['throughput_per_second']:.1f}/s), failed attempts: {metrics['failed_attempts']}")
+    print(f"Queue depth: {metrics['queue_depth']}")
+
+async def run(args):
+    # Geofenced subscriptions carry their own sink, like recipients
+    recipients = load_recipients(args.recipients) + load_subscriptions(args.subscriptions)
+    sinks = {recipient['id']: build_sink(recipient) for recipient in recipients}
+    queue = NotificationQueue()
+    queue.requeue_stale()
+    dispatcher = NotificationDispatcher(queue, sinks, workers=args.workers, batch_size=args.batch_size)
+
+    try:
+        while True:
+            print_metrics(await dispatcher.run_once())
+            if not args.forever:
+                break
+            await asyncio.sleep(args.interval)
+    finally:
+        queue.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued air quality alert notifications")
+    parser.add_argument('--recipients', help="recipient definitions JSON (default: NOTIFY_RECIPIENTS_FILE or config/notification_recipients.json)")
+    parser.add_argument('--subscriptions', help="geofenced subscriptions JSON (default: GEOFENCE_SUBSCRIPTIONS_FILE or config/geofence_subscriptions.json)")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent delivery workers")
+    parser.add_argument('--batch-size', type=int, default=50, help="alerts per message to a recipient")
+    parser.add_argument('--forever', action='store_true', help="keep polling the queue")
+    parser.add_argument('--interval', type=float, default=30.0, help="seconds between polls with --forever")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import ast
+import glob
+import os
+import re
+import subprocess
+import sys
+
+DEFAULT_PAGES = ['main.py'] + sorted(glob.glob(os.path.join('pages', '*.py')))
+DEFAULT_BUDGET_MS = 1500
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+def get_page_imports(path):
+    """Top-level import statements of a page, i.e. what it pays for before rendering anything"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=path)
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+def profile_imports(statements):
+    """Run the imports in a fresh interpreter under -X importtime; returns (total ms, [(cumulative ms, module)])"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', '\n'.join(statements)],
+        capture_output=True, text=True, env={**os.environ, 'PYTHONPATH': os.getcwd()}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed')
+
+    modules = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        # The least-indented entries are the direct imports; their cumulative times add up to the whole
+        if len(indent) == 1:
+            total_us += int(cumulative)
+            modules.append((int(cumulative) / 1000, module))
+    modules.sort(reverse=True)
+    return total_us / 1000, modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold import time of the Streamlit pages and enforce a budget")
+    parser.add_argument('pages', nargs='*', default=DEFAULT_PAGES, help="page scripts to check (default: main.py and pages/*.py)")
+    parser.add_argument('--budget-ms', type=float, default=float(os.getenv('STARTUP_BUDGET_MS', DEFAULT_BUDGET_MS)),
+                        help="maximum cold import time per page in ms (default: STARTUP_BUDGET_MS or %d)" % DEFAULT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=5, help="heaviest imports to list per page")
+    args = parser.parse_args()
+
+    over_budget = []
+    for page in args.pages:
+        try:
+            total_ms, modules = profile_imports(get_page_imports(page))
+        except RuntimeError as e:
+            print(f"{page}: could not import ({e})")
+            over_budget.append(page)
+            continue
+
+        status = "OK" if total_ms <= args.budget_ms else "OVER BUDGET"
+        print(f"{page}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms) {status}")
+        for cumulative_ms, module in modules[:args.top]:
+            print(f"    {cumulative_ms:8.1f} ms  {module}")
+        if total_ms > args.budget_ms:
+            over_budget.append(page)
+
+    if over_budget:
+        print(f"Startup budget exceeded: {', '.join(over_budget)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import gzip
+import os
+import random
+import statistics
+import time
+
+from utils.aqi_surface import SURFACE_RESOLUTION, build_aqi_surface
+from utils.map_artifacts import MAP_MODES, build_aqi_map
+
+DEFAULT_STATIONS = [100, 1000, 5000]
+THAILAND_BOUNDS = [[5.6, 97.3], [20.5, 105.7]]
+
+def make_synthetic_snapshot(count, seed=42):
+    """Generate an hourly snapshot shaped like the pipeline's, with stations spread over Thailand"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        records.append({
+            'station_name': f'Benchmark Station {i}, Thailand',
+            'station_id': 10000 + i,
+            'city': f'Province {i % 77}',
+            'latitude': round(5.6 + rng.random() * 14.8, 4),
+            'longitude': round(97.3 + rng.random() * 8.3, 4),
+            'timestamp': '2024-01-01 12:00:00',
+            'aqi': float(rng.randint(20, 320)),
+            'pm25': rng.randint(10, 250),
+            'pm10': rng.randint(10, 200),
+            'temperature': round(rng.uniform(24, 36), 1),
+            'humidity': round(rng.uniform(40, 90), 1)
+        })
+    return {
+        'query_timestamp': '2024-01-01 12:00:00',
+        'city': 'Thailand',
+        'total_stations': count,
+        'total_data_points': count,
+        'data': records
+    }
+
+def benchmark_mode(data, mode, runs, save_dir=None):
+    """Build and render the map `runs` times; returns (median seconds, html)"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        html = build_aqi_map(data, mode).get_root().render()
+        timings.append(time.perf_counter() - started)
+    if save_dir:
+        os.makedirs(save_dir, exist_ok=True)
+        with open(os.path.join(save_dir, f"map_{mode}_{len(data['data'])}.html"), 'w', encoding='utf-8') as f:
+            f.write(html)
+    return statistics.median(timings), html
+
+def benchmark_surface(data, resolution, runs):
+    """Median seconds to interpolate a resolution x resolution AQI grid over Thailand"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        build_aqi_surface(data['data'], bounds=THAILAND_BOUNDS, resolution=resolution)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML size and render time of the map modes")
+    parser.add_argument('--stations', type=int, nargs='+', default=DEFAULT_STATIONS, help="synthetic station counts")
+    parser.add_argument('--runs', type=int, default=3, help="renders per mode and station count")
+    parser.add_argument('--save-dir', help="write each rendered map here, to compare load times in a browser")
+    parser.add_argument('--surface-resolution', type=int, default=SURFACE_RESOLUTION,
+                        help="grid cells per side of the interpolated AQI surface (default %d)" % SURFACE_RESOLUTION)
+    args = parser.parse_args()
+
+    # Load folium and its templates before timing anything
+    build_aqi_map(make_synthetic_snapshot(1)).get_root().render()
+    build_aqi_surface(make_synthetic_snapshot(1)['data'], resolution=2)
+
+    print(f"{'stations':>8}  {'mode':<8}  {'render':>9}  {'html':>10}  {'gzipped':>10}")
+    for count in args.stations:
+        data = make_synthetic_snapshot(count)
+        for mode in MAP_MODES:
+            seconds, html = benchmark_mode(data, mode, args.runs, args.save_dir)
+            raw = html.encode('utf-8')
+            print(f"{count:>8}  {mode:<8}  {seconds * 1000:>7.0f}ms  {len(raw) / 1024:>8.0f}KB  "
+                  f"{len(gzip.compress(raw)) / 1024:>8.0f}KB")
+        seconds = benchmark_surface(data, args.surface_resolution, args.runs)
+        print(f"{count:>8}  {'surface':<8}  {seconds * 1000:>7.0f}ms  "
+              f"({args.surface_resolution}x{args.surface_resolution} Thailand grid)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+from utils.alert_store import AlertStore
+
+def write_hourly(directory, hour, aqi):
+    """Write an hourly readings file for two stations and return (path, data)"""
+    data = {
+        'query_timestamp': f'2024-01-01 {hour:02d}:00:00',
+        'data': [
+            {'station_id': 1, 'station_name': 'Din Daeng, Bangkok', 'city': 'Bangkok',
+             'timestamp': f'2024-01-01 {hour:02d}:00:00', 'aqi': aqi, 'pm25': aqi / 2},
+            {'station_id': 2, 'station_name': 'Bang Na, Bangkok', 'city': 'Bangkok',
+             'timestamp': f'2024-01-01 {hour:02d}:00:00', 'aqi': aqi - 10, 'pm25': aqi / 3}
+        ]
+    }
+    path = os.path.join(directory, f'bangkok_aqi_data_20240101_{hour:02d}0000.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    return path, data
+
+@pytest.fixture
+def store(tmp_path):
+    store = AlertStore(str(tmp_path / 'alerts.db'))
+    yield store
+    store.close()
+
+def test_latest_reading_survives_backfill(store, tmp_path):
+    hourly = tmp_path / 'hourly'
+    hourly.mkdir()
+    # The pipeline indexes the newest file first; older files are backfilled afterwards
+    path, data = write_hourly(str(hourly), 12, 150)
+    store.ingest_readings(data['data'], path, data['query_timestamp'])
+    write_hourly(str(hourly), 10, 80)
+    write_hourly(str(hourly), 11, 95)
+    store.sync_readings(str(hourly / 'bangkok_aqi_data_*.json'))
+
+    readings = store.latest_station_readings('din daeng')
+    assert [(r['query_timestamp'], r['aqi']) for r in readings] == [('2024-01-01 12:00:00', 150)]
+
+    readings = store.latest_station_readings('bangkok')
+    assert [(r['station_name'], r['aqi']) for r in readings] == [('Din Daeng, Bangkok', 150), ('Bang Na, Bangkok', 140)]
+
+def test_latest_reading_in_ingest_order(store, tmp_path):
+    for hour, aqi in ((10, 80), (11, 95), (12, 150)):
+        path, data = write_hourly(str(tmp_path), hour, aqi)
+        store.ingest_readings(data['data'], path, data['query_timestamp'])
+    assert [r['aqi'] for r in store.latest_station_readings('Din Daeng')] == [150]
+
+def test_station_history_is_newest_first(store, tmp_path):
+    for hour, aqi in ((12, 150), (10, 80), (11, 95)):
+        path, data = write_hourly(str(tmp_path), hour, aqi)
+        store.ingest_readings(data['data'], path, data['query_timestamp'])
+    assert [r['aqi'] for r in store.station_history('Din Daeng')] == [150, 95, 80]
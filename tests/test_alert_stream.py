@@ -0,0 +1,105 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import utils.alert_stream as alert_stream
+from utils.alert_stream import AlertStreamParser, ProgressiveAlertFile, stream_alert_completion
+
+def feed_chunks(parser, text, size):
+    """Feed `text` in `size`-character chunks and collect every completed alert"""
+    completed = []
+    for start in range(0, len(text), size):
+        completed += parser.feed(text[start:start + size])
+    return completed
+
+class FakeStreamClient:
+    """Client whose chat completion streams `text` back in fixed-size chunks"""
+
+    def __init__(self, text, size=7):
+        self.chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        return [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=chunk))])
+                for chunk in self.chunks]
+
+ALERTS = [
+    {'station_name': 'Din Daeng', 'aqi': 152, 'alert': 'Wear a "N95" mask'},
+    {'station_name': 'Bang Na {east}', 'aqi': 98, 'alert': 'Path C:\\tmp } and ] stay in the string'},
+    {'station_name': 'Pathum Wan', 'aqi': 75, 'details': {'pm25': 40, 'advice': {'outdoor': 'limit'}},
+     'tags': ['pm25', {'nested': [1, 2]}]}
+]
+REPLY = json.dumps({'summary': 'Haze over Bangkok', 'alerts': ALERTS}, ensure_ascii=False)
+
+@pytest.mark.parametrize('size', [1, 2, 3, 5, 16, len(REPLY)])
+def test_parser_handles_any_chunk_boundary(size):
+    assert feed_chunks(AlertStreamParser(), REPLY, size) == ALERTS
+
+def test_parser_chunk_boundary_inside_string():
+    parser = AlertStreamParser()
+    assert parser.feed('{"alerts": [{"alert": "brace { and quote \\') == []
+    assert parser.feed('" inside"}') == [{'alert': 'brace { and quote " inside'}]
+
+def test_parser_nested_objects_are_not_split():
+    reply = '{"alerts": [{"a": {"b": {"c": 1}}, "d": [{"e": 2}]}, {"f": 3}]}'
+    assert feed_chunks(AlertStreamParser(), reply, 4) == [{'a': {'b': {'c': 1}}, 'd': [{'e': 2}]}, {'f': 3}]
+
+def test_parser_stops_at_end_of_array():
+    reply = '{"alerts": [{"a": 1}], "other": [{"b": 2}]}'
+    assert feed_chunks(AlertStreamParser(), reply, 3) == [{'a': 1}]
+
+def test_parser_other_key():
+    reply = '{"alerts": [{"a": 1}], "areas": [{"area": "Pathum Wan"}]}'
+    assert feed_chunks(AlertStreamParser('areas'), reply, 5) == [{'area': 'Pathum Wan'}]
+
+def test_parser_without_key_array_completes_nothing():
+    assert feed_chunks(AlertStreamParser(), '{"summary": "all clear", "items": [{"a": 1}]}', 4) == []
+
+def test_stream_delivers_alerts_to_sink_as_they_parse():
+    received = []
+    result, timings = stream_alert_completion(FakeStreamClient(REPLY), 'model', [], sink=received.append)
+    assert received == ALERTS
+    assert result == {'summary': 'Haze over Bangkok', 'alerts': ALERTS}
+    assert timings['time_to_first_alert'] is not None
+
+def test_stream_falls_back_to_full_reply_when_key_array_never_appears():
+    # An escaped key decodes to "alerts" but never matches the streaming pattern
+    reply = '{"\\u0061lerts": [{"a": 1}, {"b": 2}]}'
+    received = []
+    result, timings = stream_alert_completion(FakeStreamClient(reply), 'model', [], sink=received.append)
+    assert received == [{'a': 1}, {'b': 2}]
+    assert result['alerts'] == [{'a': 1}, {'b': 2}]
+    assert timings['time_to_first_alert'] is None
+
+def test_stream_without_alerts_returns_empty_list():
+    received = []
+    result, _ = stream_alert_completion(FakeStreamClient('{"summary": "all clear"}'), 'model', [],
+                                        sink=received.append)
+    assert received == []
+    assert result == {'summary': 'all clear', 'alerts': []}
+
+def test_progressive_file_batches_writes(tmp_path, monkeypatch):
+    writes = []
+    monkeypatch.setattr(alert_stream, 'write_json_atomic', lambda data, path: writes.append(data['total_alerts']))
+    monkeypatch.setattr(alert_stream, 'update_manifest', lambda **artifacts: None)
+    sink = ProgressiveAlertFile(str(tmp_path / 'alerts.json'), flush_every=10, flush_seconds=3600)
+    for i in range(25):
+        sink({'n': i})
+    sink.flush()
+    sink.flush()
+    # First alert at once, then every 10, then the remainder on flush
+    assert writes == [1, 11, 21, 25]
+
+def test_progressive_file_bumps_manifest_on_each_write(tmp_path, monkeypatch):
+    manifests = []
+    monkeypatch.setattr(alert_stream, 'update_manifest', lambda **artifacts: manifests.append(artifacts))
+    path = str(tmp_path / 'alerts.json')
+    sink = ProgressiveAlertFile(path, flush_every=2, flush_seconds=3600)
+    for i in range(5):
+        sink({'n': i})
+    sink.flush()
+    # Writes after alerts 1, 3 and 5; the final flush has nothing new
+    assert manifests == [{'alerts': path}] * 3
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['total_alerts'] == 5
@@ -0,0 +1,107 @@
+import pytest
+
+import utils.answer_cache as answer_cache
+from utils.answer_cache import AnswerCache, normalize_question
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() for the cache module"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(answer_cache.time, 'time', lambda: now[0])
+    return now
+
+def test_normalize_drops_filler_words():
+    assert normalize_question('Which districts have unhealthy air quality right now?') == \
+        normalize_question('Which districts have unhealthy air quality?')
+
+def test_exact_question_hits():
+    cache = AnswerCache()
+    cache.put('Which districts have unhealthy air?', 'v1', 'Din Daeng and Bang Na')
+    assert cache.get('which districts have unhealthy air', 'v1') == 'Din Daeng and Bang Na'
+    assert cache.stats['hits'] == 1
+
+def test_rephrased_question_hits():
+    cache = AnswerCache()
+    cache.put('Which districts have unhealthy air quality today?', 'v1', 'Din Daeng')
+    assert cache.get('Currently, which districts have unhealthy air quality?', 'v1') == 'Din Daeng'
+    assert cache.get("Can you show me which districts have unhealthy air quality right now", 'v1') == 'Din Daeng'
+    assert cache.stats['hits'] == 2
+
+def test_contractions_match_their_expansion():
+    assert normalize_question("What's the AQI at Din Daeng?") == normalize_question('What is the AQI at Din Daeng?')
+    assert normalize_question("Isn't Din Daeng unhealthy?") == normalize_question('Is not Din Daeng unhealthy?')
+
+def test_questions_with_different_numbers_miss():
+    cache = AnswerCache()
+    cache.put('Show the top 5 stations by PM2.5', 'v1', 'five stations')
+    assert cache.get('Show the top 10 stations by PM2.5', 'v1') is None
+    assert cache.get('Show the top stations by PM2.5', 'v1') is None
+
+def test_questions_about_different_stations_miss():
+    cache = AnswerCache()
+    cache.put('Show the PM2.5 trend and health advice for Sathorn station over the last day', 'v1', 'Sathorn')
+    assert cache.get('Show the PM2.5 trend and health advice for Silom station over the last day', 'v1') is None
+    assert cache.get('What is the AQI at Din Daeng station?', 'v1') is None
+    cache.put('What is the AQI at Din Daeng station?', 'v1', 'Din Daeng')
+    assert cache.get('What is the AQI at Bang Na station?', 'v1') is None
+
+def test_question_words_are_kept():
+    cache = AnswerCache()
+    cache.put('Is Din Daeng unhealthy?', 'v1', 'Yes')
+    assert cache.get('Why is Din Daeng unhealthy?', 'v1') is None
+    assert cache.get('Where is Din Daeng unhealthy?', 'v1') is None
+    assert cache.get('Is Din Daeng unhealthy?', 'v1') == 'Yes'
+
+def test_tense_words_are_kept():
+    cache = AnswerCache()
+    cache.put('What is the AQI at Din Daeng?', 'v1', '152')
+    assert cache.get('What was the AQI at Din Daeng?', 'v1') is None
+    assert cache.get('What will the AQI be at Din Daeng?', 'v1') is None
+
+def test_added_or_dropped_place_misses():
+    cache = AnswerCache()
+    city_wide = 'Which schools should cancel outdoor sports because of high PM2.5 levels this afternoon?'
+    cache.put(city_wide, 'v1', 'All schools in Bangkok')
+    assert cache.get(city_wide + ' in Sathorn', 'v1') is None
+    cache.put('What is the AQI in Sathorn?', 'v1', '98')
+    assert cache.get('What is the AQI?', 'v1') is None
+
+def test_added_time_word_misses():
+    cache = AnswerCache()
+    cache.put('Which districts have unhealthy air quality?', 'v1', 'Din Daeng')
+    assert cache.get('Which districts had unhealthy air quality yesterday?', 'v1') is None
+    assert cache.get('Which districts have unhealthy air quality tonight?', 'v1') is None
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnswerCache(ttl=60)
+    cache.put('Which districts have unhealthy air?', 'v1', 'Din Daeng')
+    clock[0] += 59
+    assert cache.get('Which districts have unhealthy air?', 'v1') == 'Din Daeng'
+    clock[0] += 2
+    assert cache.get('Which districts have unhealthy air?', 'v1') is None
+    assert len(cache) == 0
+
+def test_new_data_version_clears_cache():
+    cache = AnswerCache()
+    cache.put('Which districts have unhealthy air?', 'v1', 'Din Daeng')
+    cache.put('What is the worst station now?', 'v1', 'Bang Na')
+    assert cache.get('Which districts have unhealthy air?', 'v2') is None
+    assert len(cache) == 0
+    # Going back to the old version does not bring its answers back
+    assert cache.get('What is the worst station now?', 'v1') is None
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put('Which districts have unhealthy air?', 'v1', 'districts')
+    cache.put('What is the worst station?', 'v1', 'station')
+    assert cache.get('Which districts have unhealthy air?', 'v1') == 'districts'
+    cache.put('Should schools cancel outdoor sports?', 'v1', 'schools')
+    assert cache.get('What is the worst station?', 'v1') is None
+    assert cache.get('Which districts have unhealthy air?', 'v1') == 'districts'
+    assert cache.get('Should schools cancel outdoor sports?', 'v1') == 'schools'
+
+def test_short_questions_and_empty_answers_are_not_cached():
+    cache = AnswerCache()
+    cache.put('AQI?', 'v1', 'about 80')
+    cache.put('Which districts have unhealthy air?', 'v1', '')
+    assert len(cache) == 0
@@ -0,0 +1,183 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from utils.geofence import GeofenceRegistry, _fence_bbox
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi, dlambda = phi2 - phi1, math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def point_in_polygon(lat, lon, polygon):
+    """Even-odd ray casting, one edge at a time"""
+    inside = False
+    for (y1, x1), (y2, x2) in zip(polygon, polygon[1:] + polygon[:1]):
+        if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+def brute_force_match(subscriptions, alerts):
+    """Every alert tested against every subscription"""
+    matches = {}
+    for subscription in subscriptions:
+        found = []
+        for alert in alerts:
+            if alert.get('latitude') is None or alert.get('longitude') is None:
+                continue
+            if (alert.get('aqi') or 0) < subscription.get('min_aqi', 0):
+                continue
+            lat, lon = alert['latitude'], alert['longitude']
+            if subscription.get('polygon'):
+                inside = point_in_polygon(lat, lon, [tuple(vertex) for vertex in subscription['polygon']])
+            else:
+                center = subscription['center']
+                inside = haversine_km(lat, lon, center[0], center[1]) <= subscription['radius_km']
+            if inside:
+                found.append(alert)
+        if found:
+            matches[subscription['id']] = found
+    return matches
+
+def alert(i, lat, lon, aqi=150):
+    return {'station_name': f'Station {i}', 'latitude': lat, 'longitude': lon, 'aqi': aqi}
+
+def names(matches):
+    return {key: sorted(a['station_name'] for a in value) for key, value in matches.items()}
+
+SQUARE = [[13.70, 100.50], [13.70, 100.60], [13.80, 100.60], [13.80, 100.50]]
+
+def test_polygon_vertices_and_edges_follow_half_open_rule():
+    registry = GeofenceRegistry([{'id': 'square', 'polygon': SQUARE}])
+    alerts = [
+        alert('inside', 13.75, 100.55),
+        alert('south edge', 13.70, 100.55), alert('west edge', 13.75, 100.50),
+        alert('north edge', 13.80, 100.55), alert('east edge', 13.75, 100.60),
+        alert('south-west vertex', 13.70, 100.50), alert('north-east vertex', 13.80, 100.60),
+        alert('south-east vertex', 13.70, 100.60), alert('north-west vertex', 13.80, 100.50),
+        alert('outside', 13.85, 100.55)
+    ]
+    matched = names(registry.match(alerts))
+    # Boundary points count on the south and west sides only, like the brute-force ray cast
+    assert matched == {'square': ['Station inside', 'Station south edge', 'Station south-west vertex',
+                                  'Station west edge']}
+    assert matched == names(brute_force_match([{'id': 'square', 'polygon': SQUARE}], alerts))
+
+def test_shared_edge_belongs_to_exactly_one_fence():
+    west = [[13.70, 100.50], [13.70, 100.55], [13.80, 100.55], [13.80, 100.50]]
+    east = [[13.70, 100.55], [13.70, 100.60], [13.80, 100.60], [13.80, 100.55]]
+    registry = GeofenceRegistry([{'id': 'west', 'polygon': west}, {'id': 'east', 'polygon': east}])
+    alerts = [alert(i, 13.70 + i * 0.01, 100.55) for i in range(10)]
+
+    matched = registry.match(alerts)
+
+    claimed = [a['station_name'] for fence in matched.values() for a in fence]
+    assert sorted(claimed) == sorted(a['station_name'] for a in alerts)
+
+def test_concave_polygon():
+    # A U shape: the notch between the arms is outside
+    u_shape = [[0.0, 0.0], [0.0, 3.0], [3.0, 3.0], [3.0, 2.0], [1.0, 2.0], [1.0, 1.0], [3.0, 1.0], [3.0, 0.0]]
+    registry = GeofenceRegistry([{'id': 'u', 'polygon': u_shape}], cell_deg=0.5)
+    alerts = [alert('arm', 2.0, 0.5), alert('notch', 2.0, 1.5), alert('base', 0.5, 1.5), alert('other arm', 2.0, 2.5)]
+    assert names(registry.match(alerts)) == {'u': ['Station arm', 'Station base', 'Station other arm']}
+
+def test_circle_boundary_and_min_aqi():
+    subscriptions = [{'id': 'school', 'center': [13.7271, 100.5473], 'radius_km': 2, 'min_aqi': 100}]
+    registry = GeofenceRegistry(subscriptions)
+    north = math.degrees(2 / EARTH_RADIUS_KM)
+    alerts = [
+        alert('center', 13.7271, 100.5473),
+        alert('just inside', 13.7271 + north * 0.999, 100.5473),
+        alert('just outside', 13.7271 + north * 1.001, 100.5473),
+        alert('clean air', 13.7271, 100.5473, aqi=60)
+    ]
+    assert names(registry.match(alerts)) == {'school': ['Station center', 'Station just inside']}
+
+def test_overlapping_fences_each_get_the_alert():
+    subscriptions = [
+        {'id': 'square', 'polygon': SQUARE},
+        {'id': 'circle', 'center': [13.75, 100.55], 'radius_km': 3},
+        {'id': 'triangle', 'polygon': [[13.72, 100.52], [13.72, 100.58], [13.78, 100.55]]},
+        {'id': 'unhealthy only', 'polygon': SQUARE, 'min_aqi': 151}
+    ]
+    alerts = [alert('center', 13.75, 100.55), alert('corner', 13.705, 100.505), alert('far', 14.5, 101.5)]
+    matched = GeofenceRegistry(subscriptions).match(alerts)
+    assert names(matched) == {'square': ['Station center', 'Station corner'], 'circle': ['Station center'],
+                              'triangle': ['Station center']}
+    assert names(matched) == names(brute_force_match(subscriptions, alerts))
+
+def test_alerts_without_position_are_ignored():
+    registry = GeofenceRegistry([{'id': 'square', 'polygon': SQUARE}])
+    assert registry.match([{'station_name': 'nowhere', 'aqi': 200}]) == {}
+    assert GeofenceRegistry([]).match([alert(0, 13.75, 100.55)]) == {}
+
+def test_invalid_definitions_are_rejected():
+    with pytest.raises(ValueError):
+        _fence_bbox({'id': 'line', 'polygon': [[13.7, 100.5], [13.8, 100.6]]})
+    with pytest.raises(ValueError):
+        _fence_bbox({'id': 'empty'})
+
+def random_polygon(rng, lat, lon, size, vertices):
+    """Star-shaped polygon around (lat, lon); vertices land on grid lines often, to hit edge cases"""
+    points = []
+    for k in range(vertices):
+        angle = 2 * math.pi * k / vertices
+        radius = size * rng.uniform(0.3, 1.0)
+        points.append([round(lat + radius * math.sin(angle), 2), round(lon + radius * math.cos(angle), 2)])
+    return points
+
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_brute_force_on_random_fences(seed):
+    rng = random.Random(seed)
+    subscriptions = []
+    for i in range(200):
+        lat, lon = rng.uniform(13.4, 14.1), rng.uniform(100.2, 100.9)
+        if i % 3:
+            subscriptions.append({'id': f'polygon {i}', 'polygon': random_polygon(rng, lat, lon, rng.uniform(0.02, 0.3),
+                                                                                     rng.randint(3, 9)),
+                                  'min_aqi': rng.choice([0, 0, 100, 150])})
+        else:
+            subscriptions.append({'id': f'circle {i}', 'center': [lat, lon], 'radius_km': rng.uniform(0.5, 15)})
+    # Edge and vertex points come from the small fences
+    polygons = [s['polygon'] for s in subscriptions if s.get('polygon')]
+    # Fences too large for the grid are checked against every alert
+    subscriptions.append({'id': 'thailand', 'polygon': [[5.6, 97.3], [5.6, 105.7], [20.5, 105.7], [20.5, 97.3]]})
+
+    alerts = []
+    for i in range(600):
+        if i % 4 == 0:
+            # On a polygon vertex or edge midpoint
+            polygon = rng.choice(polygons)
+            k = rng.randrange(len(polygon))
+            (y1, x1), (y2, x2) = polygon[k], polygon[(k + 1) % len(polygon)]
+            t = rng.choice([0.0, 0.5])
+            alerts.append(alert(i, y1 + (y2 - y1) * t, x1 + (x2 - x1) * t, aqi=rng.randint(50, 250)))
+        else:
+            alerts.append(alert(i, rng.uniform(13.3, 14.2), rng.uniform(100.1, 101.0), aqi=rng.randint(50, 250)))
+    alerts.append({'station_name': 'unplaced', 'aqi': 300})
+
+    expected = brute_force_match(subscriptions, alerts)
+    actual = GeofenceRegistry(subscriptions).match(alerts)
+
+    # Circles are compared away from their exact rim, where km rounding differs
+    def near_rim(subscription, a):
+        center = subscription.get('center')
+        return center and abs(haversine_km(a['latitude'], a['longitude'], *center) - subscription['radius_km']) < 1e-6
+
+    for subscription in subscriptions:
+        key = subscription['id']
+        got = [a['station_name'] for a in actual.get(key, []) if not near_rim(subscription, a)]
+        want = [a['station_name'] for a in expected.get(key, []) if not near_rim(subscription, a)]
+        assert sorted(got) == sorted(want), key
+    assert len(actual['thailand']) == len(alerts) - 1
+
+def test_grid_prefilter_skips_far_fences():
+    subscriptions = [{'id': f'fence {i}', 'center': [13.0 + i * 0.5, 100.5], 'radius_km': 1} for i in range(10)]
+    registry = GeofenceRegistry(subscriptions)
+    alerts, fences = registry.candidate_pairs(np.array([13.0, 15.0]), np.array([100.5, 100.5]))
+    assert sorted(zip(alerts.tolist(), fences.tolist())) == [(0, 0), (1, 4)]
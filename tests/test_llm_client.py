@@ -0,0 +1,183 @@
+import json
+import time
+
+import pytest
+
+from utils.llm_client import check_run_status, run_assistant_turn, run_tool_calls, stream_run, wait_on_run
+from utils.local_openai import LocalOpenAI
+
+ASSISTANT = 'asst_local'
+DATA_QUESTION = 'What is the AQI at Din Daeng?'
+
+class FakeClock:
+    """Replaces time.monotonic/time.sleep so polling runs without real waits"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(time, 'sleep', clock.sleep)
+    return clock
+
+class ToolHandler:
+    """Answers function calls locally and records them"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, arguments):
+        self.calls.append((name, json.loads(arguments)))
+        return json.dumps({'station_name': 'Din Daeng', 'aqi': 152})
+
+def new_thread(client):
+    return client.beta.threads.create().id
+
+def thread_texts(client, thread_id):
+    return [(m.role, m.content[0].text.value) for m in client.beta.threads.messages.list(thread_id, order='asc').data]
+
+def set_status_after_create(client, monkeypatch, status):
+    """Make every run the client creates end in `status`"""
+    runs = client.beta.threads.runs
+    create = runs.create
+
+    def create_and_end(thread_id, assistant_id, **kwargs):
+        run = create(thread_id, assistant_id, **kwargs)
+        client.runs[run.id].status = status
+        run.status = status
+        return run
+
+    monkeypatch.setattr(runs, 'create', create_and_end)
+
+# Streaming
+
+def test_streamed_reply_reaches_on_text_as_it_grows():
+    client = LocalOpenAI(chunk_size=4)
+    thread_id = new_thread(client)
+    seen = []
+
+    reply = run_assistant_turn(client, thread_id, 'Hello there', ASSISTANT, on_text=seen.append, tool_handler=ToolHandler())
+
+    assert reply == '(local assistant) You asked: Hello there'
+    assert len(seen) == len(range(0, len(reply), 4))
+    assert all(later.startswith(earlier) for earlier, later in zip(seen, seen[1:]))
+    assert seen[-1] == reply
+    assert thread_texts(client, thread_id) == [('user', 'Hello there'), ('assistant', reply)]
+    assert client.usage['run_polls'] == 0
+
+def test_streamed_run_answers_tool_calls_and_continues():
+    client = LocalOpenAI(chunk_size=8)
+    thread_id = new_thread(client)
+    handler = ToolHandler()
+    seen = []
+
+    reply = run_assistant_turn(client, thread_id, DATA_QUESTION, ASSISTANT, on_text=seen.append, tool_handler=handler)
+
+    assert handler.calls == [('get_latest_reading', {'station': 'Din Daeng'})]
+    assert reply.endswith('get_latest_reading: {"station_name": "Din Daeng", "aqi": 152}')
+    assert seen[-1] == reply
+
+def test_stream_run_returns_final_run():
+    client = LocalOpenAI()
+    thread_id = new_thread(client)
+    client.beta.threads.messages.create(thread_id=thread_id, role='user', content='Hello there')
+
+    run, reply = stream_run(client, thread_id=thread_id, assistant_id=ASSISTANT, tools=[])
+
+    assert run.status == 'completed'
+    assert reply == '(local assistant) You asked: Hello there'
+
+# Polling
+
+def test_polling_backs_off_exponentially(clock):
+    client = LocalOpenAI(latency='fixed:3')
+    thread_id = new_thread(client)
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT)
+
+    run = wait_on_run(client, run, thread_id)
+
+    assert run.status == 'completed'
+    assert clock.sleeps == [0.25, 0.5, 1.0, 2.0]
+
+def test_polling_delay_is_capped(clock):
+    client = LocalOpenAI(latency='fixed:10')
+    thread_id = new_thread(client)
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT)
+
+    wait_on_run(client, run, thread_id, initial_delay=0.5, max_delay=2.0)
+
+    assert clock.sleeps == [0.5, 1.0, 2.0, 2.0, 2.0, 2.0, 2.0]
+    assert client.usage['run_polls'] == len(clock.sleeps)
+
+def test_polling_times_out(clock):
+    client = LocalOpenAI(latency='fixed:1000')
+    thread_id = new_thread(client)
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT)
+
+    with pytest.raises(TimeoutError):
+        wait_on_run(client, run, thread_id, timeout=5)
+    assert sum(clock.sleeps) >= 5
+
+def test_polled_turn_submits_tool_outputs(clock):
+    client = LocalOpenAI(latency='fixed:0.1')
+    thread_id = new_thread(client)
+    handler = ToolHandler()
+    seen = []
+
+    reply = run_assistant_turn(client, thread_id, DATA_QUESTION, ASSISTANT, on_text=seen.append, stream=False,
+                               tool_handler=handler)
+
+    assert handler.calls == [('get_latest_reading', {'station': 'Din Daeng'})]
+    assert 'get_latest_reading: {"station_name": "Din Daeng", "aqi": 152}' in reply
+    assert seen == [reply]
+    assert client.runs[next(iter(client.runs))].status == 'completed'
+
+def test_run_tool_calls_builds_outputs():
+    client = LocalOpenAI()
+    thread_id = new_thread(client)
+    client.beta.threads.messages.create(thread_id=thread_id, role='user', content=DATA_QUESTION)
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT, tools=[
+        {'type': 'function', 'function': {'name': 'get_latest_reading',
+                                          'parameters': {'properties': {'station': {}}, 'required': ['station']}}}
+    ])
+    run = client.beta.threads.runs.retrieve(run_id=run.id, thread_id=thread_id)
+    assert run.status == 'requires_action'
+
+    outputs = run_tool_calls(run, ToolHandler())
+
+    call = run.required_action.submit_tool_outputs.tool_calls[0]
+    assert outputs == [{'tool_call_id': call.id, 'output': '{"station_name": "Din Daeng", "aqi": 152}'}]
+
+# Failed runs
+
+@pytest.mark.parametrize('status', ['failed', 'cancelled', 'expired'])
+def test_polled_turn_raises_when_run_does_not_complete(monkeypatch, status):
+    client = LocalOpenAI()
+    thread_id = new_thread(client)
+    set_status_after_create(client, monkeypatch, status)
+
+    with pytest.raises(RuntimeError, match=status):
+        run_assistant_turn(client, thread_id, 'Hello there', ASSISTANT, stream=False, tool_handler=ToolHandler())
+
+@pytest.mark.parametrize('status', ['failed', 'cancelled', 'expired', 'requires_action'])
+def test_check_run_status_rejects_unfinished_runs(status):
+    client = LocalOpenAI()
+    thread_id = new_thread(client)
+    run = client.beta.threads.runs.create(thread_id=thread_id, assistant_id=ASSISTANT)
+    run.status = status
+    with pytest.raises(RuntimeError, match=status):
+        check_run_status(run)
+
+def test_check_run_status_without_run():
+    with pytest.raises(RuntimeError, match='unknown'):
+        check_run_status(None)
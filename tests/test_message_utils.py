@@ -0,0 +1,108 @@
+import pytest
+
+pytest.importorskip('streamlit')
+
+import utils.message_utils as message_utils
+from utils.message_utils import display_chat_history, message_html, new_message
+
+class FakeStreamlit:
+    """Records what display_chat_history draws"""
+
+    def __init__(self, session_state=None):
+        self.session_state = dict(session_state or {})
+        self.buttons = []
+        self.written = []
+
+    def button(self, label, **kwargs):
+        self.buttons.append(label)
+        return False
+
+    def write(self, html, unsafe_allow_html=False):
+        self.written.append(html)
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Count real message HTML builds, starting from an empty cache"""
+    monkeypatch.setattr(message_utils, '_html_cache', type(message_utils._html_cache)())
+    calls = []
+    build = message_utils.build_message_html
+
+    def counting_build(text, *args, **kwargs):
+        calls.append(text)
+        return build(text, *args, **kwargs)
+
+    monkeypatch.setattr(message_utils, 'build_message_html', counting_build)
+    return calls
+
+def make_messages(count):
+    return [new_message('user' if i % 2 == 0 else 'assistant', f'message {i}') for i in range(count)]
+
+def test_history_draws_only_the_window(monkeypatch, builds):
+    fake = FakeStreamlit()
+    monkeypatch.setattr(message_utils, 'st', fake)
+    messages = make_messages(50)
+
+    display_chat_history(messages, 'user.png', 'bot.png', window=20)
+
+    assert len(fake.written) == 20
+    assert builds == [f'message {i}' for i in range(30, 50)]
+    assert fake.buttons == ['Show earlier messages (30 hidden)']
+
+def test_show_earlier_widens_the_window(monkeypatch, builds):
+    fake = FakeStreamlit({'chat_history_shown': 40})
+    monkeypatch.setattr(message_utils, 'st', fake)
+
+    display_chat_history(make_messages(50), 'user.png', 'bot.png', window=20)
+
+    assert len(fake.written) == 40
+    assert fake.buttons == ['Show earlier messages (10 hidden)']
+
+def test_short_history_has_no_button(monkeypatch, builds):
+    fake = FakeStreamlit()
+    monkeypatch.setattr(message_utils, 'st', fake)
+
+    display_chat_history(make_messages(5), 'user.png', 'bot.png', window=20)
+
+    assert len(fake.written) == 5
+    assert fake.buttons == []
+
+def test_older_messages_are_loaded_on_request(monkeypatch, builds):
+    fake = FakeStreamlit({'chat_history_shown': 40})
+    monkeypatch.setattr(message_utils, 'st', fake)
+    transcript = make_messages(50)
+    requested = []
+
+    def load_older(count):
+        requested.append(count)
+        return transcript[30 - count:30]
+
+    display_chat_history(transcript[30:], 'user.png', 'bot.png', window=20, total=50, load_older=load_older)
+
+    assert requested == [20]
+    assert builds == [f'message {i}' for i in range(10, 50)]
+
+def test_unchanged_messages_reuse_cached_html(monkeypatch, builds):
+    monkeypatch.setattr(message_utils, 'st', FakeStreamlit())
+    messages = make_messages(30)
+
+    display_chat_history(messages, 'user.png', 'bot.png', window=20)
+    assert len(builds) == 20
+
+    # A rerun with one new message builds only that message
+    messages.append(new_message('assistant', 'new reply'))
+    fake = FakeStreamlit()
+    monkeypatch.setattr(message_utils, 'st', fake)
+    display_chat_history(messages, 'user.png', 'bot.png', window=20)
+
+    assert builds[20:] == ['new reply']
+    assert len(fake.written) == 20
+
+def test_message_html_is_keyed_by_id_and_icons(builds):
+    message = new_message('assistant', 'hello')
+
+    first = message_html(message, 'user.png', 'bot.png')
+    assert message_html(message, 'user.png', 'bot.png') is first
+    assert builds == ['hello']
+
+    message_html(message, 'user.png', 'other-bot.png')
+    assert builds == ['hello', 'hello']
@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.notifications import LocalSink, NotificationDispatcher, NotificationQueue, enqueue_alert_notifications
+
+def make_alert(i, aqi=150, latitude=13.75, longitude=100.5):
+    return {'station_name': f'Station {i}', 'timestamp': '2024-01-01 12:00:00', 'aqi': aqi,
+            'aqi_level': 'Unhealthy', 'latitude': latitude, 'longitude': longitude}
+
+class FlakySink(LocalSink):
+    """Local sink that fails its first `failures` deliveries"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.attempts = 0
+
+    async def deliver(self, recipient, alerts):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("endpoint down")
+        await super().deliver(recipient, alerts)
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = NotificationQueue(str(tmp_path / 'queue.db'))
+    yield queue
+    queue.close()
+
+def rows(queue):
+    with queue.lock:
+        return queue.conn.execute(
+            'SELECT recipient, status, attempts, next_attempt_at, last_error FROM notifications ORDER BY id').fetchall()
+
+# Queueing
+
+def test_alerts_are_filtered_per_recipient(queue):
+    alerts = [make_alert(0, aqi=80), make_alert(1, aqi=120), make_alert(2, aqi=180)]
+    recipients = [{'id': 'ops', 'type': 'local'}, {'id': 'school', 'type': 'local', 'min_aqi': 150}]
+
+    assert enqueue_alert_notifications(alerts, queue, recipients, subscriptions=[]) == 4
+    assert sorted(queue.due_recipients()) == ['ops', 'school']
+    assert [item['alert']['station_name'] for item in queue.claim_batch('school', 10)] == ['Station 2']
+
+def test_near_recipient_gets_only_nearby_alerts(queue):
+    alerts = [make_alert(0, latitude=13.7271, longitude=100.5473), make_alert(1, latitude=14.5, longitude=101.0)]
+    recipients = [{'id': 'one-bangkok', 'near': {'latitude': 13.7271, 'longitude': 100.5473, 'radius_km': 3}}]
+
+    assert enqueue_alert_notifications(alerts, queue, recipients, subscriptions=[]) == 1
+    assert [item['alert']['station_name'] for item in queue.claim_batch('one-bangkok', 10)] == ['Station 0']
+
+def test_same_alert_is_queued_once_per_recipient(queue):
+    alerts = [make_alert(0), make_alert(1)]
+    recipients = [{'id': 'ops'}, {'id': 'school'}]
+
+    assert enqueue_alert_notifications(alerts, queue, recipients, subscriptions=[]) == 4
+    assert enqueue_alert_notifications(alerts, queue, recipients, subscriptions=[]) == 0
+    # A new reading from the same station is a new notification
+    assert enqueue_alert_notifications([{**make_alert(0), 'timestamp': '2024-01-01 13:00:00'}], queue,
+                                       recipients, subscriptions=[]) == 2
+
+def test_malformed_recipient_is_skipped(queue, capsys):
+    recipients = [{'type': 'local'}, 'not a recipient',
+                  {'id': 'bad-near', 'near': {'radius_km': 2}}, {'id': 'ops'}]
+
+    assert enqueue_alert_notifications([make_alert(0)], queue, recipients, subscriptions=[]) == 1
+    assert queue.due_recipients() == ['ops']
+    assert 'Skipping malformed notification recipient' in capsys.readouterr().out
+
+def test_malformed_subscriptions_are_skipped(queue, capsys):
+    subscriptions = [{'id': 'bad', 'polygon': [[13.7, 100.5], [13.8]]}]
+
+    assert enqueue_alert_notifications([make_alert(0)], queue, [{'id': 'ops'}], subscriptions) == 1
+    assert 'Skipping geofenced subscriptions' in capsys.readouterr().out
+
+def test_unreadable_recipients_file_is_logged(tmp_path, monkeypatch, capsys):
+    path = tmp_path / 'recipients.json'
+    path.write_text('[{"id": "ops",', encoding='utf-8')
+    monkeypatch.setenv('NOTIFY_RECIPIENTS_FILE', str(path))
+
+    assert enqueue_alert_notifications([make_alert(0)], subscriptions=[]) == 0
+    assert 'Could not load notification recipients' in capsys.readouterr().out
+
+def test_outbox_errors_are_logged(tmp_path, capsys):
+    queue = NotificationQueue(str(tmp_path / 'queue.db'))
+    queue.close()
+
+    assert enqueue_alert_notifications([make_alert(0)], queue, [{'id': 'ops'}], subscriptions=[]) == 0
+    assert 'Could not queue alert notifications' in capsys.readouterr().out
+
+# Delivery
+
+def test_delivery_is_batched_per_recipient(queue):
+    queue.enqueue('ops', [make_alert(i) for i in range(5)])
+    queue.enqueue('school', [make_alert(i) for i in range(2)])
+    ops, school = LocalSink(), LocalSink()
+    dispatcher = NotificationDispatcher(queue, {'ops': ops, 'school': school}, workers=2, batch_size=2)
+
+    metrics = asyncio.run(dispatcher.run_once())
+
+    assert [len(alerts) for _, alerts in ops.deliveries] == [2, 2, 1]
+    assert [len(alerts) for _, alerts in school.deliveries] == [2]
+    assert {recipient for recipient, _ in ops.deliveries} == {'ops'}
+    assert metrics['delivered'] == 7
+    assert metrics['batches'] == 4
+    assert metrics['queue_depth'] == {'delivered': 7}
+
+def test_failed_batch_is_retried_after_backoff(queue):
+    queue.enqueue('ops', [make_alert(0), make_alert(1)])
+    sink = FlakySink(failures=1)
+    dispatcher = NotificationDispatcher(queue, {'ops': sink}, base_backoff=30.0)
+
+    failed_at = time.time()
+    metrics = asyncio.run(dispatcher.run_once())
+
+    assert metrics['failed_attempts'] == 2
+    assert [(status, attempts, error) for _, status, attempts, _, error in rows(queue)] == \
+        [('pending', 1, 'endpoint down')] * 2
+    # Not due again until the backoff (30s with jitter down to half) has passed
+    assert queue.due_recipients() == []
+    assert all(next_attempt_at >= failed_at + 15 for _, _, _, next_attempt_at, _ in rows(queue))
+
+    with queue.lock:
+        queue.conn.execute('UPDATE notifications SET next_attempt_at = 0')
+    metrics = asyncio.run(dispatcher.run_once())
+
+    assert metrics['delivered'] == 2
+    assert [len(alerts) for _, alerts in sink.deliveries] == [2]
+    assert [(status, attempts) for _, status, attempts, *_ in rows(queue)] == [('delivered', 2)] * 2
+
+def test_gives_up_after_max_attempts(queue):
+    queue.enqueue('ops', [make_alert(0)])
+    dispatcher = NotificationDispatcher(queue, {'ops': LocalSink(failure_rate=1.0)}, max_attempts=3, base_backoff=0.0)
+
+    for _ in range(5):
+        asyncio.run(dispatcher.run_once())
+
+    assert [(status, attempts) for _, status, attempts, *_ in rows(queue)] == [('failed', 3)]
+
+def test_recipient_without_sink_fails_immediately(queue):
+    queue.enqueue('nobody', [make_alert(0)])
+    asyncio.run(NotificationDispatcher(queue, {}).run_once())
+    assert [(status, attempts) for _, status, attempts, *_ in rows(queue)] == [('failed', 1)]
+
+def test_backoff_grows_exponentially_and_is_capped():
+    dispatcher = NotificationDispatcher(None, {}, base_backoff=10.0, max_backoff=100.0)
+    for attempts, ceiling in ((1, 10.0), (2, 20.0), (3, 40.0), (4, 80.0), (5, 100.0), (9, 100.0)):
+        delay = dispatcher.backoff(attempts)
+        assert ceiling / 2 <= delay <= ceiling
+
+def test_stale_sending_rows_are_requeued(queue):
+    queue.enqueue('ops', [make_alert(0)])
+    assert len(queue.claim_batch('ops', 10)) == 1
+    assert queue.claim_batch('ops', 10) == []
+    queue.requeue_stale()
+    assert len(queue.claim_batch('ops', 10)) == 1
@@ -0,0 +1,107 @@
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from utils.file_utils import write_json_atomic
+
+STAGES = ('load', 'filter', 'generate', 'rank', 'write')
+
+@dataclass
+class AlertPipelineResult:
+    """Everything one alert run produced, kept in memory from load to write"""
+    source: str
+    output_file: str
+    records: List[Dict[str, Any]] = field(default_factory=list)
+    alert_worthy: List[Dict[str, Any]] = field(default_factory=list)
+    alerts: List[Dict[str, Any]] = field(default_factory=list)
+    payload: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+@contextmanager
+def timed(stage, timings):
+    """Record the wall time of a pipeline stage in `timings`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - started
+
+def parse_aqi(value):
+    """Return the AQI as a float, or None for missing values such as '-'"""
+    try:
+        if value is not None and str(value).strip() != '-':
+            return float(value)
+    except (ValueError, TypeError):
+        pass
+    return None
+
+def filter_alert_worthy(records, min_aqi=50):
+    """Keep records with a valid AQI >= min_aqi, worst first"""
+    alert_worthy = []
+    for record in records:
+        aqi = parse_aqi(record.get('aqi'))
+        if aqi is not None and aqi >= min_aqi:
+            alert_worthy.append({**record, 'aqi': aqi})
+    alert_worthy.sort(key=lambda record: record['aqi'], reverse=True)
+    return alert_worthy
+
+def rank_alerts(alerts):
+    """Order alerts by AQI descending; already-ranked input is returned untouched"""
+    keys = [parse_aqi(alert.get('aqi')) or 0 for alert in alerts]
+    if all(keys[i] >= keys[i + 1] for i in range(len(keys) - 1)):
+        return alerts
+    return [alert for _, alert in sorted(zip(keys, alerts), key=lambda pair: pair[0], reverse=True)]
+
+def run_alert_pipeline(
+    load: Callable[[], Tuple[List[Dict[str, Any]], str]],
+    generate: Callable[[List[Dict[str, Any]], Optional[Callable]], Dict[str, Any]],
+    output_file: Union[str, Callable[[str], str]],
+    metadata: Optional[Dict[str, Any]] = None,
+    min_aqi: float = 50,
+    sink_factory: Optional[Callable[[str], Callable[[Dict[str, Any]], None]]] = None,
+) -> AlertPipelineResult:
+    """Run load -> filter -> generate -> rank -> write, writing the alert file exactly once.
+
+    `load` returns the station records and a label for their source, and
+    `output_file` may be a function of that source. `generate` receives the
+    alert-worthy records and the streaming sink (built by `sink_factory` for the
+    output file, if given) and returns the model reply as a dict with an
+    `alerts` list.
+    """
+    timings = {}
+
+    with timed('load', timings):
+        records, source = load()
+        if callable(output_file):
+            output_file = output_file(source)
+        sink = sink_factory(output_file) if sink_factory else None
+
+    with timed('filter', timings):
+        alert_worthy = filter_alert_worthy(records, min_aqi)
+
+    with timed('generate', timings):
+        reply = generate(alert_worthy, sink) if alert_worthy else {'alerts': []}
+        if hasattr(sink, 'flush'):
+            # Batching sinks may still hold the last few streamed alerts
+            sink.flush()
+
+    with timed('rank', timings):
+        alerts = rank_alerts(reply.get('alerts', []))
+
+    with timed('write', timings):
+        payload = {
+            **(metadata or {}),
+            **{key: value for key, value in reply.items() if key != 'alerts'},
+            'total_alerts': len(alerts),
+            'alerts': alerts
+        }
+        write_json_atomic(payload, output_file)
+
+    timings['total'] = sum(timings[stage] for stage in STAGES)
+    return AlertPipelineResult(source, output_file, records, alert_worthy, alerts, payload, timings)
+
+def format_stage_timings(timings):
+    """One-line summary such as 'load 0.01s | filter 0.00s | ... | total 3.20s'"""
+    parts = [f"{stage} {timings[stage]:.2f}s" for stage in STAGES + ('total',) if stage in timings]
+    return " | ".join(parts)
@@ -0,0 +1,309 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from utils.snapshots import ARTIFACT_PATTERNS, load_json_snapshot
+from utils.view_model import build_table_rows
+
+ALERT_STORE_DB = os.path.join('output', 'alerts', 'alerts.db')
+DEFAULT_PAGE_SIZE = 20
+ALERT_COLUMNS = ['station_name', 'city', 'aqi', 'aqi_level', 'pm25_level', 'temperature_level',
+                 'humidity_level', 'alert_type', 'timestamp']
+READING_COLUMNS = ['station_id', 'station_name', 'city', 'latitude', 'longitude', 'timestamp',
+                   'aqi', 'pm25', 'pm10', 'temperature', 'humidity']
+
+_store = None
+_store_lock = threading.Lock()
+
+def _like_pattern(text):
+    escaped = text.lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+class AlertStore:
+    """Indexed SQLite history of alert snapshots and hourly readings.
+
+    Alerts are queried one table page at a time; readings back the chat
+    assistant's data tools (latest by station, worst stations, city summary,
+    station history).
+    """
+
+    def __init__(self, path=ALERT_STORE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_file TEXT NOT NULL UNIQUE,
+                source_mtime INTEGER NOT NULL,
+                total_alerts INTEGER NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                snapshot_id INTEGER NOT NULL REFERENCES snapshots (id),
+                station_name TEXT,
+                station_search TEXT,
+                city TEXT,
+                aqi REAL,
+                aqi_level TEXT,
+                pm25_level REAL,
+                temperature_level REAL,
+                humidity_level REAL,
+                alert_type TEXT,
+                timestamp TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_alerts_aqi ON alerts (snapshot_id, aqi DESC);
+            CREATE INDEX IF NOT EXISTS idx_alerts_city ON alerts (snapshot_id, city, aqi DESC);
+            CREATE INDEX IF NOT EXISTS idx_alerts_level ON alerts (snapshot_id, aqi_level, aqi DESC);
+            CREATE TABLE IF NOT EXISTS reading_files (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_file TEXT NOT NULL UNIQUE,
+                source_mtime INTEGER NOT NULL,
+                query_timestamp TEXT NOT NULL,
+                ingested_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_id INTEGER NOT NULL REFERENCES reading_files (id),
+                query_timestamp TEXT NOT NULL,
+                station_id INTEGER,
+                station_name TEXT,
+                station_search TEXT,
+                city TEXT,
+                latitude REAL,
+                longitude REAL,
+                timestamp TEXT,
+                aqi REAL,
+                pm25 REAL,
+                pm10 REAL,
+                temperature REAL,
+                humidity REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_readings_file ON readings (file_id, aqi DESC);
+            CREATE INDEX IF NOT EXISTS idx_readings_time ON readings (query_timestamp, station_name);
+        ''')
+        self.readings_dir_mtime = None
+        self.conn.commit()
+
+    def ingest(self, alerts, source_file):
+        """Index an alert file's alerts, replacing an older version of the same file; returns the snapshot id"""
+        mtime = os.stat(source_file).st_mtime_ns if os.path.exists(source_file) else 0
+        rows = [
+            tuple(alert.get(column) for column in ALERT_COLUMNS) + ((alert.get('station_name') or '').lower(),)
+            for alert in alerts
+        ]
+        with self.lock:
+            existing = self.conn.execute(
+                'SELECT id, source_mtime FROM snapshots WHERE source_file = ?', (source_file,)).fetchone()
+            if existing and existing[1] == mtime:
+                return existing[0]
+            if existing:
+                # The file was rewritten, e.g. a streamed run finished after a partial ingest
+                self.conn.execute('DELETE FROM alerts WHERE snapshot_id = ?', (existing[0],))
+                self.conn.execute('DELETE FROM snapshots WHERE id = ?', (existing[0],))
+            cursor = self.conn.execute(
+                'INSERT INTO snapshots (source_file, source_mtime, total_alerts, ingested_at) VALUES (?, ?, ?, ?)',
+                (source_file, mtime, len(alerts), time.time()))
+            snapshot_id = cursor.lastrowid
+            self.conn.executemany(
+                f"INSERT INTO alerts (snapshot_id, {', '.join(ALERT_COLUMNS)}, station_search) "
+                f"VALUES (?, {', '.join('?' * len(ALERT_COLUMNS))}, ?)",
+                [(snapshot_id,) + row for row in rows])
+            self.conn.commit()
+        return snapshot_id
+
+    def ensure_snapshot(self, source_file):
+        """Snapshot id for an alert file, indexing it first if the pipeline has not"""
+        mtime = os.stat(source_file).st_mtime_ns
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT id FROM snapshots WHERE source_file = ? AND source_mtime = ?', (source_file, mtime)).fetchone()
+        if row:
+            return row[0]
+        return self.ingest(load_json_snapshot(source_file).get('alerts', []), source_file)
+
+    def _where(self, snapshot_id, city=None, level=None, search=None):
+        clauses, params = ['snapshot_id = ?'], [snapshot_id]
+        if city:
+            clauses.append('city = ?')
+            params.append(city)
+        if level:
+            clauses.append('aqi_level = ?')
+            params.append(level)
+        if search:
+            clauses.append("station_search LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(search))
+        return ' AND '.join(clauses), params
+
+    def count(self, snapshot_id, city=None, level=None, search=None):
+        """Number of alerts matching the filters, counted in the database"""
+        where, params = self._where(snapshot_id, city, level, search)
+        with self.lock:
+            return self.conn.execute(f'SELECT COUNT(*) FROM alerts WHERE {where}', params).fetchone()[0]
+
+    def query_page(self, snapshot_id, city=None, level=None, search=None, page=0, page_size=DEFAULT_PAGE_SIZE):
+        """Return (table rows for one page, total matching alerts), worst AQI first"""
+        total = self.count(snapshot_id, city, level, search)
+        where, params = self._where(snapshot_id, city, level, search)
+        offset = max(page, 0) * page_size
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(ALERT_COLUMNS)} FROM alerts WHERE {where} "
+                f"ORDER BY aqi DESC, id LIMIT ? OFFSET ?",
+                params + [page_size, offset]).fetchall()
+        alerts = [dict(zip(ALERT_COLUMNS, row)) for row in rows]
+        return build_table_rows(alerts, start=offset + 1), total
+
+    def filter_options(self, snapshot_id):
+        """Distinct cities and AQI levels in a snapshot, for the filter widgets"""
+        with self.lock:
+            cities = self.conn.execute(
+                "SELECT DISTINCT city FROM alerts WHERE snapshot_id = ? AND city IS NOT NULL AND city != '' ORDER BY city",
+                (snapshot_id,)).fetchall()
+            levels = self.conn.execute(
+                'SELECT aqi_level, MAX(aqi) FROM alerts WHERE snapshot_id = ? AND aqi_level IS NOT NULL '
+                'GROUP BY aqi_level ORDER BY MAX(aqi) DESC',
+                (snapshot_id,)).fetchall()
+        return [row[0] for row in cities], [row[0] for row in levels]
+
+    def ingest_readings(self, records, source_file, query_timestamp):
+        """Index an hourly readings file, replacing an older version of the same file; returns the file id"""
+        mtime = os.stat(source_file).st_mtime_ns if os.path.exists(source_file) else 0
+        rows = [
+            (query_timestamp,) + tuple(record.get(column) for column in READING_COLUMNS)
+            + ((record.get('station_name') or '').lower(),)
+            for record in records
+        ]
+        with self.lock:
+            existing = self.conn.execute(
+                'SELECT id, source_mtime FROM reading_files WHERE source_file = ?', (source_file,)).fetchone()
+            if existing and existing[1] == mtime:
+                return existing[0]
+            if existing:
+                self.conn.execute('DELETE FROM readings WHERE file_id = ?', (existing[0],))
+                self.conn.execute('DELETE FROM reading_files WHERE id = ?', (existing[0],))
+            cursor = self.conn.execute(
+                'INSERT INTO reading_files (source_file, source_mtime, query_timestamp, ingested_at) VALUES (?, ?, ?, ?)',
+                (source_file, mtime, query_timestamp, time.time()))
+            file_id = cursor.lastrowid
+            self.conn.executemany(
+                f"INSERT INTO readings (file_id, query_timestamp, {', '.join(READING_COLUMNS)}, station_search) "
+                f"VALUES (?, ?, {', '.join('?' * len(READING_COLUMNS))}, ?)",
+                [(file_id,) + row for row in rows])
+            self.conn.commit()
+        return file_id
+
+    def ensure_readings(self, source_file):
+        """File id for an hourly readings file, indexing it first if needed"""
+        mtime = os.stat(source_file).st_mtime_ns
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT id FROM reading_files WHERE source_file = ? AND source_mtime = ?', (source_file, mtime)).fetchone()
+        if row:
+            return row[0]
+        data = load_json_snapshot(source_file)
+        return self.ingest_readings(data.get('data', []), source_file, data.get('query_timestamp', ''))
+
+    def sync_readings(self, pattern=ARTIFACT_PATTERNS['hourly']):
+        """Index hourly files written before the store existed; only rescans when the directory changes"""
+        directory = os.path.dirname(pattern) or '.'
+        if not os.path.isdir(directory):
+            return
+        dir_mtime = os.stat(directory).st_mtime_ns
+        if dir_mtime == self.readings_dir_mtime:
+            return
+        for path in sorted(glob.glob(pattern)):
+            try:
+                self.ensure_readings(path)
+            except (OSError, ValueError) as e:
+                print(f"Could not index readings from {path}: {e}")
+        self.readings_dir_mtime = dir_mtime
+
+    def _reading_rows(self, sql, params):
+        columns = ['query_timestamp'] + READING_COLUMNS
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(columns)} FROM readings WHERE {sql}", params).fetchall()
+        return [dict(zip(columns, row)) for row in rows]
+
+    def latest_station_readings(self, station, limit=5):
+        """Most recent reading of each station whose name contains `station`.
+
+        Chosen by reading time, not by insertion order: sync_readings may
+        backfill older hourly files after newer ones.
+        """
+        return self._reading_rows(
+            "id IN (SELECT id FROM ("
+            "SELECT id, ROW_NUMBER() OVER (PARTITION BY station_name "
+            "ORDER BY query_timestamp DESC, timestamp DESC, id DESC) AS recency "
+            "FROM readings WHERE station_search LIKE ? ESCAPE '\\') WHERE recency = 1) "
+            "ORDER BY aqi DESC LIMIT ?",
+            [_like_pattern(station), limit])
+
+    def worst_readings(self, file_id, limit=5, metric='aqi', city=None):
+        """Top `limit` stations of one readings file by `metric` (aqi or pm25)"""
+        if metric not in ('aqi', 'pm25'):
+            raise ValueError(f"Unknown metric '{metric}', expected 'aqi' or 'pm25'")
+        clauses, params = ['file_id = ?', f'{metric} IS NOT NULL'], [file_id]
+        if city:
+            clauses.append("city LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(city))
+        return self._reading_rows(f"{' AND '.join(clauses)} ORDER BY {metric} DESC LIMIT ?", params + [limit])
+
+    def city_summary(self, file_id, city=None):
+        """Per-city station count and AQI/PM2.5 statistics for one readings file, worst city first"""
+        clauses, params = ['file_id = ?'], [file_id]
+        if city:
+            clauses.append("city LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(city))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT city, COUNT(*), ROUND(AVG(aqi), 1), MAX(aqi), MIN(aqi), ROUND(AVG(pm25), 1) "
+                f"FROM readings WHERE {' AND '.join(clauses)} GROUP BY city ORDER BY MAX(aqi) DESC",
+                params).fetchall()
+        keys = ['city', 'stations', 'avg_aqi', 'max_aqi', 'min_aqi', 'avg_pm25']
+        return [dict(zip(keys, row)) for row in rows]
+
+    def station_history(self, station, start=None, end=None, limit=48):
+        """Readings of stations matching `station` between `start` and `end` (query timestamps), newest first"""
+        clauses, params = ["station_search LIKE ? ESCAPE '\\'"], [_like_pattern(station)]
+        if start:
+            clauses.append('query_timestamp >= ?')
+            params.append(start)
+        if end:
+            clauses.append('query_timestamp <= ?')
+            params.append(end)
+        return self._reading_rows(
+            f"{' AND '.join(clauses)} ORDER BY query_timestamp DESC, station_name LIMIT ?", params + [limit])
+
+    def close(self):
+        self.conn.close()
+
+def get_alert_store(path=ALERT_STORE_DB):
+    """Process-wide store shared by every session"""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = AlertStore(path)
+        return _store
+
+def index_alerts(alerts, source_file):
+    """Add a freshly written alert file to the store; indexing failures never fail the pipeline"""
+    try:
+        return get_alert_store().ingest(alerts, source_file)
+    except sqlite3.Error as e:
+        print(f"Could not index alerts from {source_file}: {e}")
+        return None
+
+def index_readings(data, source_file):
+    """Add a freshly written hourly readings file to the store; indexing failures never fail the pipeline"""
+    try:
+        return get_alert_store().ingest_readings(data.get('data', []), source_file, data.get('query_timestamp', ''))
+    except sqlite3.Error as e:
+        print(f"Could not index readings from {source_file}: {e}")
+        return None
@@ -0,0 +1,167 @@
+import json
+import re
+import time
+
+from utils.file_utils import write_json_atomic
+from utils.snapshots import update_manifest
+
+# Progressive alert file writes: at most one per this many alerts or seconds
+PROGRESSIVE_FLUSH_ALERTS = 10
+PROGRESSIVE_FLUSH_SECONDS = 0.5
+
+class AlertStreamParser:
+    """Incrementally extract completed objects from the `alerts` array (or another `key`) of a streamed JSON reply"""
+
+    def __init__(self, key='alerts'):
+        self.key = key
+        self.array_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.text = ""
+        self.position = 0
+        self.in_array = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+
+    def feed(self, chunk):
+        """Add a chunk of streamed text and return the alerts it completed"""
+        self.text += chunk
+        completed = []
+
+        if not self.in_array:
+            match = self.array_pattern.search(self.text)
+            if not match:
+                return completed
+            self.in_array = True
+            self.position = match.end()
+
+        while self.position < len(self.text) and not self.finished:
+            char = self.text[self.position]
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                if self.depth == 0:
+                    self.object_start = self.position
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0 and self.object_start is not None:
+                    try:
+                        completed.append(json.loads(self.text[self.object_start:self.position + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self.object_start = None
+            elif char == ']' and self.depth == 0:
+                self.finished = True
+
+            self.position += 1
+
+        return completed
+
+class ProgressiveAlertFile:
+    """Alert sink that rewrites the alert file as alerts arrive so the dashboard fills progressively.
+
+    The first alert is written straight away; after that, writes are batched to
+    one per `flush_every` alerts or `flush_seconds`, whichever comes first, so a
+    long reply does not rewrite the growing file once per alert. Every write
+    also bumps the snapshot manifest. Call flush() when the stream ends to
+    write whatever is still pending.
+    """
+
+    def __init__(self, filepath, metadata=None, flush_every=PROGRESSIVE_FLUSH_ALERTS,
+                 flush_seconds=PROGRESSIVE_FLUSH_SECONDS):
+        self.filepath = filepath
+        self.metadata = metadata or {}
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.alerts = []
+        self.written = 0
+        self.last_flush = None
+
+    def __call__(self, alert):
+        self.alerts.append(alert)
+        if (self.last_flush is None
+                or len(self.alerts) - self.written >= self.flush_every
+                or time.perf_counter() - self.last_flush >= self.flush_seconds):
+            self.flush()
+
+    def flush(self):
+        """Write any alerts received since the last write"""
+        if self.written == len(self.alerts):
+            return
+        write_json_atomic({
+            **self.metadata,
+            'total_alerts': len(self.alerts),
+            'complete': False,
+            'alerts': self.alerts
+        }, self.filepath)
+        self.written = len(self.alerts)
+        self.last_flush = time.perf_counter()
+        # Point the dashboard at this file while it is still filling in; each write
+        # changes the manifest version, so live sections pick up the new alerts
+        update_manifest(alerts=self.filepath)
+
+def stream_alert_completion(client, model, messages, sink=None, temperature=0.3, key='alerts'):
+    """Stream a JSON alert completion, pushing each item of the `key` array to `sink` as soon as it is complete.
+
+    Returns the parsed response object and a dict of timings in seconds.
+    """
+    started = time.perf_counter()
+    parser = AlertStreamParser(key)
+    alerts = []
+    timings = {'time_to_first_token': None, 'time_to_first_alert': None}
+
+    stream = client.chat.completions.create(
+        model=model,
+        response_format={"type": "json_object"},
+        messages=messages,
+        temperature=temperature,
+        stream=True
+    )
+
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        if timings['time_to_first_token'] is None:
+            timings['time_to_first_token'] = time.perf_counter() - started
+
+        for alert in parser.feed(delta):
+            if timings['time_to_first_alert'] is None:
+                timings['time_to_first_alert'] = time.perf_counter() - started
+            alerts.append(alert)
+            if sink:
+                sink(alert)
+
+    timings['total'] = time.perf_counter() - started
+
+    # The full reply is still needed for any keys outside the alerts array
+    try:
+        result = json.loads(parser.text)
+    except json.JSONDecodeError:
+        result = {}
+
+    if not alerts and result.get(key):
+        # The reply did not stream in a shape the parser recognised; deliver it in one go
+        alerts = result[key]
+        if sink:
+            for alert in alerts:
+                sink(alert)
+
+    result[key] = alerts
+    return result, timings
+
+def is_streaming_enabled(value):
+    """Interpret a config value such as the ALERT_STREAMING env var as a boolean"""
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
@@ -0,0 +1,105 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+ANSWER_CACHE_TTL_SECONDS = 900
+MAX_CACHED_ANSWERS = 500
+MIN_QUESTION_TOKENS = 2
+
+TOKEN_PATTERN = re.compile(r"\w+(?:\.\w+)*")
+CONTRACTIONS = ((re.compile(r"n['\u2019]t\b"), " not"), (re.compile(r"['\u2019]s\b"), " is"),
+                (re.compile(r"['\u2019]ll\b"), " will"), (re.compile(r"['\u2019]re\b"), " are"))
+# Words that do not change what is being asked about the current snapshot. Unlike the
+# retrieval index's stopwords, question words (why, how, when, where, which, who) and
+# tense (is, was, will) are kept: they change the answer.
+FILLER_WORDS = frozenset(
+    'a an and any at by can could currently current for from give i in just latest list me my now of on '
+    'please right show some tell the there this to today would you your'.split()
+)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def normalize_question(question):
+    """Cache key of a question: its content words, sorted and without repeats.
+
+    'Which districts are unhealthy right now?' and 'Which districts are
+    unhealthy?' share a key; adding, dropping or changing any content word
+    (a place, station, number, time or question word) gives a different one.
+    """
+    text = (question or '').lower()
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return tuple(sorted({token for token in TOKEN_PATTERN.findall(text) if token not in FILLER_WORDS}))
+
+class AnswerCache:
+    """Chat answers keyed by normalized question and data version, with TTL and LRU eviction.
+
+    Questions match only when they have the same content words; fuzzy
+    matching would hand out answers to questions that differ by a place,
+    a time or a question word.
+
+    Only answers for the current data version are kept: the first lookup or
+    store with a newer version drops everything cached for the old one.
+    """
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL_SECONDS, max_entries=MAX_CACHED_ANSWERS):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = OrderedDict()  # normalized tokens -> (answer, stored_at)
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _switch_version(self, version):
+        """Drop answers computed from an older snapshot; caller holds the lock"""
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, question, version):
+        """Cached answer for the question under this data version, else None"""
+        tokens = normalize_question(question)
+        if len(tokens) < MIN_QUESTION_TOKENS:
+            return None
+        now = time.time()
+        with self.lock:
+            self._switch_version(version)
+            for key in [k for k, (_, stored_at) in self.entries.items() if now - stored_at > self.ttl]:
+                del self.entries[key]
+
+            entry = self.entries.get(tokens)
+            if entry is not None:
+                self.entries.move_to_end(tokens)
+                self.stats['hits'] += 1
+                return entry[0]
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, question, version, answer):
+        tokens = normalize_question(question)
+        if len(tokens) < MIN_QUESTION_TOKENS or not answer:
+            return
+        with self.lock:
+            self._switch_version(version)
+            self.entries[tokens] = (answer, time.time())
+            self.entries.move_to_end(tokens)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+def get_answer_cache(ttl=ANSWER_CACHE_TTL_SECONDS):
+    """Process-wide cache shared by every session"""
+    global _cache
+    with _cache_lock:
+        if _cache is None or _cache.ttl != ttl:
+            _cache = AnswerCache(ttl=ttl)
+        return _cache
@@ -0,0 +1,155 @@
+import json
+import math
+import os
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from utils.file_utils import write_bytes_atomic, write_json_atomic
+from utils.spatial_index import chord_km, nearest_points, to_cartesian
+
+SURFACE_DIR = os.path.join('output', 'maps', 'surface')
+SURFACE_RESOLUTION = 500      # grid cells per side
+IDW_NEIGHBORS = 8             # stations that contribute to each cell
+IDW_POWER = 2
+MAX_DISTANCE_KM = 25          # cells with no station this close stay transparent
+BOUNDS_PADDING_DEG = 0.05
+KEEP_SURFACES = 24
+
+# Same scale as the map's colormap legend: green at 0 through maroon at 300
+AQI_SCALE_MIN, AQI_SCALE_MAX = 0, 300
+AQI_SCALE_COLORS = np.array([
+    (0, 128, 0), (255, 255, 0), (255, 165, 0), (255, 0, 0), (128, 0, 128), (128, 0, 0)
+], dtype=float)
+
+_lock = threading.Lock()
+
+def _mercator_y(latitude):
+    return math.log(math.tan(math.pi / 4 + math.radians(latitude) / 2))
+
+def station_bounds(latitudes, longitudes, padding=BOUNDS_PADDING_DEG):
+    """[[south, west], [north, east]] around the stations"""
+    return [[float(np.min(latitudes)) - padding, float(np.min(longitudes)) - padding],
+            [float(np.max(latitudes)) + padding, float(np.max(longitudes)) + padding]]
+
+def interpolate_idw(points, values, queries, k=IDW_NEIGHBORS, power=IDW_POWER, max_distance=MAX_DISTANCE_KM):
+    """Inverse-distance weighted estimate at each query point from its k nearest points.
+
+    Points and queries are Earth-centred coordinates from to_cartesian. Queries
+    with no point within `max_distance` km get NaN; a query on top of a point
+    gets its value.
+    """
+    values = np.asarray(values, dtype=float)
+    k = max(1, min(k, len(values)))
+    distances, indices = nearest_points(points, queries, k, chord_km(max_distance))
+
+    found = np.isfinite(distances)
+    neighbour_values = np.append(values, 0.0)[indices]
+    with np.errstate(divide='ignore'):
+        weights = np.where(found, 1.0 / np.maximum(distances, 1e-9) ** power, 0.0)
+    totals = weights.sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        estimates = (weights * neighbour_values).sum(axis=1) / totals
+    estimates[totals == 0] = np.nan
+    return estimates
+
+def build_aqi_surface(stations, bounds=None, resolution=SURFACE_RESOLUTION, k=IDW_NEIGHBORS,
+                      power=IDW_POWER, max_distance=MAX_DISTANCE_KM):
+    """Gridded AQI estimate over `bounds` (default: around the stations), north row first.
+
+    Returns (grid, bounds); `grid` is resolution x resolution with NaN where
+    no station is within `max_distance` km.
+    """
+    stations = [s for s in stations if s.get('latitude') and s.get('longitude') and s.get('aqi') is not None]
+    if not stations:
+        return None, None
+    latitudes = np.array([s['latitude'] for s in stations], dtype=float)
+    longitudes = np.array([s['longitude'] for s in stations], dtype=float)
+    values = np.array([s['aqi'] for s in stations], dtype=float)
+    bounds = bounds or station_bounds(latitudes, longitudes)
+    (south, west), (north, east) = bounds
+
+    # Cell centres, north to south and west to east, so row 0 is the top of the image. Rows
+    # are evenly spaced in Web Mercator, so the image lines up with the map tiles.
+    top, bottom = _mercator_y(north), _mercator_y(south)
+    row_y = top - (np.arange(resolution) + 0.5) * (top - bottom) / resolution
+    row_latitudes = np.degrees(2 * np.arctan(np.exp(row_y)) - np.pi / 2)
+    column_longitudes = west + (np.arange(resolution) + 0.5) * (east - west) / resolution
+    grid_longitudes, grid_latitudes = np.meshgrid(column_longitudes, row_latitudes)
+
+    estimates = interpolate_idw(
+        to_cartesian(latitudes, longitudes),
+        values,
+        to_cartesian(grid_latitudes.ravel(), grid_longitudes.ravel()),
+        k, power, max_distance
+    )
+    return estimates.reshape(resolution, resolution), bounds
+
+def surface_to_rgba(grid):
+    """Colour a grid on the AQI legend scale; NaN cells are fully transparent"""
+    stops = np.linspace(AQI_SCALE_MIN, AQI_SCALE_MAX, len(AQI_SCALE_COLORS))
+    clipped = np.clip(np.nan_to_num(grid, nan=AQI_SCALE_MIN), AQI_SCALE_MIN, AQI_SCALE_MAX)
+    rgba = np.empty(grid.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(clipped, stops, AQI_SCALE_COLORS[:, channel]).round()
+    rgba[..., 3] = np.where(np.isnan(grid), 0, 255)
+    return rgba
+
+def encode_png(rgba):
+    """Encode an (height, width, 4) uint8 array as PNG bytes"""
+    height, width = rgba.shape[:2]
+    # Each scanline starts with filter type 0 (none)
+    raw = np.hstack([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)]).tobytes()
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b'')
+
+def surface_paths(content_hash, resolution=SURFACE_RESOLUTION):
+    base = os.path.join(SURFACE_DIR, f'aqi_surface_{content_hash}_{resolution}')
+    return base + '.png', base + '.json'
+
+def get_aqi_surface(data, content_hash, resolution=SURFACE_RESOLUTION):
+    """Return (png_bytes, bounds) of the AQI surface for a snapshot, built once and cached on disk.
+
+    `content_hash` identifies the snapshot (see map_artifacts.snapshot_hash).
+    Returns (None, None) when no station has a position and an AQI.
+    """
+    png_path, meta_path = surface_paths(content_hash, resolution)
+    with _lock:
+        if not (os.path.exists(png_path) and os.path.exists(meta_path)):
+            started = time.perf_counter()
+            grid, bounds = build_aqi_surface(data['data'], resolution=resolution)
+            if grid is None:
+                return None, None
+            write_bytes_atomic(encode_png(surface_to_rgba(grid)), png_path)
+            write_json_atomic({'bounds': bounds, 'resolution': resolution}, meta_path)
+            print(f"Built {resolution}x{resolution} AQI surface in {time.perf_counter() - started:.2f}s")
+            prune_surfaces()
+        with open(png_path, 'rb') as f:
+            png = f.read()
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            bounds = json.load(f)['bounds']
+    return png, bounds
+
+def prune_surfaces(keep=KEEP_SURFACES):
+    """Delete all but the newest `keep` surfaces"""
+    if not os.path.isdir(SURFACE_DIR):
+        return
+    images = sorted(
+        (os.path.join(SURFACE_DIR, name) for name in os.listdir(SURFACE_DIR)
+         if name.startswith('aqi_surface_') and name.endswith('.png')),
+        key=os.path.getmtime,
+        reverse=True
+    )
+    for path in images[keep:]:
+        for stale in (path, os.path.splitext(path)[0] + '.json'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
@@ -0,0 +1,89 @@
+AQI_THRESHOLDS = {
+    'Good': (0, 50),
+    'Moderate': (51, 100),
+    'Unhealthy for Sensitive Groups': (101, 150),
+    'Unhealthy': (151, 200),
+    'Very Unhealthy': (201, 300),
+    'Hazardous': (301, float('inf'))
+}
+
+def get_aqi_category(aqi):
+    """Determine AQI category based on value"""
+    if aqi is None:
+        return "Unknown"
+    for category, (min_val, max_val) in AQI_THRESHOLDS.items():
+        if min_val <= aqi <= max_val:
+            return category
+    return "Unknown"
+
+def get_alert_level(aqi):
+    """Determine alert level based on AQI value"""
+    if aqi is None:
+        return "unknown"
+    if aqi <= 100:
+        return "info"
+    elif aqi <= 150:
+        return "warning"
+    return "danger"
+
+def get_health_implications(aqi_category):
+    """Get health implications based on AQI category"""
+    implications = {
+        'Moderate': 'Air quality is acceptable; however, some pollutants may affect very sensitive individuals.',
+        'Unhealthy for Sensitive Groups': 'Members of sensitive groups may experience health effects. General public is less likely to be affected.',
+        'Unhealthy': 'Everyone may begin to experience health effects; members of sensitive groups may experience more serious health effects.',
+        'Very Unhealthy': 'Health alert: The risk of health effects is increased for everyone.',
+        'Hazardous': 'Health warning of emergency conditions: everyone is more likely to be affected.'
+    }
+    return implications.get(aqi_category, 'Air quality is generally good.')
+
+def get_recommended_actions(aqi_category):
+    """Get recommended actions based on AQI category"""
+    base_actions = [
+        {'action': '😷 Wear masks when outdoors', 'priority': 'Immediate'},
+        {'action': '🪟 Keep windows closed during peak pollution', 'priority': 'Preventive'}
+    ]
+
+    if aqi_category in ['Unhealthy', 'Very Unhealthy', 'Hazardous']:
+        return [
+            {'action': '🚫 Avoid outdoor activities', 'priority': 'Immediate'},
+            {'action': '🏠 Stay indoors with air purifiers', 'priority': 'Immediate'},
+            {'action': '😷 Wear N95 masks if outdoors', 'priority': 'Immediate'},
+            {'action': '⚕️ Monitor health symptoms', 'priority': 'Immediate'}
+        ]
+    elif aqi_category == 'Unhealthy for Sensitive Groups':
+        return [
+            {'action': '🌳 Sensitive groups should limit outdoor exposure', 'priority': 'Immediate'},
+            {'action': '🌬️ Use air purifiers indoors', 'priority': 'Preventive'}
+        ] + base_actions
+    else:
+        return base_actions
+
+def build_basic_alert(record):
+    """Build a rule-based alert for a single station record"""
+    aqi = float(record['aqi'])
+    aqi_category = get_aqi_category(aqi)
+    alert_level = get_alert_level(aqi)
+    pm25 = record.get('pm25')
+    pm10 = record.get('pm10')
+
+    return {
+        'timestamp': record.get('timestamp'),
+        'station_name': record.get('station_name'),
+        'city': record.get('city'),
+        'aqi': aqi,
+        'pm25_level': pm25,
+        'pm25_type': 'Normal' if pm25 is None or pm25 <= 50 else 'Above Threshold',
+        'pm10_level': pm10,
+        'pm10_type': 'Normal' if pm10 is None or pm10 <= 100 else 'Above Threshold',
+        'temperature_level': record.get('temperature'),
+        'temperature_type': 'Normal',
+        'humidity_level': record.get('humidity'),
+        'humidity_type': 'Normal',
+        'latitude': record.get('latitude'),
+        'longitude': record.get('longitude'),
+        'aqi_level': aqi_category,
+        'alert_type': f'Air Quality {alert_level.title()}',
+        'health_implications': get_health_implications(aqi_category),
+        'recommended_actions': get_recommended_actions(aqi_category)
+    }
@@ -0,0 +1,119 @@
+import json
+from collections import OrderedDict
+
+from utils.alert_stream import stream_alert_completion
+from utils.aqi_utils import build_basic_alert, get_aqi_category
+from utils.prompt_instructions import get_area_advice_system_prompt
+
+AREA_LEVELS = ('city', 'district', 'grid')
+DEFAULT_GRID_SIZE = 0.1  # degrees, roughly 11 km
+STATION_FIELDS = ['station_name', 'aqi', 'pm25', 'pm10', 'temperature', 'humidity']
+
+def get_area_key(record, level='city', grid_size=DEFAULT_GRID_SIZE):
+    """Name the area a station belongs to at the given aggregation level"""
+    if level == 'grid':
+        lat, lon = record.get('latitude'), record.get('longitude')
+        if lat is None or lon is None:
+            return record.get('city') or 'Unknown'
+        return f"grid {round(float(lat) // grid_size * grid_size, 4)},{round(float(lon) // grid_size * grid_size, 4)}"
+    if level == 'district':
+        parts = [part.strip() for part in (record.get('station_name') or '').split(',')]
+        if len(parts) > 2 and parts[1]:
+            return parts[1]
+    return record.get('city') or record.get('station_name') or 'Unknown'
+
+def group_by_area(records, level='city', grid_size=DEFAULT_GRID_SIZE):
+    """Group station records by area, keeping the input order within each group"""
+    if level not in AREA_LEVELS:
+        raise ValueError(f"Unknown aggregation level '{level}', expected one of {AREA_LEVELS}")
+    groups = OrderedDict()
+    for record in records:
+        groups.setdefault(get_area_key(record, level, grid_size), []).append(record)
+    return groups
+
+def _mean(values):
+    values = [float(v) for v in values if isinstance(v, (int, float))]
+    return round(sum(values) / len(values), 1) if values else None
+
+def summarize_area(area, members, worst_k=3):
+    """Compact summary of one area plus its worst stations"""
+    worst = sorted(members, key=lambda record: record.get('aqi') or 0, reverse=True)[:worst_k]
+    max_aqi = worst[0].get('aqi') if worst else None
+    return {
+        'area': area,
+        'station_count': len(members),
+        'max_aqi': max_aqi,
+        'mean_aqi': _mean(record.get('aqi') for record in members),
+        'mean_pm25': _mean(record.get('pm25') for record in members),
+        'aqi_level': get_aqi_category(max_aqi),
+        'worst_stations': [{field: record.get(field) for field in STATION_FIELDS} for record in worst]
+    }
+
+def build_area_payload(records, level='city', worst_k=3, grid_size=DEFAULT_GRID_SIZE):
+    """Build the LLM input for area-level advice; its size grows with areas, not stations"""
+    groups = group_by_area(records, level, grid_size)
+    summaries = [summarize_area(area, members, worst_k) for area, members in groups.items()]
+    summaries.sort(key=lambda summary: summary['max_aqi'] or 0, reverse=True)
+    payload = {
+        'aggregation': level,
+        'total_areas': len(summaries),
+        'total_stations': len(records),
+        'areas': summaries
+    }
+    return payload, groups
+
+def fan_out_area_advice(advice, members):
+    """Turn one area's advice into per-station alerts carrying each station's own readings"""
+    alerts = []
+    for record in members:
+        alert = build_basic_alert(record)
+        for field in ('alert_type', 'health_implications', 'recommended_actions'):
+            if advice.get(field):
+                alert[field] = advice[field]
+        alert['area'] = advice.get('area')
+        alerts.append(alert)
+    return alerts
+
+def generate_area_alerts(client, model, records, level='city', worst_k=3, sink=None, streaming=False):
+    """Ask for advice per area, then fan it back out to every member station.
+
+    When streaming, each area's stations are pushed to `sink` as soon as that
+    area's advice has been parsed. Areas the model skips fall back to the
+    rule-based alerts.
+    """
+    payload, groups = build_area_payload(records, level, worst_k)
+    messages = [
+        {"role": "system", "content": get_area_advice_system_prompt()},
+        {"role": "user", "content": f"Write area-level air quality advice for these areas:\n{json.dumps(payload, ensure_ascii=False, indent=2)}"}
+    ]
+
+    alerts = []
+    advised = set()
+
+    def fan_out(advice):
+        members = groups.get(advice.get('area'))
+        if not members or advice.get('area') in advised:
+            return
+        advised.add(advice['area'])
+        for alert in fan_out_area_advice(advice, members):
+            alerts.append(alert)
+            if sink:
+                sink(alert)
+
+    if streaming:
+        stream_alert_completion(client, model, messages, sink=fan_out, key='areas')
+    else:
+        response = client.chat.completions.create(
+            model=model,
+            response_format={"type": "json_object"},
+            messages=messages,
+            temperature=0.3
+        )
+        for advice in json.loads(response.choices[0].message.content).get('areas', []):
+            fan_out(advice)
+
+    for area, members in groups.items():
+        if area not in advised:
+            fan_out({'area': area})
+
+    return alerts
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+
+from utils.file_utils import file_checksum, write_json_atomic
+from utils.snapshots import get_latest_artifact
+
+ATTACHMENT_REGISTRY = os.path.join('output', 'attachments', 'registry.json')
+KEEP_UPLOADS_PER_KIND = 2   # the current snapshot and the one before it, for conversations still using it
+
+_manager = None
+_manager_lock = threading.Lock()
+
+class AttachmentManager:
+    """Upload each data snapshot to the files API once and reuse its file id across sessions.
+
+    Uploads are keyed by content checksum in a JSON registry, so the same
+    snapshot is never sent twice, even after a restart. When a newer snapshot
+    of the same kind is uploaded, uploads beyond the newest
+    KEEP_UPLOADS_PER_KIND are deleted from the files API.
+    """
+
+    def __init__(self, client, registry_path=ATTACHMENT_REGISTRY, keep=KEEP_UPLOADS_PER_KIND):
+        self.client = client
+        self.registry_path = registry_path
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.checksums = {}     # (path, mtime, size) -> checksum
+        self.verified = set()   # file ids confirmed to exist in this process
+        self.stats = {'uploads': 0, 'reused': 0, 'deleted': 0}
+
+    def _load_registry(self):
+        if not os.path.exists(self.registry_path):
+            return {}
+        try:
+            with open(self.registry_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _checksum(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        if key not in self.checksums:
+            self.checksums = {k: v for k, v in self.checksums.items() if k[0] != key[0]}
+            self.checksums[key] = file_checksum(path)
+        return self.checksums[key]
+
+    def _exists(self, file_id):
+        """Check once per process that a registered upload was not deleted on the server"""
+        if file_id in self.verified:
+            return True
+        try:
+            self.client.files.retrieve(file_id)
+        except Exception as e:
+            print(f"Registered attachment {file_id} is no longer available: {e}")
+            return False
+        self.verified.add(file_id)
+        return True
+
+    def get_file_id(self, path, kind='alerts'):
+        """File id for `path`, uploading it only if this exact content has not been uploaded before"""
+        with self.lock:
+            checksum = self._checksum(path)
+            registry = self._load_registry()
+            entry = registry.get(checksum)
+            if entry and self._exists(entry['file_id']):
+                self.stats['reused'] += 1
+                return entry['file_id']
+
+            started = time.perf_counter()
+            with open(path, 'rb') as f:
+                uploaded = self.client.files.create(file=f, purpose='assistants')
+            self.stats['uploads'] += 1
+            self.verified.add(uploaded.id)
+            print(f"Uploaded {os.path.basename(path)} as {uploaded.id} in {time.perf_counter() - started:.2f}s")
+
+            registry[checksum] = {
+                'file_id': uploaded.id,
+                'kind': kind,
+                'path': path,
+                'bytes': os.path.getsize(path),
+                'uploaded_at': time.time()
+            }
+            self._collect_garbage(registry, kind)
+            write_json_atomic(registry, self.registry_path)
+            return uploaded.id
+
+    def _collect_garbage(self, registry, kind):
+        """Delete uploads of `kind` superseded by newer snapshots; caller holds the lock"""
+        uploads = sorted(
+            ((checksum, entry) for checksum, entry in registry.items() if entry.get('kind') == kind),
+            key=lambda item: item[1]['uploaded_at'],
+            reverse=True
+        )
+        for checksum, entry in uploads[self.keep:]:
+            try:
+                self.client.files.delete(entry['file_id'])
+            except Exception as e:
+                # Already gone or temporarily unreachable; forget it either way
+                print(f"Could not delete superseded attachment {entry['file_id']}: {e}")
+            self.verified.discard(entry['file_id'])
+            del registry[checksum]
+            self.stats['deleted'] += 1
+
+def get_attachment_manager(client, registry_path=ATTACHMENT_REGISTRY):
+    """Process-wide manager shared by every session"""
+    global _manager
+    with _manager_lock:
+        if _manager is None or _manager.client is not client or _manager.registry_path != registry_path:
+            _manager = AttachmentManager(client, registry_path)
+        return _manager
+
+def get_snapshot_file_id(client, kind='alerts'):
+    """File id of the latest snapshot of `kind` (e.g. the alert JSON), or None when there is none"""
+    path = get_latest_artifact(kind)
+    if not path:
+        return None
+    return get_attachment_manager(client).get_file_id(path, kind)
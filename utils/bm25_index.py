@@ -0,0 +1,364 @@
+import glob
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from utils.snapshots import ARTIFACT_PATTERNS, load_json_snapshot
+
+CHAT_INDEX_DB = os.path.join('output', 'index', 'chat_index.db')
+TOP_PASSAGES = 5
+MAX_ALERT_SOURCES = 72        # alert files kept in the index, three days of hourly runs
+MAX_COMMON_TERM_RATIO = 0.25  # terms in more documents than this add little and are skipped
+COMPACT_RATIO = 3             # change log entries per live document before the log is rewritten
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"\w+(?:\.\w+)*")
+STOPWORDS = frozenset(
+    'a an and are as at be by do does for from how i in is it me my of on or the this to was what when where '
+    'which who why will with you your'.split()
+)
+
+_index = None
+_index_lock = threading.Lock()
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall((text or '').lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """In-memory inverted index with BM25 ranking; documents are added and removed one at a time"""
+
+    def __init__(self, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}   # term -> {doc id: term frequency}
+        self.documents = {}  # doc id -> (key, text, meta, length, terms)
+        self.ids = {}        # key -> doc id
+        self.lengths = {}    # doc id -> length in tokens
+        self.next_id = 0
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, key, text, meta=None):
+        """Index a document, replacing any earlier document with the same key"""
+        self.remove(key)
+        terms = Counter(tokenize(text))
+        doc_id = self.next_id
+        self.next_id += 1
+        length = sum(terms.values())
+        self.documents[doc_id] = (key, text, meta or {}, length, terms)
+        self.ids[key] = doc_id
+        self.lengths[doc_id] = length
+        self.total_length += length
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = frequency
+
+    def remove(self, key):
+        doc_id = self.ids.pop(key, None)
+        if doc_id is None:
+            return
+        _, _, _, length, terms = self.documents.pop(doc_id)
+        del self.lengths[doc_id]
+        self.total_length -= length
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+
+    def search(self, query, k=TOP_PASSAGES):
+        """Top `k` documents for a query as [{key, text, meta, score}], best first"""
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        # Very common terms ("aqi", "bangkok") barely change the ranking but touch every posting
+        rare = [term for term in terms if len(self.postings[term]) <= count * MAX_COMMON_TERM_RATIO]
+        terms = rare or terms
+
+        scores = {}
+        get = scores.get
+        lengths = self.lengths
+        base = self.k1 * (1 - self.b)
+        scale = self.k1 * self.b / average_length
+        for term in terms:
+            postings = self.postings[term]
+            df = len(postings)
+            weight = math.log(1 + (count - df + 0.5) / (df + 0.5)) * (self.k1 + 1)
+            for doc_id, frequency in postings.items():
+                scores[doc_id] = get(doc_id, 0.0) + weight * frequency / (frequency + base + scale * lengths[doc_id])
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+        results = []
+        for doc_id, score in best:
+            key, text, meta, _, _ = self.documents[doc_id]
+            results.append({'key': key, 'text': text, 'meta': meta, 'score': round(score, 3)})
+        return results
+
+def _format_value(value, suffix=''):
+    return 'n/a' if value is None else f"{value}{suffix}"
+
+def alert_passage(alert):
+    """Searchable text for one alert: station, readings, health implications and recommended actions"""
+    actions = alert.get('recommended_actions') or []
+    if isinstance(actions, str):
+        actions = [actions]
+    parts = [
+        f"{alert.get('alert_type') or 'Alert'} at {alert.get('station_name')} ({alert.get('city')})"
+        f"{' in ' + alert['area'] if alert.get('area') else ''} on {alert.get('timestamp')}:",
+        f"AQI {_format_value(alert.get('aqi'))} ({alert.get('aqi_level') or 'n/a'}),",
+        f"PM2.5 {_format_value(alert.get('pm25_level'))}, temperature {_format_value(alert.get('temperature_level'), '°C')},"
+        f" humidity {_format_value(alert.get('humidity_level'), '%')}.",
+    ]
+    if alert.get('health_implications'):
+        parts.append(f"Health implications: {alert['health_implications']}")
+    if actions:
+        parts.append(f"Recommended actions: {'; '.join(str(action) for action in actions)}")
+    return ' '.join(parts)
+
+def station_passage(record):
+    """Searchable text for a monitoring station's metadata"""
+    return (f"Monitoring station {record.get('station_name')} (id {record.get('station_id')}) in "
+            f"{record.get('city') or 'Bangkok'}, located at {record.get('latitude')}, {record.get('longitude')}.")
+
+class ChatIndex:
+    """BM25 index over alerts, area advisories and station metadata, persisted as a SQLite change log.
+
+    Writers (the hourly pipeline) append only the documents of new files;
+    readers replay log entries newer than the last one they applied, so both
+    sides do O(new documents) work per update.
+    """
+
+    def __init__(self, path=CHAT_INDEX_DB, max_alert_sources=MAX_ALERT_SOURCES):
+        self.path = path
+        self.max_alert_sources = max_alert_sources
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.index = BM25Index()
+        self.applied_seq = 0
+        self.generation = None
+        self.dir_mtimes = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                key TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                text TEXT NOT NULL,
+                meta TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                op TEXT NOT NULL,
+                key TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS sources (
+                source TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                mtime INTEGER NOT NULL,
+                indexed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS settings (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_source ON documents (source);
+            INSERT OR IGNORE INTO settings (name, value) VALUES ('generation', '1');
+        ''')
+        self.conn.commit()
+
+    # Writing
+
+    def _put(self, key, source, text, meta):
+        """Add or replace a document unless it is unchanged; caller holds the lock"""
+        row = self.conn.execute('SELECT text FROM documents WHERE key = ?', (key,)).fetchone()
+        if row and row[0] == text:
+            return False
+        self.conn.execute('INSERT OR REPLACE INTO documents (key, source, text, meta) VALUES (?, ?, ?, ?)',
+                          (key, source, text, json.dumps(meta, ensure_ascii=False)))
+        self.conn.execute("INSERT INTO changes (op, key) VALUES ('add', ?)", (key,))
+        return True
+
+    def _drop_source(self, source):
+        """Remove every document of a source; caller holds the lock"""
+        keys = [row[0] for row in self.conn.execute('SELECT key FROM documents WHERE source = ?', (source,))]
+        self.conn.execute('DELETE FROM documents WHERE source = ?', (source,))
+        self.conn.executemany("INSERT INTO changes (op, key) VALUES ('remove', ?)", [(key,) for key in keys])
+        self.conn.execute('DELETE FROM sources WHERE source = ?', (source,))
+        return len(keys)
+
+    def _is_indexed(self, source):
+        mtime = os.stat(source).st_mtime_ns if os.path.exists(source) else 0
+        with self.lock:
+            row = self.conn.execute('SELECT mtime FROM sources WHERE source = ?', (source,)).fetchone()
+        return bool(row) and row[0] == mtime, mtime
+
+    def index_alerts(self, alerts, source_file):
+        """Index an alert file: one passage per alert and one per area advisory; returns documents added"""
+        indexed, mtime = self._is_indexed(source_file)
+        if indexed:
+            return 0
+        added = 0
+        with self.lock:
+            self._drop_source(source_file)
+            areas = set()
+            for position, alert in enumerate(alerts):
+                meta = {'type': 'alert', 'station_name': alert.get('station_name'), 'city': alert.get('city'),
+                        'aqi': alert.get('aqi'), 'timestamp': alert.get('timestamp'), 'source': source_file}
+                added += self._put(f"alert:{source_file}:{position}", source_file, alert_passage(alert), meta)
+                area = alert.get('area')
+                if area and area not in areas:
+                    areas.add(area)
+                    text = (f"Area advisory for {area} on {alert.get('timestamp')}: {alert.get('alert_type')}. "
+                            f"Health implications: {alert.get('health_implications')}")
+                    meta = {'type': 'advisory', 'area': area, 'timestamp': alert.get('timestamp'), 'source': source_file}
+                    added += self._put(f"advisory:{source_file}:{area}", source_file, text, meta)
+            self.conn.execute('INSERT OR REPLACE INTO sources (source, kind, mtime, indexed_at) VALUES (?, ?, ?, ?)',
+                              (source_file, 'alerts', mtime, time.time()))
+            self._prune_alert_sources()
+            self._compact_if_needed()
+            self.conn.commit()
+        return added
+
+    def index_stations(self, records, source_file):
+        """Index station metadata from an hourly file; only new or changed stations are written"""
+        indexed, mtime = self._is_indexed(source_file)
+        if indexed:
+            return 0
+        added = 0
+        with self.lock:
+            for record in records:
+                if record.get('station_id') is None and not record.get('station_name'):
+                    continue
+                key = f"station:{record.get('station_id') or record.get('station_name')}"
+                meta = {'type': 'station', 'station_name': record.get('station_name'), 'city': record.get('city'),
+                        'latitude': record.get('latitude'), 'longitude': record.get('longitude')}
+                added += self._put(key, 'stations', station_passage(record), meta)
+            self.conn.execute('INSERT OR REPLACE INTO sources (source, kind, mtime, indexed_at) VALUES (?, ?, ?, ?)',
+                              (source_file, 'hourly', mtime, time.time()))
+            self.conn.commit()
+        return added
+
+    def _prune_alert_sources(self):
+        """Drop alert files beyond the newest `max_alert_sources`; caller holds the lock"""
+        stale = self.conn.execute(
+            "SELECT source FROM sources WHERE kind = 'alerts' ORDER BY mtime DESC LIMIT -1 OFFSET ?",
+            (self.max_alert_sources,)).fetchall()
+        for (source,) in stale:
+            self._drop_source(source)
+
+    def sync(self, patterns=None):
+        """Index artifact files the pipeline has not indexed yet; directories are rescanned only when they change"""
+        patterns = patterns or {'alerts': ARTIFACT_PATTERNS['alerts'], 'hourly': ARTIFACT_PATTERNS['hourly']}
+        added = 0
+        for kind, pattern in patterns.items():
+            directory = os.path.dirname(pattern) or '.'
+            if not os.path.isdir(directory):
+                continue
+            dir_mtime = os.stat(directory).st_mtime_ns
+            if self.dir_mtimes.get(pattern) == dir_mtime:
+                continue
+            files = sorted(glob.glob(pattern), key=os.path.getmtime)
+            if kind == 'alerts':
+                files = files[-self.max_alert_sources:]
+            for path in files:
+                if self._is_indexed(path)[0]:
+                    continue
+                try:
+                    data = load_json_snapshot(path)
+                except (OSError, ValueError) as e:
+                    print(f"Could not index {path}: {e}")
+                    continue
+                if kind == 'alerts':
+                    added += self.index_alerts(data.get('alerts', []), path)
+                else:
+                    added += self.index_stations(data.get('data', []), path)
+            self.dir_mtimes[pattern] = dir_mtime
+        return added
+
+    def _compact_if_needed(self):
+        """Rewrite the change log with one entry per live document once it is mostly history; caller holds the lock.
+
+        Readers notice the new generation and reload on their next refresh.
+        """
+        changes = self.conn.execute('SELECT COUNT(*) FROM changes').fetchone()[0]
+        documents = self.conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+        if changes <= COMPACT_RATIO * documents + 1000:
+            return
+        self.conn.execute('DELETE FROM changes')
+        self.conn.execute("INSERT INTO changes (op, key) SELECT 'add', key FROM documents")
+        self.conn.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE name = 'generation'")
+
+    # Reading
+
+    def refresh(self):
+        """Apply log entries written since the last refresh to the in-memory index"""
+        with self.lock:
+            generation = self.conn.execute("SELECT value FROM settings WHERE name = 'generation'").fetchone()[0]
+            if generation != self.generation:
+                self.index = BM25Index()
+                self.applied_seq = 0
+                self.generation = generation
+            changes = self.conn.execute(
+                'SELECT c.seq, c.op, c.key, d.text, d.meta FROM changes c LEFT JOIN documents d ON d.key = c.key '
+                'WHERE c.seq > ? ORDER BY c.seq', (self.applied_seq,)).fetchall()
+            for seq, op, key, text, meta in changes:
+                # A later change may have removed or replaced the document; the current row wins
+                if op == 'add' and text is not None:
+                    self.index.add(key, text, json.loads(meta))
+                else:
+                    self.index.remove(key)
+                self.applied_seq = seq
+        return len(changes)
+
+    def search(self, query, k=TOP_PASSAGES):
+        self.refresh()
+        with self.lock:
+            return self.index.search(query, k)
+
+    def close(self):
+        self.conn.close()
+
+def get_chat_index(path=CHAT_INDEX_DB):
+    """Process-wide index shared by every session"""
+    global _index
+    with _index_lock:
+        if _index is None or _index.path != path:
+            _index = ChatIndex(path)
+        return _index
+
+def index_pipeline_outputs(alerts, alerts_file, records=None, hourly_file=None):
+    """Add a pipeline run's alerts and stations to the chat index; indexing failures never fail the pipeline"""
+    try:
+        index = get_chat_index()
+        added = index.index_alerts(alerts, alerts_file)
+        if records is not None and hourly_file:
+            added += index.index_stations(records, hourly_file)
+        return added
+    except sqlite3.Error as e:
+        print(f"Could not update the chat index: {e}")
+        return 0
+
+def build_chat_context(question, k=TOP_PASSAGES):
+    """Instructions grounding one chat turn in the passages most relevant to the question, or None"""
+    try:
+        index = get_chat_index()
+        index.sync()
+        passages = index.search(question, k)
+    except sqlite3.Error as e:
+        print(f"Chat index unavailable: {e}")
+        return None
+    if not passages:
+        return None
+    lines = [f"[{i}] {passage['text']}" for i, passage in enumerate(passages, start=1)]
+    return ("Recent records from the local air quality monitoring data that may help answer the next question. "
+            "Use them when relevant and cite the station and timestamp:\n" + "\n".join(lines))
@@ -0,0 +1,223 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_CONCURRENT_RUNS = 8       # assistant runs in flight across all sessions
+MAX_RUNS_PER_USER = 1         # runs in flight per user; the rest wait in that user's queue
+MAX_QUEUED_PER_USER = 3
+CHAT_TIMEOUT_SECONDS = 120
+LATENCY_WINDOW = 500
+
+_service = None
+_service_lock = threading.Lock()
+
+class ChatServiceBusy(Exception):
+    """Raised when a user already has the maximum number of questions waiting"""
+
+class ChatTimeoutError(Exception):
+    """Raised when a question was not answered within its timeout"""
+
+class ChatTicket:
+    """Handle for a submitted question: the partial reply while it runs, then its result"""
+
+    def __init__(self, user_id, timeout):
+        self.user_id = user_id
+        self.timeout = timeout
+        self.future = concurrent.futures.Future()
+        self.text = ''
+        self.coalesced = False
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+    def done(self):
+        return self.future.done()
+
+    def wait(self, timeout=None):
+        concurrent.futures.wait([self.future], timeout=timeout)
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+class _Job:
+    def __init__(self, user_id, work, key):
+        self.user_id = user_id
+        self.work = work
+        self.key = key
+        self.tickets = []
+
+    def pending(self):
+        return any(not ticket.done() for ticket in self.tickets)
+
+    def set_text(self, text):
+        for ticket in self.tickets:
+            ticket.text = text
+
+    def run(self):
+        started = time.monotonic()
+        for ticket in self.tickets:
+            ticket.started_at = started
+        return self.work(self.set_text)
+
+class ChatService:
+    """Run assistant turns on a background asyncio loop with fair, bounded concurrency.
+
+    At most `max_concurrent` runs are in flight, and at most `per_user` of
+    them belong to one user. Waiting questions are taken round-robin across
+    users, so one busy operator cannot starve the others. Identical questions
+    submitted while one is in flight share its run (pass the same `key`).
+    Every ticket fails with ChatTimeoutError once its timeout has passed.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_RUNS, per_user=MAX_RUNS_PER_USER,
+                 max_queued_per_user=MAX_QUEUED_PER_USER, timeout=CHAT_TIMEOUT_SECONDS):
+        self.max_concurrent = max_concurrent
+        self.per_user = per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.timeout = timeout
+        self.queues = OrderedDict()   # user id -> deque of waiting jobs, in round-robin order
+        self.running = {}             # user id -> runs in flight
+        self.inflight = {}            # coalescing key -> queued or running job
+        self.active = 0
+        self.lock = threading.Lock()
+        self.metrics = {'submitted': 0, 'completed': 0, 'failed': 0, 'coalesced': 0, 'rejected': 0, 'timeouts': 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.queue_waits = deque(maxlen=LATENCY_WINDOW)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='chat-run')
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name='chat-service', daemon=True)
+        self.thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # Client API, safe to call from any thread
+
+    def submit(self, user_id, work, key=None, timeout=None):
+        """Queue `work(on_text)` for a user and return its ChatTicket.
+
+        `work` runs on a worker thread; it receives a callback for the reply so
+        far and returns the final reply text.
+        """
+        ticket = ChatTicket(user_id, timeout or self.timeout)
+        self.loop.call_soon_threadsafe(self._enqueue, user_id, work, key, ticket)
+        return ticket
+
+    def get_metrics(self):
+        """Counters plus p50/p95 end-to-end latency and queue wait (seconds) of recent questions"""
+        with self.lock:
+            metrics = dict(self.metrics)
+            latencies = sorted(self.latencies)
+            waits = sorted(self.queue_waits)
+        metrics.update(active=self.active, queued=sum(len(queue) for queue in self.queues.values()))
+        for name, values in (('latency', latencies), ('queue_wait', waits)):
+            if values:
+                metrics[f'{name}_p50'] = round(values[len(values) // 2], 3)
+                metrics[f'{name}_p95'] = round(values[min(len(values) - 1, int(len(values) * 0.95))], 3)
+        return metrics
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # Event loop side
+
+    def _count(self, name):
+        with self.lock:
+            self.metrics[name] += 1
+
+    def _enqueue(self, user_id, work, key, ticket):
+        self._count('submitted')
+        job = self.inflight.get(key) if key is not None else None
+        if job is not None and job.pending():
+            job.tickets.append(ticket)
+            ticket.coalesced = True
+            self._count('coalesced')
+        else:
+            queue = self.queues.setdefault(user_id, deque())
+            if len(queue) >= self.max_queued_per_user:
+                self._count('rejected')
+                ticket.future.set_exception(ChatServiceBusy(
+                    f"{len(queue)} questions are already waiting; please wait for an answer"))
+                return
+            job = _Job(user_id, work, key)
+            job.tickets.append(ticket)
+            queue.append(job)
+            if key is not None:
+                self.inflight[key] = job
+        self.loop.call_later(ticket.timeout, self._expire, ticket)
+        self._dispatch()
+
+    def _expire(self, ticket):
+        if not ticket.done():
+            self._count('timeouts')
+            ticket.future.set_exception(ChatTimeoutError(f"No answer within {ticket.timeout:g}s"))
+        # Jobs nobody waits for any more are skipped when their turn comes
+        self._dispatch()
+
+    def _next_job(self):
+        """Oldest waiting job of the first user, in round-robin order, who may start another run"""
+        for user_id in list(self.queues):
+            queue = self.queues[user_id]
+            while queue and not queue[0].pending():
+                stale = queue.popleft()
+                if self.inflight.get(stale.key) is stale:
+                    del self.inflight[stale.key]
+            if not queue:
+                del self.queues[user_id]
+                continue
+            if self.running.get(user_id, 0) >= self.per_user:
+                continue
+            self.queues.move_to_end(user_id)
+            return queue.popleft()
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_concurrent:
+            job = self._next_job()
+            if job is None:
+                return
+            self.active += 1
+            self.running[job.user_id] = self.running.get(job.user_id, 0) + 1
+            started = time.monotonic()
+            with self.lock:
+                self.queue_waits.extend(started - ticket.submitted_at for ticket in job.tickets)
+            future = self.loop.run_in_executor(self.executor, job.run)
+            future.add_done_callback(lambda done, job=job: self._finish(job, done))
+
+    def _finish(self, job, done):
+        # The run holds its slot until it really ends, even if its tickets already timed out
+        self.active -= 1
+        self.running[job.user_id] -= 1
+        if not self.running[job.user_id]:
+            del self.running[job.user_id]
+        if job.key is not None and self.inflight.get(job.key) is job:
+            del self.inflight[job.key]
+
+        error = done.exception()
+        now = time.monotonic()
+        self._count('failed' if error else 'completed')
+        for ticket in job.tickets:
+            if ticket.done():
+                continue
+            with self.lock:
+                self.latencies.append(now - ticket.submitted_at)
+            if error:
+                ticket.future.set_exception(error)
+            else:
+                ticket.future.set_result(done.result())
+        self._dispatch()
+
+def get_chat_service(max_concurrent=MAX_CONCURRENT_RUNS, timeout=CHAT_TIMEOUT_SECONDS):
+    """Process-wide service shared by every session"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = ChatService(max_concurrent=max_concurrent, timeout=timeout)
+        return _service
@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+CHAT_DB = os.path.join('output', 'chat', 'chat.db')
+CHAT_MEMORY_WINDOW = 20     # messages per session kept in memory
+MAX_ACTIVE_SESSIONS = 500   # sessions kept in memory before the least recently used is dropped
+SESSION_IDLE_SECONDS = 1800
+
+_store = None
+_store_lock = threading.Lock()
+
+class ChatStore:
+    """Chat transcripts persisted to SQLite, with a bounded in-memory window per active session.
+
+    Memory holds at most MAX_ACTIVE_SESSIONS sessions of CHAT_MEMORY_WINDOW
+    messages each; idle sessions are evicted and reloaded from disk on their
+    next request. Older messages are read page by page with `older()`.
+    """
+
+    def __init__(self, path=CHAT_DB, window=CHAT_MEMORY_WINDOW, max_sessions=MAX_ACTIVE_SESSIONS,
+                 idle_seconds=SESSION_IDLE_SECONDS):
+        self.path = path
+        self.window = window
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.active = OrderedDict()
+        self.last_sweep = time.time()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                id TEXT PRIMARY KEY,
+                thread_id TEXT,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_active REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                message_id TEXT NOT NULL UNIQUE,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                cached INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_chat_messages_session ON chat_messages (session_id, seq);
+        ''')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(chat_messages)')]
+        if 'cached' not in columns:
+            # Databases created before answers could come from the answer cache
+            self.conn.execute('ALTER TABLE chat_messages ADD COLUMN cached INTEGER NOT NULL DEFAULT 0')
+        self.conn.commit()
+
+    @staticmethod
+    def _to_message(row):
+        seq, message_id, role, content, cached = row
+        return {"id": message_id, "role": role, "content": content, "cached": bool(cached), "seq": seq}
+
+    def _load(self, session_id):
+        """In-memory state for a session, read from disk if it is not active; caller holds the lock"""
+        state = self.active.get(session_id)
+        if state is None:
+            row = self.conn.execute(
+                'SELECT thread_id, message_count FROM chat_sessions WHERE id = ?', (session_id,)).fetchone()
+            rows = self.conn.execute(
+                'SELECT seq, message_id, role, content, cached FROM chat_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?',
+                (session_id, self.window)).fetchall()
+            state = {
+                'messages': deque((self._to_message(r) for r in reversed(rows)), maxlen=self.window),
+                'thread_id': row[0] if row else None,
+                'count': row[1] if row else 0
+            }
+            self.active[session_id] = state
+        state['last_active'] = time.time()
+        self.active.move_to_end(session_id)
+        self._evict()
+        return state
+
+    def _evict(self):
+        now = time.time()
+        if now - self.last_sweep >= 60:
+            self.last_sweep = now
+            for session_id in [s for s, state in self.active.items() if now - state['last_active'] > self.idle_seconds]:
+                del self.active[session_id]
+        while len(self.active) > self.max_sessions:
+            self.active.popitem(last=False)
+
+    def recent(self, session_id):
+        """The latest messages of a session (at most the memory window), oldest first"""
+        with self.lock:
+            return list(self._load(session_id)['messages'])
+
+    def count(self, session_id):
+        with self.lock:
+            return self._load(session_id)['count']
+
+    def older(self, session_id, before_seq, limit):
+        """Up to `limit` messages sent before `before_seq`, oldest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT seq, message_id, role, content, cached FROM chat_messages '
+                'WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?',
+                (session_id, before_seq, limit)).fetchall()
+        return [self._to_message(row) for row in reversed(rows)]
+
+    def append(self, session_id, message):
+        """Persist a message (a dict with id, role, content and optional cached flag) and add it to the session window"""
+        now = time.time()
+        message_id = message.get("id") or uuid.uuid4().hex
+        with self.lock:
+            state = self._load(session_id)
+            cursor = self.conn.execute(
+                'INSERT INTO chat_messages (session_id, message_id, role, content, created_at, cached) VALUES (?, ?, ?, ?, ?, ?)',
+                (session_id, message_id, message["role"], message["content"], now, int(bool(message.get("cached")))))
+            self.conn.execute(
+                'INSERT INTO chat_sessions (id, message_count, created_at, last_active) VALUES (?, 1, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET message_count = message_count + 1, last_active = excluded.last_active',
+                (session_id, now, now))
+            self.conn.commit()
+            stored = {"id": message_id, "role": message["role"], "content": message["content"],
+                      "cached": bool(message.get("cached")), "seq": cursor.lastrowid}
+            state['messages'].append(stored)
+            state['count'] += 1
+        return stored
+
+    def get_thread(self, session_id):
+        with self.lock:
+            return self._load(session_id)['thread_id']
+
+    def set_thread(self, session_id, thread_id):
+        """Remember the assistant thread so a restored session keeps its conversation context"""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT INTO chat_sessions (id, thread_id, created_at, last_active) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET thread_id = excluded.thread_id, last_active = excluded.last_active',
+                (session_id, thread_id, now, now))
+            self.conn.commit()
+            self._load(session_id)['thread_id'] = thread_id
+
+    def active_sessions(self):
+        with self.lock:
+            return len(self.active)
+
+    def close(self):
+        self.conn.close()
+
+def get_chat_store(path=CHAT_DB):
+    """Process-wide store shared by every session"""
+    global _store
+    with _store_lock:
+        if _store is None or _store.path != path:
+            _store = ChatStore(path)
+        return _store
@@ -0,0 +1,170 @@
+import json
+import sqlite3
+import time
+
+from utils.alert_store import get_alert_store
+from utils.snapshots import get_latest_artifact
+
+MAX_TOOL_ROWS = 50
+MAX_RADIUS_KM = 100
+NEAR_FIELDS = ['station_name', 'city', 'latitude', 'longitude', 'aqi', 'pm25', 'timestamp']
+
+# Function tools the chat assistant can call; they are answered locally from the alert store
+CHAT_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_latest_reading",
+            "description": "Latest air quality reading (AQI, PM2.5, PM10, temperature, humidity) for stations whose name contains the given text.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "station": {"type": "string", "description": "Station name or part of it, e.g. 'Silom'"}
+                },
+                "required": ["station"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_worst_stations",
+            "description": "Stations with the worst (highest) AQI or PM2.5 in the latest hourly snapshot.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "k": {"type": "integer", "description": "Number of stations to return (default 5)"},
+                    "metric": {"type": "string", "enum": ["aqi", "pm25"], "description": "Ranking metric (default aqi)"},
+                    "city": {"type": "string", "description": "Only stations in this city/district"}
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_city_summary",
+            "description": "Station count and AQI/PM2.5 statistics per city/district in the latest hourly snapshot.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "city": {"type": "string", "description": "City/district name or part of it; omit for all"}
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_station_history",
+            "description": "Hourly readings for a station over a time range, newest first.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "station": {"type": "string", "description": "Station name or part of it"},
+                    "start": {"type": "string", "description": "Start time, 'YYYY-MM-DD HH:MM:SS' (optional)"},
+                    "end": {"type": "string", "description": "End time, 'YYYY-MM-DD HH:MM:SS' (optional)"},
+                    "limit": {"type": "integer", "description": "Maximum readings to return (default 48)"}
+                },
+                "required": ["station"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_stations_near",
+            "description": "Stations within a radius of a location (e.g. a hospital or school), nearest first, with their latest AQI and PM2.5. Give either coordinates or a station to search around.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "latitude": {"type": "number", "description": "Latitude of the location"},
+                    "longitude": {"type": "number", "description": "Longitude of the location"},
+                    "station": {"type": "string", "description": "Search around this station instead of coordinates"},
+                    "radius_km": {"type": "number", "description": "Search radius in km (default 5)"},
+                    "k": {"type": "integer", "description": "Maximum stations to return (default 10)"}
+                }
+            }
+        }
+    }
+]
+
+# Remote tools, attached only when a file is part of the question
+FILE_TOOLS = [
+    {"type": "code_interpreter"},
+    {"type": "file_search"}
+]
+
+def _latest_file_id(store):
+    path = get_latest_artifact('hourly')
+    if not path:
+        raise LookupError("No hourly readings are available yet")
+    return store.ensure_readings(path)
+
+def get_latest_reading(station):
+    store = get_alert_store()
+    store.sync_readings()
+    readings = store.latest_station_readings(station)
+    if not readings:
+        return {"station": station, "readings": [], "message": "No station matches that name"}
+    return {"station": station, "readings": readings}
+
+def get_worst_stations(k=5, metric='aqi', city=None):
+    store = get_alert_store()
+    k = max(1, min(int(k), MAX_TOOL_ROWS))
+    return {"metric": metric, "city": city, "stations": store.worst_readings(_latest_file_id(store), k, metric, city)}
+
+def get_city_summary(city=None):
+    store = get_alert_store()
+    return {"cities": store.city_summary(_latest_file_id(store), city)}
+
+def get_station_history(station, start=None, end=None, limit=48):
+    store = get_alert_store()
+    store.sync_readings()
+    limit = max(1, min(int(limit), MAX_TOOL_ROWS * 4))
+    return {"station": station, "start": start, "end": end,
+            "readings": store.station_history(station, start, end, limit)}
+
+def get_stations_near(latitude=None, longitude=None, station=None, radius_km=5, k=10):
+    # numpy and scipy are only loaded once a question needs them
+    from utils.spatial_index import get_station_index
+    index = get_station_index()
+    if latitude is None or longitude is None:
+        if not station:
+            raise ValueError("Give latitude and longitude, or a station to search around")
+        anchor = index.find(station)
+        if anchor is None:
+            return {"station": station, "stations": [], "message": "No station matches that name"}
+        latitude, longitude = anchor['latitude'], anchor['longitude']
+    radius_km = max(0.0, min(float(radius_km), MAX_RADIUS_KM))
+    k = max(1, min(int(k), MAX_TOOL_ROWS))
+    nearby = index.within_radius(float(latitude), float(longitude), radius_km)[:k]
+    return {"latitude": latitude, "longitude": longitude, "radius_km": radius_km,
+            "stations": [dict({field: match.get(field) for field in NEAR_FIELDS}, distance_km=distance)
+                         for match, distance in nearby]}
+
+TOOL_FUNCTIONS = {
+    'get_latest_reading': get_latest_reading,
+    'get_worst_stations': get_worst_stations,
+    'get_city_summary': get_city_summary,
+    'get_station_history': get_station_history,
+    'get_stations_near': get_stations_near
+}
+
+def get_chat_tools(file_id=None):
+    """Tools for one assistant run: the local data tools, plus the remote file tools when a file is attached"""
+    return CHAT_TOOLS + FILE_TOOLS if file_id else list(CHAT_TOOLS)
+
+def call_chat_tool(name, arguments):
+    """Run a local tool call and return its JSON output; failures are reported to the model, not raised"""
+    started = time.perf_counter()
+    function = TOOL_FUNCTIONS.get(name)
+    if function is None:
+        return json.dumps({"error": f"Unknown tool '{name}'"})
+    try:
+        kwargs = json.loads(arguments) if isinstance(arguments, str) and arguments.strip() else (arguments or {})
+        result = function(**kwargs)
+    except (TypeError, ValueError, LookupError, sqlite3.Error) as e:
+        result = {"error": str(e)}
+    print(f"Chat tool {name} answered in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return json.dumps(result, ensure_ascii=False, default=str)
@@ -1,132 +1,19 @@
-import folium
-import json
-from folium import plugins
-import branca.colormap as cm
-import os
-import glob
-from datetime import datetime
 import streamlit as st
-from streamlit_folium import st_folium
+from utils.map_artifacts import load_map_html
+from utils.live_refresh import current_data_version, live_fragment, memo_for_version
 
-def create_aqi_heat_map():
-    """Create and display AQI map in Streamlit"""
+def create_aqi_heat_map(version=None):
+    """Display the AQI map in Streamlit from the HTML the pipeline rendered for this snapshot"""
     try:
-        # Get the latest JSON file from the hourly directory
-        json_pattern = os.path.join('output', 'hourly', 'bangkok_aqi_data_*.json')
-        list_of_files = glob.glob(json_pattern)
-        latest_file = max(list_of_files, key=os.path.getctime)
+        version = version if version is not None else current_data_version()
+        html, _ = memo_for_version('aqi_map', version, load_map_html)
+        if html is None:
+            st.warning("No hourly AQI data available for the map")
+            return
 
-        # Read the JSON file
-        with open(latest_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        # Extract timestamp from the data
-        timestamp = data['query_timestamp']
-        timestamp_formatted = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M')
-
-        # # Create map section header
-        # st.markdown("""
-        # <div style="display: flex; align-items: center; margin-bottom: 1rem;">
-        #     <span style="font-size: 1.4rem; margin-right: 0.5rem;">🗺️</span>
-        #     <span style="font-weight: 700; color: #3B82F6; font-size: 1.2rem;">Real-time AQI Map</span>
-        # </div>
-        # """, unsafe_allow_html=True)
-
-        # # Show last updated time
-        # st.caption(f"Last Updated: {timestamp_formatted}")
-
-        # Center coordinates for One Bangkok Smart City
-        one_bangkok_center = [13.7271, 100.5473]
-
-        # Create a map centered on One Bangkok with increased zoom level
-        m = folium.Map(location=one_bangkok_center, zoom_start=13)
-
-        # Add a marker for One Bangkok
-        folium.Marker(
-            location=one_bangkok_center,
-            popup="One Bangkok Smart City",
-            icon=folium.Icon(color='blue', icon='info-sign'),
-            tooltip="One Bangkok Smart City"
-        ).add_to(m)
-
-        # Create a color scale for AQI values
-        colormap = cm.LinearColormap(
-            colors=['green', 'yellow', 'orange', 'red', 'purple', 'maroon'],
-            vmin=0,
-            vmax=300,
-            caption='Air Quality Index (AQI)'
-        )
-        colormap.add_to(m)
-
-        # Prepare data for heatmap
-        heat_data = []
-        
-        # Create feature groups for layers
-        marker_group = folium.FeatureGroup(name='Station Markers')
-        heatmap_group = folium.FeatureGroup(name='AQI Heatmap')
-
-        # Add markers for each station
-        for station in data['data']:
-            # Skip if no AQI data or coordinates
-            if not all([station.get('latitude'), station.get('longitude'), station.get('aqi')]):
-                continue
-                
-            # Determine color based on AQI value
-            aqi = station['aqi']
-            color = colormap(aqi)
-            
-            # Add data point for heatmap (lat, lon, weight)
-            heat_data.append([station['latitude'], station['longitude'], aqi])
-            
-            # Create popup content
-            popup_content = f"""
-                <b>{station['station_name']}</b><br>
-                AQI: {aqi}<br>
-                PM2.5: {station['pm25']}<br>
-                PM10: {station['pm10']}<br>
-                Temperature: {station['temperature']}°C<br>
-                Humidity: {station['humidity']}%
-            """
-            
-            # Add circle marker to marker group
-            folium.CircleMarker(
-                location=[station['latitude'], station['longitude']],
-                radius=8,
-                popup=folium.Popup(popup_content, max_width=300),
-                color=color,
-                fill=True,
-                fill_color=color,
-                fill_opacity=0.7,
-                weight=2
-            ).add_to(marker_group)
-
-        # Add heatmap layer
-        plugins.HeatMap(
-            heat_data,
-            min_opacity=0.4,
-            radius=25,
-            blur=15,
-            gradient={
-                '0': 'blue',
-                '0.4': 'lime',
-                '0.6': 'yellow',
-                '0.8': 'orange',
-                '1': 'red'
-            }
-        ).add_to(heatmap_group)
-
-        # Add the feature groups to the map
-        heatmap_group.add_to(m)
-        marker_group.add_to(m)
-
-        # Add fullscreen option
-        plugins.Fullscreen().add_to(m)
-
-        # Add layer control
-        folium.LayerControl().add_to(m)
-
-        # Display the map using streamlit_folium
-        st_folium(m, width=None, height=400)
+        # Serve the prerendered page as-is; its cost does not depend on the number of stations
+        import streamlit.components.v1 as components
+        components.html(html, height=400)
 
     except Exception as e:
         st.error(f"Error creating map: {str(e)}")
@@ -134,8 +21,8 @@ def create_aqi_heat_map():
 def main():
     st.title("Bangkok Air Quality Map")
     
-    # Create the map
-    create_aqi_heat_map()
+    # Create the map; it refreshes itself when a new snapshot lands
+    live_fragment()(create_aqi_heat_map)()
 
 if __name__ == "__main__":
     main()
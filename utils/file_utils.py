@@ -0,0 +1,50 @@
+import hashlib
+import json
+import os
+import tempfile
+
+def write_json_atomic(data, filepath):
+    """Write data as JSON to a temp file next to `filepath` and swap it into place"""
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, filepath)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return filepath
+
+def write_text_atomic(text, filepath):
+    """Write text to a temp file next to `filepath` and swap it into place"""
+    return write_bytes_atomic(text.encode('utf-8'), filepath)
+
+def write_bytes_atomic(content, filepath):
+    """Write bytes to a temp file next to `filepath` and swap it into place"""
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_', suffix=os.path.splitext(filepath)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, filepath)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return filepath
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,160 @@
+import json
+import math
+import os
+from collections import defaultdict
+
+import numpy as np
+
+from utils.spatial_index import chord_km, to_cartesian
+
+SUBSCRIPTIONS_FILE = os.path.join('config', 'geofence_subscriptions.json')
+GRID_CELL_DEG = 0.1           # roughly 11 km
+MAX_CELLS_PER_FENCE = 400     # larger fences skip the grid and are bbox-checked against every alert
+KM_PER_DEGREE_LAT = 110.574
+
+# Center coordinates for One Bangkok Smart City
+ONE_BANGKOK_CENTER = (13.7271, 100.5473)
+
+def load_subscriptions(path=None):
+    """Load geofenced subscriptions. Each is a notification recipient (id, sink, optional min_aqi) plus an area:
+    {"polygon": [[lat, lon], ...]} or {"center": [lat, lon], "radius_km": 2}
+    """
+    path = path or os.getenv('GEOFENCE_SUBSCRIPTIONS_FILE', SUBSCRIPTIONS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _fence_bbox(subscription):
+    """(south, west, north, east) of a subscription's area"""
+    if subscription.get('polygon'):
+        polygon = subscription['polygon']
+        if len(polygon) < 3:
+            raise ValueError(f"Subscription {subscription.get('id')} needs at least 3 polygon vertices")
+        latitudes = [float(vertex[0]) for vertex in polygon]
+        longitudes = [float(vertex[1]) for vertex in polygon]
+        return min(latitudes), min(longitudes), max(latitudes), max(longitudes)
+    if subscription.get('center') and subscription.get('radius_km') is not None:
+        lat, lon = float(subscription['center'][0]), float(subscription['center'][1])
+        dlat = float(subscription['radius_km']) / KM_PER_DEGREE_LAT
+        dlon = dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+    raise ValueError(f"Subscription {subscription.get('id')} needs a polygon, or a center and radius_km")
+
+class GeofenceRegistry:
+    """Match alerts to geofenced subscriptions, polygons or circles.
+
+    Fence bounding boxes are hashed into a GRID_CELL_DEG grid, so each alert
+    is only tested against fences whose box shares its cell; the exact tests
+    then run vectorized over all (alert, candidate) pairs at once. Work grows
+    with alerts x candidate fences, not alerts x all fences.
+    """
+
+    def __init__(self, subscriptions, cell_deg=GRID_CELL_DEG):
+        self.subscriptions = list(subscriptions)
+        self.cell_deg = cell_deg
+        self.bboxes = np.array([_fence_bbox(s) for s in self.subscriptions], dtype=float).reshape(-1, 4)
+        self.min_aqi = np.array([float(s.get('min_aqi', 0)) for s in self.subscriptions])
+        self.is_polygon = np.array([bool(s.get('polygon')) for s in self.subscriptions], dtype=bool)
+
+        # Polygon edges, flattened: fence i owns edges edge_start[i] .. edge_start[i] + edge_count[i]
+        self.edge_count = np.zeros(len(self.subscriptions), dtype=np.intp)
+        starts, ends = [], []
+        for i, subscription in enumerate(self.subscriptions):
+            if self.is_polygon[i]:
+                vertices = np.array(subscription['polygon'], dtype=float)[:, :2]
+                starts.append(vertices)
+                ends.append(np.roll(vertices, -1, axis=0))
+                self.edge_count[i] = len(vertices)
+        self.edge_start = np.concatenate([[0], np.cumsum(self.edge_count)[:-1]]) if len(self.subscriptions) else self.edge_count
+        self.edges_from = np.concatenate(starts) if starts else np.empty((0, 2))
+        self.edges_to = np.concatenate(ends) if ends else np.empty((0, 2))
+
+        # Circles as Earth-centred points and chord radii
+        self.centers = np.zeros((len(self.subscriptions), 3))
+        self.radii = np.zeros(len(self.subscriptions))
+        for i, subscription in enumerate(self.subscriptions):
+            if not self.is_polygon[i]:
+                self.centers[i] = to_cartesian([subscription['center'][0]], [subscription['center'][1]])[0]
+                self.radii[i] = chord_km(float(subscription['radius_km']))
+
+        self.grid = defaultdict(list)   # (row, column) -> fences whose bbox touches that cell
+        large = []
+        for i, (south, west, north, east) in enumerate(self.bboxes):
+            rows = range(self._cell(south), self._cell(north) + 1)
+            columns = range(self._cell(west), self._cell(east) + 1)
+            if len(rows) * len(columns) > MAX_CELLS_PER_FENCE:
+                large.append(i)
+                continue
+            for row in rows:
+                for column in columns:
+                    self.grid[(row, column)].append(i)
+        self.large = np.array(large, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def _cell(self, degrees):
+        return int(math.floor(degrees / self.cell_deg))
+
+    def candidate_pairs(self, latitudes, longitudes):
+        """(alert indices, fence indices) whose bounding boxes contain the alert"""
+        alert_ids, fence_ids = [], []
+        for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            fences = self.grid.get((self._cell(lat), self._cell(lon)))
+            if fences:
+                alert_ids.append(np.full(len(fences), i, dtype=np.intp))
+                fence_ids.append(np.array(fences, dtype=np.intp))
+            if len(self.large):
+                alert_ids.append(np.full(len(self.large), i, dtype=np.intp))
+                fence_ids.append(self.large)
+        if not alert_ids:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        alerts, fences = np.concatenate(alert_ids), np.concatenate(fence_ids)
+        boxes = self.bboxes[fences]
+        inside = ((boxes[:, 0] <= latitudes[alerts]) & (latitudes[alerts] <= boxes[:, 2])
+                  & (boxes[:, 1] <= longitudes[alerts]) & (longitudes[alerts] <= boxes[:, 3]))
+        return alerts[inside], fences[inside]
+
+    def _inside_polygons(self, latitudes, longitudes, alerts, fences):
+        """Even-odd ray casting for every (alert, polygon) pair at once"""
+        counts = self.edge_count[fences]
+        pair = np.repeat(np.arange(len(alerts)), counts)
+        # Index of each pair's edges in the flat edge arrays
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        edges = np.repeat(self.edge_start[fences], counts) + offsets
+        y, x = latitudes[alerts][pair], longitudes[alerts][pair]
+        y1, x1 = self.edges_from[edges, 0], self.edges_from[edges, 1]
+        y2, x2 = self.edges_to[edges, 0], self.edges_to[edges, 1]
+        straddles = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crosses = straddles & (x < (x2 - x1) * (y - y1) / (y2 - y1) + x1)
+        return np.bincount(pair, weights=crosses, minlength=len(alerts)) % 2 == 1
+
+    def match(self, alerts):
+        """Alerts inside each subscription's area (and at or above its min_aqi), as {subscription id: [alerts]}"""
+        located = [alert for alert in alerts if alert.get('latitude') is not None and alert.get('longitude') is not None]
+        if not located or not self.subscriptions:
+            return {}
+        latitudes = np.array([float(alert['latitude']) for alert in located])
+        longitudes = np.array([float(alert['longitude']) for alert in located])
+        aqi = np.array([float(alert.get('aqi') or 0) for alert in located])
+
+        alerts, fences = self.candidate_pairs(latitudes, longitudes)
+        keep = aqi[alerts] >= self.min_aqi[fences]
+        alerts, fences = alerts[keep], fences[keep]
+
+        inside = np.zeros(len(alerts), dtype=bool)
+        polygons = self.is_polygon[fences]
+        if polygons.any():
+            inside[polygons] = self._inside_polygons(latitudes, longitudes, alerts[polygons], fences[polygons])
+        circles = ~polygons
+        if circles.any():
+            points = to_cartesian(latitudes[alerts[circles]], longitudes[alerts[circles]])
+            distances = np.sqrt(((points - self.centers[fences[circles]]) ** 2).sum(axis=1))
+            inside[circles] = distances <= self.radii[fences[circles]]
+
+        matches = defaultdict(list)
+        for alert, fence in sorted(zip(alerts[inside].tolist(), fences[inside].tolist())):
+            matches[self.subscriptions[fence]['id']].append(located[alert])
+        return dict(matches)
@@ -0,0 +1,62 @@
+import functools
+import os
+import threading
+
+import streamlit as st
+
+from utils.snapshots import SNAPSHOT_MANIFEST, get_data_version
+
+DEFAULT_REFRESH_SECONDS = 60
+
+_lock = threading.Lock()
+_version_cache = {}
+_memo = {}
+
+def _manifest_stat():
+    try:
+        stat = os.stat(SNAPSHOT_MANIFEST)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def current_data_version():
+    """Version of the latest snapshot; costs a single stat call while the manifest is unchanged"""
+    stat = _manifest_stat()
+    with _lock:
+        if stat is not None and _version_cache.get('stat') == stat:
+            return _version_cache['version']
+
+    version = get_data_version()
+    if stat is not None:
+        with _lock:
+            _version_cache.update(stat=stat, version=version)
+    return version
+
+def get_refresh_interval():
+    """Seconds between change checks, from DASHBOARD_REFRESH_SECONDS"""
+    return float(st.secrets.get("DASHBOARD_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS))
+
+def memo_for_version(key, version, build):
+    """Process-wide value for `key`, rebuilt by `build()` only when the data version changes"""
+    with _lock:
+        cached = _memo.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    value = build()
+    with _lock:
+        _memo[key] = (version, value)
+    return value
+
+def live_fragment(interval=None):
+    """Run a dashboard section as a fragment that polls for new data on its own.
+
+    The decorated function receives the current data version. Each tick reruns
+    only that fragment; sections memoize their data with memo_for_version, so
+    idle ticks cost a stat call and re-draw unchanged content.
+    """
+    def decorator(render):
+        @functools.wraps(render)
+        def fragment():
+            render(current_data_version())
+        return st.fragment(fragment, run_every=interval or get_refresh_interval())
+    return decorator
@@ -0,0 +1,172 @@
+import os
+import time
+
+from utils.chat_tools import call_chat_tool, get_chat_tools
+from utils.local_openai import LocalOpenAI
+
+# Polling fallback for clients without run streaming: wait 0.25s, doubling up to 2s between checks
+RUN_POLL_INITIAL_DELAY = 0.25
+RUN_POLL_MAX_DELAY = 2.0
+RUN_TIMEOUT = 120
+
+def get_openai_client(api_key=None, backend=None):
+    """Build the chat client selected by configuration.
+
+    `backend` (or the OPENAI_BACKEND env var) picks between the real OpenAI
+    client ("openai", the default) and the offline stand-in ("local").
+    """
+    backend = (backend or os.getenv('OPENAI_BACKEND') or 'openai').strip().lower()
+    if backend == 'local':
+        return LocalOpenAI.from_env()
+    if backend != 'openai':
+        raise ValueError(f"Unknown OPENAI_BACKEND '{backend}', expected 'openai' or 'local'")
+
+    from openai import OpenAI
+    return OpenAI(api_key=api_key) if api_key else OpenAI()
+
+# function: wait on the run to complete
+def wait_on_run(client, run, thread_id, initial_delay=RUN_POLL_INITIAL_DELAY, max_delay=RUN_POLL_MAX_DELAY,
+                timeout=RUN_TIMEOUT):
+    """Poll a run until it leaves the queued/in_progress states, backing off exponentially between checks"""
+    delay = initial_delay
+    deadline = time.monotonic() + timeout if timeout else None
+    while run.status == 'queued' or run.status == 'in_progress':
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"Assistant run {run.id} did not finish within {timeout}s")
+        time.sleep(delay)
+        delay = min(delay * 2, max_delay)
+        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+    return run
+
+def run_tool_calls(run, tool_handler=call_chat_tool):
+    """Answer the function calls a run is waiting on; returns the tool_outputs to submit"""
+    tool_outputs = []
+    for tool_call in run.required_action.submit_tool_outputs.tool_calls:
+        output = tool_handler(tool_call.function.name, tool_call.function.arguments)
+        tool_outputs.append({"tool_call_id": tool_call.id, "output": output})
+    return tool_outputs
+
+def stream_run(client, on_text=None, tool_handler=call_chat_tool, **run_settings):
+    """Run the assistant with streamed events and return (run, reply text).
+
+    `on_text` is called with the reply received so far each time a text delta
+    arrives, so the UI can draw the answer while it is being generated. Tool
+    calls are answered locally and the run continues on a new stream.
+    """
+    parts = []
+    run = None
+    manager = client.beta.threads.runs.stream(**run_settings)
+    while manager is not None:
+        with manager as stream:
+            manager = None
+            for event in stream:
+                if event.event == 'thread.message.created' and parts:
+                    # Separate consecutive assistant messages like display_thread_messages does
+                    parts.append("\n\n")
+                elif event.event == 'thread.message.delta':
+                    for content in event.data.delta.content or []:
+                        if content.type == 'text' and content.text and content.text.value:
+                            parts.append(content.text.value)
+                            if on_text:
+                                on_text("".join(parts))
+                elif event.event.startswith('thread.run.') and not event.event.startswith('thread.run.step.'):
+                    run = event.data
+                    if event.event == 'thread.run.requires_action':
+                        manager = client.beta.threads.runs.submit_tool_outputs_stream(
+                            thread_id=run.thread_id,
+                            run_id=run.id,
+                            tool_outputs=run_tool_calls(run, tool_handler)
+                        )
+                        break
+    return run, "".join(parts)
+
+def check_run_status(run):
+    """Raise when a run finished without completing (failed, cancelled, expired)"""
+    if run is None or run.status != 'completed':
+        status = run.status if run is not None else 'unknown'
+        raise RuntimeError(f"Assistant run ended with status '{status}'")
+
+# function: display the response
+def display_thread_messages(messages):
+    message_texts = []
+    for thread_message in messages.data[::-1]:
+        # Append the message content to the list
+        message_texts.append(thread_message.content[0].text.value)
+    # Join the list into a single string separated by newlines
+    return "\n\n".join(message_texts)
+
+def user_message_params(thread_id, user_message, file_id=None):
+    """Arguments for posting a user message to a thread, with the file attached if given"""
+    message_params = {
+        "thread_id": thread_id,
+        "role": "user",
+        "content": user_message
+    }
+
+    # Add attachments if a file_id is provided
+    if file_id:
+        message_params["attachments"] = [
+            {
+                "file_id": file_id,
+                "tools": [
+                    {"type": "code_interpreter"},
+                    {"type": "file_search"}
+                ]
+            }
+        ]
+    return message_params
+
+def record_turn(client, thread_id, user_message, reply, file_id=None):
+    """Add a question and an answer produced elsewhere to a thread, so later turns see them as context"""
+    client.beta.threads.messages.create(**user_message_params(thread_id, user_message, file_id))
+    client.beta.threads.messages.create(thread_id=thread_id, role="assistant", content=reply)
+
+def run_assistant_turn(client, thread_id, user_message, assistant_id, file_id=None, on_text=None, stream=True,
+                       tool_handler=call_chat_tool, context=None):
+    """Post a user message to the thread, run the assistant and return its reply text.
+
+    With `stream` the reply arrives as run events and `on_text` sees it grow;
+    clients without run streaming fall back to polling the run. Function calls
+    are answered by `tool_handler(name, arguments)` from the local store.
+    `context` (e.g. retrieved passages) is added to this run's instructions only.
+    """
+    # Add user message to the thread
+    message = client.beta.threads.messages.create(**user_message_params(thread_id, user_message, file_id))
+
+    # Prepare run settings without 'tool_resources'; local data tools always,
+    # the remote sandbox tools only when a file is attached
+    run_settings = {
+        "thread_id": thread_id,
+        "assistant_id": assistant_id,
+        "tools": get_chat_tools(file_id)
+    }
+    if context:
+        run_settings["additional_instructions"] = context
+
+    # Stream the run when the client supports it; otherwise poll with backoff
+    if stream and hasattr(client.beta.threads.runs, 'stream'):
+        run, reply = stream_run(client, on_text=on_text, tool_handler=tool_handler, **run_settings)
+        check_run_status(run)
+        return reply
+
+    run = client.beta.threads.runs.create(**run_settings)
+    run = wait_on_run(client, run, thread_id)
+    while run.status == 'requires_action':
+        run = client.beta.threads.runs.submit_tool_outputs(
+            thread_id=thread_id,
+            run_id=run.id,
+            tool_outputs=run_tool_calls(run, tool_handler)
+        )
+        run = wait_on_run(client, run, thread_id)
+    check_run_status(run)
+
+    messages = client.beta.threads.messages.list(
+        thread_id=thread_id,
+        order='asc',
+        after=message.id
+    )
+
+    reply = display_thread_messages(messages)
+    if on_text:
+        on_text(reply)
+    return reply
@@ -0,0 +1,494 @@
+# utils/local_openai.py
+# Offline stand-in for the parts of the OpenAI client this project uses:
+# chat.completions (plain and streamed), the beta threads/messages/runs API
+# (runs polled or streamed) and file uploads.
+
+import itertools
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+from utils.aqi_utils import build_basic_alert, get_aqi_category, get_health_implications, get_recommended_actions
+
+class LocalAPIError(Exception):
+    """Injected failure raised by the local stand-in"""
+
+class LocalAPITimeoutError(LocalAPIError):
+    """Injected timeout raised by the local stand-in"""
+
+class LatencyModel:
+    """Sample request latency in seconds from a named distribution.
+
+    Supported kinds: `fixed` (a), `uniform` (a..b), `normal` (mean a, stddev b)
+    and `lognormal` (median a, sigma b).
+    """
+
+    KINDS = ('fixed', 'uniform', 'normal', 'lognormal')
+
+    def __init__(self, kind='fixed', a=0.0, b=0.0, rng=None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+        self.kind = kind
+        self.a = float(a)
+        self.b = float(b)
+        self.rng = rng or random.Random()
+
+    @classmethod
+    def parse(cls, spec, rng=None):
+        """Parse a spec such as 'fixed:0.2' or 'lognormal:0.8,0.4'"""
+        if not spec:
+            return cls(rng=rng)
+        kind, _, params = spec.partition(':')
+        values = [float(v) for v in params.split(',') if v.strip()] if params else []
+        values += [0.0] * (2 - len(values))
+        return cls(kind.strip().lower(), values[0], values[1], rng=rng)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            value = self.a
+        elif self.kind == 'uniform':
+            value = self.rng.uniform(self.a, self.b)
+        elif self.kind == 'normal':
+            value = self.rng.gauss(self.a, self.b)
+        else:
+            value = self.a * math.exp(self.rng.gauss(0.0, self.b))
+        return max(0.0, value)
+
+def estimate_tokens(text):
+    """Rough token count using the ~4 characters per token rule of thumb"""
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
+
+def default_alert_responder(messages):
+    """Build a JSON alert reply from the data embedded in the last user message"""
+    content = messages[-1]['content']
+    start = content.find('{')
+    try:
+        payload = json.loads(content[start:]) if start != -1 else {}
+    except json.JSONDecodeError:
+        payload = {}
+
+    if 'areas' in payload:
+        areas = []
+        for summary in payload['areas']:
+            category = get_aqi_category(summary.get('max_aqi'))
+            areas.append({
+                'area': summary.get('area'),
+                'alert_type': 'Air Quality Advisory',
+                'health_implications': get_health_implications(category),
+                'recommended_actions': get_recommended_actions(category)
+            })
+        return json.dumps({'areas': areas}, ensure_ascii=False, indent=2)
+
+    alerts = [build_basic_alert(record) for record in payload.get('data', []) if record.get('aqi') is not None]
+    return json.dumps({'alerts': alerts}, ensure_ascii=False, indent=2)
+
+def default_assistant_responder(thread_messages):
+    """Reply to the latest user message in a thread"""
+    question = thread_messages[-1].content[0].text.value if thread_messages else ''
+    return f"(local assistant) You asked: {question}"
+
+# Keyword rules standing in for the model's choice of the project's chat tools, checked in order
+TOOL_KEYWORDS = [
+    ('get_stations_near', ('near', 'within', 'around', 'closest', 'nearest')),
+    ('get_station_history', ('history', 'trend', 'past', 'yesterday', 'last ')),
+    ('get_worst_stations', ('worst', 'highest', 'most polluted', 'top ')),
+    ('get_city_summary', ('summary', 'summarize', 'district', 'city', 'average')),
+    ('get_latest_reading', ('aqi', 'pm2.5', 'reading', 'air quality', 'station'))
+]
+PLACE_PATTERN = re.compile(r"^.*\b(?:at|in|for|of|near)\s+(?:station\s+)?([\w .'-]+?)(?:\s+(?:right now|now|today))?[?.!]*$",
+                           re.IGNORECASE)
+COORDINATE_PATTERN = re.compile(r"(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)")
+RADIUS_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*km\b", re.IGNORECASE)
+
+def default_tool_planner(thread_messages, functions):
+    """Pick function calls for the latest user message; returns [(name, arguments)], empty to answer directly"""
+    question = thread_messages[-1].content[0].text.value if thread_messages else ''
+    lowered = question.lower()
+    match = PLACE_PATTERN.search(question.strip())
+    place = match.group(1).strip() if match else None
+    for name, keywords in TOOL_KEYWORDS:
+        function = functions.get(name)
+        if function is None or not any(keyword in lowered for keyword in keywords):
+            continue
+        properties = function.get('parameters', {}).get('properties', {})
+        required = function.get('parameters', {}).get('required', [])
+        arguments = {}
+        coordinates = COORDINATE_PATTERN.search(question)
+        radius = RADIUS_PATTERN.search(question)
+        if coordinates and 'latitude' in properties:
+            arguments.update(latitude=float(coordinates.group(1)), longitude=float(coordinates.group(2)))
+        if radius and 'radius_km' in properties:
+            arguments['radius_km'] = float(radius.group(1))
+        for parameter in ('station', 'city'):
+            if place and parameter in properties and 'latitude' not in arguments:
+                arguments[parameter] = place
+                break
+        if 'latitude' in properties and not ('latitude' in arguments or 'station' in arguments):
+            continue
+        if all(parameter in arguments for parameter in required):
+            return [(name, arguments)]
+    return []
+
+def _text_message(message_id, thread_id, role, text, attachments=None):
+    return SimpleNamespace(
+        id=message_id,
+        object='thread.message',
+        thread_id=thread_id,
+        role=role,
+        created_at=int(time.time()),
+        attachments=attachments or [],
+        content=[SimpleNamespace(type='text', text=SimpleNamespace(value=text, annotations=[]))]
+    )
+
+class _Completions:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        messages = messages or []
+        self.owner._begin_request()
+        content = self.owner.responder(messages)
+        prompt_tokens = sum(estimate_tokens(m.get('content')) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        usage = self.owner._record_usage(prompt_tokens, completion_tokens)
+
+        if stream:
+            return self._stream(content)
+
+        self.owner._sleep_for_tokens(completion_tokens)
+        message = SimpleNamespace(role='assistant', content=content)
+        return SimpleNamespace(
+            model=model,
+            usage=usage,
+            choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')]
+        )
+
+    def _stream(self, content):
+        size = self.owner.chunk_size
+        for start in range(0, len(content), size):
+            piece = content[start:start + size]
+            self.owner._sleep_for_tokens(estimate_tokens(piece))
+            delta = SimpleNamespace(content=piece)
+            yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+        yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=None), finish_reason='stop')])
+
+class _Threads:
+    def __init__(self, owner):
+        self.owner = owner
+        self.messages = _Messages(owner)
+        self.runs = _Runs(owner)
+
+    def create(self, **kwargs):
+        thread_id = self.owner._new_id('thread')
+        with self.owner.lock:
+            self.owner.threads[thread_id] = []
+        return SimpleNamespace(id=thread_id, object='thread', created_at=int(time.time()))
+
+class _Messages:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, thread_id, role, content, attachments=None, **kwargs):
+        message = _text_message(self.owner._new_id('msg'), thread_id, role, content, attachments)
+        with self.owner.lock:
+            self.owner.threads[thread_id].append(message)
+        return message
+
+    def list(self, thread_id, order='desc', after=None, limit=20, **kwargs):
+        with self.owner.lock:
+            data = list(self.owner.threads[thread_id])
+        if after:
+            ids = [m.id for m in data]
+            data = data[ids.index(after) + 1:] if after in ids else data
+        if order == 'desc':
+            data = data[::-1]
+        return SimpleNamespace(object='list', data=data[:limit])
+
+class _Runs:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, thread_id, assistant_id, **kwargs):
+        # Latency and injected failures apply to the run as a whole, like the real API
+        started = time.monotonic()
+        self.owner._begin_request(sleep=False)
+        run = SimpleNamespace(
+            id=self.owner._new_id('run'),
+            object='thread.run',
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            status='queued',
+            usage=None,
+            tools=kwargs.get('tools', []),
+            required_action=None,
+            tool_outputs=None,
+            ready_at=started + self.owner.latency.sample()
+        )
+        with self.owner.lock:
+            self.owner.runs[run.id] = run
+        return self._snapshot(run)
+
+    def retrieve(self, run_id, thread_id, **kwargs):
+        with self.owner.lock:
+            self.owner.usage['run_polls'] += 1
+            run = self.owner.runs[run_id]
+            if run.status in ('queued', 'in_progress'):
+                if time.monotonic() < run.ready_at:
+                    run.status = 'in_progress'
+                elif not self._plan_tool_calls(run):
+                    self._complete(run)
+            return self._snapshot(run)
+
+    def submit_tool_outputs(self, thread_id, run_id, tool_outputs, **kwargs):
+        """Resume a run that is waiting on function calls"""
+        started = time.monotonic()
+        self.owner._begin_request(sleep=False)
+        with self.owner.lock:
+            run = self.owner.runs[run_id]
+            if run.status != 'requires_action':
+                raise LocalAPIError(f"Run {run_id} is not waiting on tool outputs (status '{run.status}')")
+            calls = {call.id: call.function.name for call in run.required_action.submit_tool_outputs.tool_calls}
+            run.tool_outputs = [(calls.get(output['tool_call_id']), output['output']) for output in tool_outputs]
+            run.required_action = None
+            run.status = 'queued'
+            run.ready_at = started + self.owner.latency.sample()
+            return self._snapshot(run)
+
+    def submit_tool_outputs_stream(self, thread_id, run_id, tool_outputs, **kwargs):
+        run = self.submit_tool_outputs(thread_id, run_id, tool_outputs, **kwargs)
+        return _RunStream(self, run.id)
+
+    def stream(self, thread_id, assistant_id, **kwargs):
+        """Create a run and return its event stream, used like `runs.stream` in the OpenAI SDK"""
+        run = self.create(thread_id, assistant_id, **kwargs)
+        return _RunStream(self, run.id)
+
+    def _plan_tool_calls(self, run):
+        """Ask for function calls before answering, once per run; caller holds the lock"""
+        functions = {tool['function']['name']: tool['function'] for tool in run.tools if tool.get('type') == 'function'}
+        if run.tool_outputs is not None or not functions:
+            return False
+        calls = self.owner.tool_planner(self.owner.threads[run.thread_id], functions)
+        if not calls:
+            return False
+        tool_calls = [
+            SimpleNamespace(id=self.owner._new_id('call'), type='function',
+                            function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+            for name, arguments in calls
+        ]
+        run.required_action = SimpleNamespace(type='submit_tool_outputs',
+                                              submit_tool_outputs=SimpleNamespace(tool_calls=tool_calls))
+        run.status = 'requires_action'
+        return True
+
+    def _reply(self, run):
+        """The assistant's answer, quoting any tool outputs the run received; caller holds the lock"""
+        reply = self.owner.assistant_responder(self.owner.threads[run.thread_id])
+        for name, output in run.tool_outputs or []:
+            reply += f"\n\n{name}: {output}"
+        return reply
+
+    def _complete(self, run):
+        self._finish(run, _text_message(self.owner._new_id('msg'), run.thread_id, 'assistant', self._reply(run)))
+
+    def _finish(self, run, message):
+        """Add the reply to the thread and mark the run completed; caller holds the lock"""
+        thread = self.owner.threads[run.thread_id]
+        prompt_tokens = sum(estimate_tokens(m.content[0].text.value) for m in thread)
+        completion_tokens = estimate_tokens(message.content[0].text.value)
+        thread.append(message)
+        run.usage = self.owner._record_usage(prompt_tokens, completion_tokens)
+        run.status = 'completed'
+
+    def _snapshot(self, run):
+        return SimpleNamespace(**vars(run))
+
+def _event(name, data):
+    return SimpleNamespace(event=name, data=data)
+
+class _RunStream:
+    """Server-sent run events for one run: created, in_progress, requires_action or message deltas, completed"""
+
+    def __init__(self, runs, run_id):
+        self.runs = runs
+        self.owner = runs.owner
+        self.run_id = run_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __iter__(self):
+        owner = self.owner
+        with owner.lock:
+            run = owner.runs[self.run_id]
+            created = self.runs._snapshot(run)
+        yield _event('thread.run.created' if run.tool_outputs is None else 'thread.run.queued', created)
+
+        # The run starts once its sampled latency has passed, then either asks for
+        # function calls (ending this stream) or sends the reply in chunks
+        time.sleep(max(0.0, run.ready_at - time.monotonic()))
+        with owner.lock:
+            if self.runs._plan_tool_calls(run):
+                requires_action = self.runs._snapshot(run)
+            else:
+                requires_action = None
+                run.status = 'in_progress'
+                in_progress = self.runs._snapshot(run)
+                reply = self.runs._reply(run)
+        if requires_action is not None:
+            yield _event('thread.run.requires_action', requires_action)
+            return
+        yield _event('thread.run.in_progress', in_progress)
+
+        message = _text_message(owner._new_id('msg'), run.thread_id, 'assistant', '')
+        yield _event('thread.message.created', message)
+        for start in range(0, len(reply), owner.chunk_size):
+            piece = reply[start:start + owner.chunk_size]
+            owner._sleep_for_tokens(estimate_tokens(piece))
+            text = SimpleNamespace(value=piece, annotations=[])
+            delta = SimpleNamespace(role='assistant', content=[SimpleNamespace(index=0, type='text', text=text)])
+            yield _event('thread.message.delta', SimpleNamespace(id=message.id, object='thread.message.delta', delta=delta))
+
+        message.content[0].text.value = reply
+        with owner.lock:
+            self.runs._finish(run, message)
+            completed = self.runs._snapshot(run)
+        yield _event('thread.message.completed', message)
+        yield _event('thread.run.completed', completed)
+
+class LocalNotFoundError(LocalAPIError):
+    """Raised for ids the local stand-in does not know"""
+
+class _Files:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def create(self, file, purpose='assistants', **kwargs):
+        content = file.read() if hasattr(file, 'read') else bytes(file)
+        self.owner._begin_request()
+        # Uploads also pay for their size when a throughput is configured
+        if self.owner.upload_bytes_per_second:
+            time.sleep(len(content) / self.owner.upload_bytes_per_second)
+        uploaded = SimpleNamespace(
+            id=self.owner._new_id('file'),
+            object='file',
+            bytes=len(content),
+            filename=os.path.basename(getattr(file, 'name', 'upload')),
+            purpose=purpose,
+            created_at=int(time.time())
+        )
+        with self.owner.lock:
+            self.owner.uploads[uploaded.id] = uploaded
+            self.owner.usage['uploads'] += 1
+            self.owner.usage['uploaded_bytes'] += len(content)
+        return uploaded
+
+    def retrieve(self, file_id, **kwargs):
+        with self.owner.lock:
+            if file_id not in self.owner.uploads:
+                raise LocalNotFoundError(f"No such file: {file_id}")
+            return self.owner.uploads[file_id]
+
+    def delete(self, file_id, **kwargs):
+        with self.owner.lock:
+            if self.owner.uploads.pop(file_id, None) is None:
+                raise LocalNotFoundError(f"No such file: {file_id}")
+        return SimpleNamespace(id=file_id, object='file', deleted=True)
+
+    def list(self, purpose=None, **kwargs):
+        with self.owner.lock:
+            data = [f for f in self.owner.uploads.values() if purpose is None or f.purpose == purpose]
+        return SimpleNamespace(object='list', data=data)
+
+class LocalOpenAI:
+    """Offline replacement for `openai.OpenAI` with configurable latency, token accounting and failures"""
+
+    def __init__(self, responder=None, assistant_responder=None, latency=None, tokens_per_second=None,
+                 chunk_size=16, error_rate=0.0, timeout_rate=0.0, timeout=30.0, seed=None, tool_planner=None,
+                 upload_bytes_per_second=None):
+        self.rng = random.Random(seed)
+        self.responder = responder or default_alert_responder
+        self.assistant_responder = assistant_responder or default_assistant_responder
+        self.tool_planner = tool_planner or default_tool_planner
+        if isinstance(latency, LatencyModel):
+            self.latency = latency
+        else:
+            self.latency = LatencyModel.parse(latency, rng=self.rng)
+        self.tokens_per_second = tokens_per_second
+        self.chunk_size = chunk_size
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self.upload_bytes_per_second = upload_bytes_per_second
+
+        self.lock = threading.RLock()
+        self.ids = itertools.count(1)
+        self.threads = {}
+        self.runs = {}
+        self.uploads = {}
+        self.usage = {'requests': 0, 'errors': 0, 'timeouts': 0, 'run_polls': 0, 'uploads': 0, 'uploaded_bytes': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.beta = SimpleNamespace(threads=_Threads(self))
+        self.files = _Files(self)
+
+    @classmethod
+    def from_env(cls, **overrides):
+        """Build a stand-in from LOCAL_OPENAI_* environment variables"""
+        seed = os.getenv('LOCAL_OPENAI_SEED')
+        tokens_per_second = os.getenv('LOCAL_OPENAI_TOKENS_PER_SECOND')
+        upload_rate = os.getenv('LOCAL_OPENAI_UPLOAD_BYTES_PER_SECOND')
+        settings = {
+            'latency': os.getenv('LOCAL_OPENAI_LATENCY', 'fixed:0'),
+            'tokens_per_second': float(tokens_per_second) if tokens_per_second else None,
+            'error_rate': float(os.getenv('LOCAL_OPENAI_ERROR_RATE', 0)),
+            'timeout_rate': float(os.getenv('LOCAL_OPENAI_TIMEOUT_RATE', 0)),
+            'timeout': float(os.getenv('LOCAL_OPENAI_TIMEOUT', 30)),
+            'seed': int(seed) if seed else None,
+            'upload_bytes_per_second': float(upload_rate) if upload_rate else None
+        }
+        settings.update(overrides)
+        return cls(**settings)
+
+    def _new_id(self, prefix):
+        return f"{prefix}_local_{next(self.ids)}"
+
+    def _begin_request(self, sleep=True):
+        """Count the request, inject configured failures and wait out the sampled latency"""
+        with self.lock:
+            self.usage['requests'] += 1
+            roll = self.rng.random()
+        if roll < self.timeout_rate:
+            with self.lock:
+                self.usage['timeouts'] += 1
+            time.sleep(self.timeout)
+            raise LocalAPITimeoutError(f"Request timed out after {self.timeout}s")
+        if roll < self.timeout_rate + self.error_rate:
+            with self.lock:
+                self.usage['errors'] += 1
+            raise LocalAPIError("Injected API error")
+        if sleep:
+            time.sleep(self.latency.sample())
+
+    def _sleep_for_tokens(self, tokens):
+        if self.tokens_per_second:
+            time.sleep(tokens / self.tokens_per_second)
+
+    def _record_usage(self, prompt_tokens, completion_tokens):
+        with self.lock:
+            self.usage['prompt_tokens'] += prompt_tokens
+            self.usage['completion_tokens'] += completion_tokens
+            self.usage['total_tokens'] += prompt_tokens + completion_tokens
+        return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                               total_tokens=prompt_tokens + completion_tokens)
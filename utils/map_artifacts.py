@@ -0,0 +1,241 @@
+import base64
+import os
+import threading
+import time
+from datetime import datetime
+
+from utils.file_utils import file_checksum, write_text_atomic
+from utils.snapshots import get_latest_artifact, load_json_snapshot
+
+MAP_ARTIFACT_DIR = os.path.join('output', 'maps', 'cache')
+MAP_RENDER_VERSION = 2     # bump whenever build_aqi_map changes, so stale renders are not served
+KEEP_MAP_ARTIFACTS = 24    # about a day of hourly snapshots
+MAP_MODES = ('geojson', 'markers')
+DEFAULT_MAP_MODE = 'geojson'
+POPUP_FIELDS = ('station_name', 'aqi', 'pm25', 'pm10', 'temperature', 'humidity')
+
+_lock = threading.Lock()
+_hashes = {}   # (path, mtime, size) -> content hash
+
+def get_map_mode(mode=None):
+    mode = mode or os.getenv('MAP_RENDER_MODE', DEFAULT_MAP_MODE)
+    if mode not in MAP_MODES:
+        raise ValueError(f"Unknown map mode '{mode}'; expected one of {', '.join(MAP_MODES)}")
+    return mode
+
+def mapped_stations(data):
+    """Stations with coordinates and an AQI reading"""
+    # Skip if no AQI data or coordinates
+    return [station for station in data['data']
+            if all([station.get('latitude'), station.get('longitude'), station.get('aqi')])]
+
+def station_features(data):
+    """Mapped stations as a GeoJSON FeatureCollection carrying the readings shown in popups"""
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'geometry': {'type': 'Point', 'coordinates': [station['longitude'], station['latitude']]},
+                'properties': {field: station.get(field) for field in POPUP_FIELDS}
+            }
+            for station in mapped_stations(data)
+        ]
+    }
+
+def add_station_markers(marker_group, data, colormap):
+    """One CircleMarker with its own Popup per station"""
+    import folium
+
+    for station in mapped_stations(data):
+        # Determine color based on AQI value
+        aqi = station['aqi']
+        color = colormap(aqi)
+        
+        # Create popup content
+        popup_content = f"""
+            <b>{station['station_name']}</b><br>
+            AQI: {aqi}<br>
+            PM2.5: {station['pm25']}<br>
+            PM10: {station['pm10']}<br>
+            Temperature: {station['temperature']}°C<br>
+            Humidity: {station['humidity']}%
+        """
+        
+        # Add circle marker to marker group
+        folium.CircleMarker(
+            location=[station['latitude'], station['longitude']],
+            radius=8,
+            popup=folium.Popup(popup_content, max_width=300),
+            color=color,
+            fill=True,
+            fill_color=color,
+            fill_opacity=0.7,
+            weight=2
+        ).add_to(marker_group)
+
+def build_aqi_map(data, mode=None, surface=None):
+    """Build the AQI map: station markers, a heatmap layer and the One Bangkok marker.
+
+    `mode` is 'geojson' (default, from MAP_RENDER_MODE) or 'markers'. With a
+    `surface` (png_bytes, bounds) from get_aqi_surface, the interpolated AQI
+    surface is shown and the heatmap starts hidden.
+    """
+    mode = get_map_mode(mode)
+
+    # folium and branca are only loaded once a page actually draws the map
+    import folium
+    import branca.colormap as cm
+    from folium import plugins
+
+    # Center coordinates for One Bangkok Smart City, shared with its geofenced subscription
+    from utils.geofence import ONE_BANGKOK_CENTER
+    one_bangkok_center = list(ONE_BANGKOK_CENTER)
+
+    # Create a map centered on One Bangkok with increased zoom level
+    m = folium.Map(location=one_bangkok_center, zoom_start=13)
+
+    # Add a marker for One Bangkok
+    folium.Marker(
+        location=one_bangkok_center,
+        popup="One Bangkok Smart City",
+        icon=folium.Icon(color='blue', icon='info-sign'),
+        tooltip="One Bangkok Smart City"
+    ).add_to(m)
+
+    # Create a color scale for AQI values
+    colormap = cm.LinearColormap(
+        colors=['green', 'yellow', 'orange', 'red', 'purple', 'maroon'],
+        vmin=0,
+        vmax=300,
+        caption='Air Quality Index (AQI)'
+    )
+    colormap.add_to(m)
+
+    # Create feature groups for layers
+    marker_group = folium.FeatureGroup(name='Station Markers')
+    heatmap_group = folium.FeatureGroup(name='AQI Heatmap', show=surface is None)
+
+    # Add the stations, either one CircleMarker and Popup each or as a single GeoJSON layer
+    heat_data = [[station['latitude'], station['longitude'], station['aqi']] for station in mapped_stations(data)]
+    if mode == 'geojson':
+        from utils.map_layers import StationGeoJson
+        marker_group = StationGeoJson(station_features(data), colormap.colors, colormap.vmin, colormap.vmax)
+    else:
+        add_station_markers(marker_group, data, colormap)
+
+    # Add heatmap layer
+    plugins.HeatMap(
+        heat_data,
+        min_opacity=0.4,
+        radius=25,
+        blur=15,
+        gradient={
+            '0': 'blue',
+            '0.4': 'lime',
+            '0.6': 'yellow',
+            '0.8': 'orange',
+            '1': 'red'
+        }
+    ).add_to(heatmap_group)
+
+    # Add the interpolated surface, embedded so the page needs no other file
+    if surface is not None:
+        png, bounds = surface
+        folium.raster_layers.ImageOverlay(
+            image='data:image/png;base64,' + base64.b64encode(png).decode('ascii'),
+            bounds=bounds,
+            opacity=0.55,
+            name='AQI Surface (estimated)'
+        ).add_to(m)
+
+    # Add the feature groups to the map
+    heatmap_group.add_to(m)
+    marker_group.add_to(m)
+
+    # Add fullscreen option
+    plugins.Fullscreen().add_to(m)
+
+    # Add layer control
+    folium.LayerControl().add_to(m)
+
+    return m
+
+def snapshot_hash(path):
+    """Short content hash of a snapshot file, computed once per (path, mtime, size)"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if key in _hashes:
+            return _hashes[key]
+    content_hash = file_checksum(path)[:16]
+    with _lock:
+        for stale in [k for k in _hashes if k[0] == key[0]]:
+            del _hashes[stale]
+        _hashes[key] = content_hash
+    return content_hash
+
+def map_artifact_path(content_hash, mode=None):
+    return os.path.join(MAP_ARTIFACT_DIR, f'aqi_map_{content_hash}_{get_map_mode(mode)}_v{MAP_RENDER_VERSION}.html')
+
+def render_map_artifact(data_path, data=None, mode=None):
+    """Render the map for a snapshot file to HTML once and return the artifact path.
+
+    Artifacts are keyed by the snapshot's content hash, so the same readings
+    are never rendered twice, even across processes.
+    """
+    content_hash = snapshot_hash(data_path)
+    path = map_artifact_path(content_hash, mode)
+    if os.path.exists(path):
+        return path
+    with _lock:
+        if os.path.exists(path):
+            return path
+        started = time.perf_counter()
+        data = data if data is not None else load_json_snapshot(data_path)
+        m = build_aqi_map(data, mode, load_surface(data, content_hash))
+        write_text_atomic(m.get_root().render(), path)
+        print(f"Rendered map for {os.path.basename(data_path)} in {time.perf_counter() - started:.2f}s")
+        prune_map_artifacts()
+    return path
+
+def load_surface(data, content_hash):
+    """(png_bytes, bounds) of the snapshot's interpolated AQI surface, or None if it cannot be built"""
+    try:
+        from utils.aqi_surface import get_aqi_surface
+        png, bounds = get_aqi_surface(data, content_hash)
+    except Exception as e:
+        # The map still works without it; the heatmap is shown instead
+        print(f"Could not build the AQI surface: {e}")
+        return None
+    return (png, bounds) if png else None
+
+def prune_map_artifacts(keep=KEEP_MAP_ARTIFACTS):
+    """Delete all but the newest `keep` rendered maps"""
+    if not os.path.isdir(MAP_ARTIFACT_DIR):
+        return
+    artifacts = sorted(
+        (os.path.join(MAP_ARTIFACT_DIR, name) for name in os.listdir(MAP_ARTIFACT_DIR)
+         if name.startswith('aqi_map_') and name.endswith('.html')),
+        key=os.path.getmtime,
+        reverse=True
+    )
+    for path in artifacts[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def load_map_html(mode=None):
+    """Return (html, timestamp) of the map for the latest hourly snapshot, or (None, None) when there is none.
+
+    Uses the artifact the pipeline rendered; only a snapshot it did not
+    render (e.g. folium missing there) is rendered here, once.
+    """
+    data_path = get_latest_artifact('hourly')
+    if not data_path:
+        return None, None
+    with open(render_map_artifact(data_path, mode=mode), 'r', encoding='utf-8') as f:
+        html = f.read()
+    timestamp = load_json_snapshot(data_path)['query_timestamp']
+    return html, datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d %H:%M')
@@ -0,0 +1,83 @@
+from folium.elements import JSCSSMixin
+from folium.map import Layer
+from folium.plugins import MarkerCluster
+from jinja2 import Template
+
+class StationGeoJson(JSCSSMixin, Layer):
+    """Every station as one GeoJSON FeatureCollection, styled and given popups in the browser.
+
+    The HTML carries each station's readings once instead of a CircleMarker
+    and Popup per station. Marker colours follow the same linear AQI scale as
+    the colormap legend; with `cluster`, nearby stations are grouped and each
+    cluster takes the colour of its worst station.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function() {
+                var colors = {{ this.colors|tojson }};
+                function color(aqi) {
+                    var t = Math.min(Math.max((aqi - {{ this.vmin }}) / ({{ this.vmax }} - {{ this.vmin }}), 0), 1) * (colors.length - 1);
+                    var i = Math.min(Math.floor(t), colors.length - 2), f = t - i;
+                    return 'rgb(' + [0, 1, 2].map(function(k) {
+                        return Math.round(colors[i][k] + (colors[i + 1][k] - colors[i][k]) * f);
+                    }).join(',') + ')';
+                }
+                function escape(value) {
+                    return String(value).replace(/[&<>"']/g, function(c) { return '&#' + c.charCodeAt(0) + ';'; });
+                }
+                function popup(p) {
+                    return '<b>' + escape(p.station_name) + '</b><br>' +
+                        'AQI: ' + escape(p.aqi) + '<br>' +
+                        'PM2.5: ' + escape(p.pm25) + '<br>' +
+                        'PM10: ' + escape(p.pm10) + '<br>' +
+                        'Temperature: ' + escape(p.temperature) + '°C<br>' +
+                        'Humidity: ' + escape(p.humidity) + '%';
+                }
+                var stations = L.geoJSON({{ this.data|tojson }}, {
+                    pointToLayer: function(feature, latlng) {
+                        var c = color(feature.properties.aqi);
+                        return L.circleMarker(latlng, {radius: 8, color: c, fillColor: c, fillOpacity: 0.7, weight: 2});
+                    },
+                    onEachFeature: function(feature, layer) {
+                        layer.bindPopup(function() { return popup(feature.properties); }, {maxWidth: 300});
+                    }
+                });
+                {%- if this.cluster %}
+                var options = {{ this.cluster_options|tojson }};
+                options.iconCreateFunction = function(cluster) {
+                    var worst = Math.max.apply(null, cluster.getAllChildMarkers().map(function(m) {
+                        return m.feature.properties.aqi;
+                    }));
+                    return L.divIcon({
+                        html: '<div style="background:' + color(worst) + ';opacity:0.85;border-radius:50%;width:34px;height:34px;' +
+                            'line-height:34px;text-align:center;font-weight:bold;color:#fff;">' + cluster.getChildCount() + '</div>',
+                        className: 'aqi-cluster',
+                        iconSize: L.point(34, 34)
+                    });
+                };
+                return L.markerClusterGroup(options).addLayer(stations);
+                {%- else %}
+                return stations;
+                {%- endif %}
+            })();
+        {% endmacro %}
+        """)
+
+    default_js = MarkerCluster.default_js
+    default_css = MarkerCluster.default_css
+
+    def __init__(self, data, colors, vmin=0, vmax=300, cluster=True, cluster_options=None,
+                 name='Station Markers', overlay=True, control=True, show=True):
+        super().__init__(name=name, overlay=overlay, control=control, show=show)
+        self._name = 'StationGeoJson'
+        self.data = data
+        self.colors = [[round(channel * 255) for channel in rgba[:3]] for rgba in colors]
+        self.vmin = vmin
+        self.vmax = vmax
+        self.cluster = cluster
+        self.cluster_options = cluster_options or {'maxClusterRadius': 40, 'disableClusteringAtZoom': 15}
+        if not cluster:
+            # Without clustering the page does not need the markercluster plugin
+            self.default_js = []
+            self.default_css = []
@@ -1,7 +1,23 @@
-import re
 import html
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
 import streamlit as st
 
+# Messages drawn per rerun; older turns stay collapsed until asked for
+CHAT_WINDOW = 20
+MAX_CACHED_MESSAGES = 2000
+# Minimum time between redraws of a reply that is still streaming
+STREAM_REFRESH_SECONDS = 0.05
+# Shown under assistant answers served from the answer cache
+CACHED_BADGE = '<div style="margin-top: 6px; font-size: 11px; color: #5F6368;">⚡ Cached answer for the current data</div>'
+
+_html_cache = OrderedDict()
+_html_lock = threading.Lock()
+
 def format_message(text):
     """
     This function is used to format the messages in the chatbot UI.
@@ -22,15 +38,16 @@ def format_message(text):
 
     return formatted_text
 
-def message_func(text, user_icon_base64, assistant_icon_base64, is_user=False, model="Claude-3 Haiku"):
+def build_message_html(text, user_icon_base64, assistant_icon_base64, is_user=False, cached=False):
     """
-    This function is used to display the messages in the chatbot UI.
+    This function builds the HTML for one message in the chatbot UI.
 
     Parameters:
     text (str): The text to be displayed.
     is_user (bool): Whether the message is from the user or not.
     user_icon_base64 (str): Base64 encoded user avatar image.
     assistant_icon_base64 (str): Base64 encoded assistant avatar image.
+    cached (bool): Whether the answer was served from the answer cache.
     """
 
     # Escape special HTML characters in the text to avoid Markdown interpretation
@@ -43,28 +60,132 @@ def message_func(text, user_icon_base64, assistant_icon_base64, is_user=False, m
         message_bg_color = "#D7E8FA"  # Light blue for user messages
         message_text_color = "#000000"  # Black text for user messages
         avatar_class = "user-avatar"
-        st.write(
-            f"""
+        return f"""
                 <div style="display: flex; align-items: center; margin-bottom: 10px; justify-content: {message_alignment};">
                     <div style="background: {message_bg_color}; color: {message_text_color}; border-radius: 20px; padding: 10px; margin-right: 5px; max-width: 75%; font-size: 14px;">
                         {escaped_text} \n </div>
                     <img src="{avatar_base64}" class="{avatar_class}" alt="avatar" style="width: 40px; height: 40px;" />
                 </div>
-            """,
-            unsafe_allow_html=True,
-        )
+            """
     else:
         message_alignment = "flex-start"
         message_bg_color = "#FFFFFF"  # White for assistant messages
         message_text_color = "#000000"  # Black text for assistant messages
         avatar_class = "bot-avatar"
-        st.write(
-            f"""
+        return f"""
                 <div style="display: flex; align-items: center; margin-bottom: 10px; justify-content: {message_alignment};">
                     <img src="{avatar_base64}" class="{avatar_class}" alt="avatar" style="width: 40px; height: 40px;" />
                     <div style="background: {message_bg_color}; color: {message_text_color}; border-radius: 20px; padding: 10px; margin-left: 5px; max-width: 75%; font-size: 14px; border: 1px solid #E5E8E8;">
-                        {text} \n </div>
+                        {text} \n {CACHED_BADGE if cached else ""}</div>
                 </div>
-            """,
-            unsafe_allow_html=True,
+            """
+
+def new_message(role, content, cached=False):
+    """A chat message with a stable id, used to memoize its rendered HTML"""
+    return {"id": uuid.uuid4().hex, "role": role, "content": content, "cached": cached}
+
+def message_html(message, user_icon_base64, assistant_icon_base64):
+    """Rendered HTML for a message, built once per message id"""
+    if "id" not in message:
+        message["id"] = uuid.uuid4().hex
+    key = (message["id"], user_icon_base64, assistant_icon_base64)
+    with _html_lock:
+        if key in _html_cache:
+            _html_cache.move_to_end(key)
+            return _html_cache[key]
+
+    rendered = build_message_html(message["content"], user_icon_base64, assistant_icon_base64,
+                                  is_user=message["role"] == "user", cached=message.get("cached", False))
+    with _html_lock:
+        _html_cache[key] = rendered
+        while len(_html_cache) > MAX_CACHED_MESSAGES:
+            _html_cache.popitem(last=False)
+    return rendered
+
+def message_func(text, user_icon_base64, assistant_icon_base64, is_user=False, model="Claude-3 Haiku"):
+    """
+    This function is used to display the messages in the chatbot UI.
+
+    Parameters:
+    text (str): The text to be displayed.
+    is_user (bool): Whether the message is from the user or not.
+    user_icon_base64 (str): Base64 encoded user avatar image.
+    assistant_icon_base64 (str): Base64 encoded assistant avatar image.
+    """
+    st.write(build_message_html(text, user_icon_base64, assistant_icon_base64, is_user), unsafe_allow_html=True)
+
+def display_message(message, user_icon_base64, assistant_icon_base64, container=None):
+    """Display a stored message using its memoized HTML, optionally into a placeholder"""
+    (container or st).write(message_html(message, user_icon_base64, assistant_icon_base64), unsafe_allow_html=True)
+
+def streaming_message(user_icon_base64, assistant_icon_base64):
+    """
+    Placeholder bubble for an assistant reply that is still arriving.
+
+    Returns (placeholder, on_text); `on_text(text)` redraws the bubble with the
+    reply so far, at most once per STREAM_REFRESH_SECONDS. Display the stored
+    message into the placeholder once the reply is complete.
+    """
+    placeholder = st.empty()
+    last_drawn = [0.0]
+
+    def on_text(text):
+        now = time.monotonic()
+        if now - last_drawn[0] < STREAM_REFRESH_SECONDS:
+            return
+        last_drawn[0] = now
+        placeholder.write(build_message_html(text, user_icon_base64, assistant_icon_base64), unsafe_allow_html=True)
+
+    return placeholder, on_text
+
+def _show_earlier(state_key, window):
+    st.session_state[state_key] = st.session_state.get(state_key, window) + window
+
+def display_chat_history(messages, user_icon_base64, assistant_icon_base64, window=CHAT_WINDOW, key="chat",
+                         total=None, load_older=None):
+    """
+    Display the latest `window` messages, with a button that reveals older turns a window at a time.
+
+    `messages` may hold only the most recent part of a longer transcript of
+    `total` messages; `load_older(n)` then returns the n messages before it.
+    Rerun cost depends on the window, not on the length of the conversation.
+    """
+    state_key = f"{key}_history_shown"
+    shown = st.session_state.get(state_key, window)
+    total = len(messages) if total is None else total
+    hidden = max(total - shown, 0)
+    if hidden:
+        st.button(
+            f"Show earlier messages ({hidden} hidden)",
+            key=f"{key}_show_earlier",
+            on_click=_show_earlier,
+            args=(state_key, window)
         )
+
+    visible = messages[-shown:]
+    missing = min(shown, total) - len(visible)
+    if missing > 0 and load_older:
+        visible = load_older(missing) + visible
+
+    for message in visible:
+        display_message(message, user_icon_base64, assistant_icon_base64)
+
+def get_chat_session_id(key="chat"):
+    """Chat session id for this browser session, kept in the URL so a reload restores the transcript"""
+    state_key = f"{key}_session_id"
+    if state_key not in st.session_state:
+        requested = st.query_params.get(key) or ""
+        st.session_state[state_key] = requested if re.fullmatch(r"[0-9a-f]{32}", requested) else uuid.uuid4().hex
+    if st.query_params.get(key) != st.session_state[state_key]:
+        st.query_params[key] = st.session_state[state_key]
+    return st.session_state[state_key]
+
+def display_stored_chat(chat_store, session_id, user_icon_base64, assistant_icon_base64, key="chat"):
+    """Display a transcript from the chat store: the in-memory window first, older pages read from disk on request"""
+    recent = chat_store.recent(session_id)
+
+    def load_older(count):
+        return chat_store.older(session_id, recent[0]["seq"], count) if recent else []
+
+    display_chat_history(recent, user_icon_base64, assistant_icon_base64, key=key,
+                         total=chat_store.count(session_id), load_older=load_older)
@@ -0,0 +1,327 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.message import EmailMessage
+
+NOTIFICATION_DB = os.path.join('output', 'notifications', 'queue.db')
+RECIPIENTS_FILE = os.path.join('config', 'notification_recipients.json')
+DEFAULT_NEAR_RADIUS_KM = 5
+# What a hand-edited recipient or subscription definition can raise
+MALFORMED_DEFINITION_ERRORS = (AttributeError, IndexError, KeyError, TypeError, ValueError)
+
+def get_dedup_key(alert):
+    """Identify an alert so the same station reading is never sent twice to a recipient"""
+    raw = f"{alert.get('station_name')}|{alert.get('timestamp')}|{alert.get('aqi_level') or alert.get('alert_type')}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def load_recipients(path=None):
+    """Load recipient definitions, e.g. [{"id": "ops", "type": "webhook", "url": "...", "min_aqi": 100}].
+
+    A recipient with "near": {"latitude": ..., "longitude": ..., "radius_km": ...}
+    only gets alerts for stations within that radius.
+    """
+    path = path or os.getenv('NOTIFY_RECIPIENTS_FILE', RECIPIENTS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class NotificationQueue:
+    """Durable SQLite outbox holding one row per (recipient, alert)"""
+
+    def __init__(self, path=NOTIFICATION_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                dedup_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                delivered_at REAL,
+                last_error TEXT,
+                UNIQUE (recipient, dedup_key)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_notifications_due ON notifications (status, next_attempt_at)')
+        self.conn.commit()
+
+    def enqueue(self, recipient_id, alerts):
+        """Queue alerts for a recipient, skipping any already queued; returns the number added"""
+        now = time.time()
+        rows = [(recipient_id, get_dedup_key(alert), json.dumps(alert, ensure_ascii=False), now, now) for alert in alerts]
+        with self.lock:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO notifications (recipient, dedup_key, payload, next_attempt_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def due_recipients(self, now=None):
+        now = now or time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT recipient FROM notifications WHERE status = 'pending' AND next_attempt_at <= ?",
+                (now,)).fetchall()
+        return [row[0] for row in rows]
+
+    def claim_batch(self, recipient_id, limit):
+        """Mark up to `limit` due notifications for a recipient as sending and return them"""
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, payload, attempts FROM notifications "
+                "WHERE recipient = ? AND status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (recipient_id, now, limit)).fetchall()
+            self.conn.executemany("UPDATE notifications SET status = 'sending' WHERE id = ?", [(row[0],) for row in rows])
+            self.conn.commit()
+        return [{'id': row[0], 'alert': json.loads(row[1]), 'attempts': row[2]} for row in rows]
+
+    def mark_delivered(self, ids):
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE notifications SET status = 'delivered', delivered_at = ?, attempts = attempts + 1 WHERE id = ?",
+                [(time.time(), i) for i in ids])
+            self.conn.commit()
+
+    def mark_failed(self, items, error, max_attempts, backoff):
+        """Reschedule failed notifications with a backoff delay, giving up after max_attempts"""
+        now = time.time()
+        updates = []
+        for item in items:
+            attempts = item['attempts'] + 1
+            status = 'failed' if attempts >= max_attempts else 'pending'
+            updates.append((status, attempts, now + backoff(attempts), str(error), item['id']))
+        with self.lock:
+            self.conn.executemany(
+                'UPDATE notifications SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                updates)
+            self.conn.commit()
+
+    def requeue_stale(self):
+        """Return rows left in 'sending' by a crashed worker to the pending state"""
+        with self.lock:
+            self.conn.execute("UPDATE notifications SET status = 'pending' WHERE status = 'sending'")
+            self.conn.commit()
+
+    def depth(self):
+        """Count notifications by status"""
+        with self.lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM notifications GROUP BY status').fetchall()
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
+
+def format_notification_text(alerts):
+    """Render a batch of alerts as a plain-text digest"""
+    lines = [f"{len(alerts)} air quality alert(s):"]
+    for alert in sorted(alerts, key=lambda a: a.get('aqi') or 0, reverse=True):
+        lines.append(f"- {alert.get('station_name')}: AQI {alert.get('aqi')} ({alert.get('aqi_level', alert.get('alert_type', ''))})")
+    return "\n".join(lines)
+
+class WebhookSink:
+    """POST a JSON batch of alerts to an HTTP endpoint"""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    async def deliver(self, recipient, alerts):
+        import requests
+
+        def post():
+            response = requests.post(self.url, json={'recipient': recipient, 'alerts': alerts}, timeout=self.timeout)
+            response.raise_for_status()
+
+        await asyncio.to_thread(post)
+
+class SmtpSink:
+    """Email a plain-text digest of alerts"""
+
+    def __init__(self, address, host=None, port=None, sender=None, timeout=10):
+        self.address = address
+        self.host = host or os.getenv('SMTP_HOST', 'localhost')
+        self.port = int(port or os.getenv('SMTP_PORT', 25))
+        self.sender = sender or os.getenv('SMTP_SENDER', 'alerts@localhost')
+        self.timeout = timeout
+
+    async def deliver(self, recipient, alerts):
+        message = EmailMessage()
+        message['Subject'] = f"Air quality alerts ({len(alerts)})"
+        message['From'] = self.sender
+        message['To'] = self.address
+        message.set_content(format_notification_text(alerts))
+
+        def send():
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+                smtp.send_message(message)
+
+        await asyncio.to_thread(send)
+
+class LocalSink:
+    """In-process stand-in for a webhook/SMTP endpoint with configurable delay and failure rate"""
+
+    def __init__(self, delay=0.0, failure_rate=0.0, seed=None):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.deliveries = []
+
+    async def deliver(self, recipient, alerts):
+        await asyncio.sleep(self.delay)
+        if self.rng.random() < self.failure_rate:
+            raise ConnectionError("Injected delivery failure")
+        self.deliveries.append((recipient, alerts))
+
+def build_sink(recipient):
+    """Create the sink described by a recipient definition"""
+    sink_type = recipient.get('type', 'webhook')
+    if sink_type == 'webhook':
+        return WebhookSink(recipient['url'], timeout=recipient.get('timeout', 10))
+    if sink_type == 'smtp':
+        return SmtpSink(recipient['address'], recipient.get('host'), recipient.get('port'), recipient.get('sender'))
+    if sink_type == 'local':
+        return LocalSink(recipient.get('delay', 0.0), recipient.get('failure_rate', 0.0))
+    raise ValueError(f"Unknown sink type '{sink_type}' for recipient {recipient.get('id')}")
+
+def enqueue_alert_notifications(alerts, queue=None, recipients=None, subscriptions=None):
+    """Fan alerts out to the outbox of every interested recipient and geofenced subscription; never touches the network.
+
+    Malformed recipient or subscription definitions are skipped and outbox
+    errors are logged: queueing notifications never fails the pipeline.
+    """
+    # numpy is only loaded by runs that queue notifications
+    from utils.geofence import GeofenceRegistry, load_subscriptions
+    try:
+        recipients = load_recipients() if recipients is None else recipients
+        subscriptions = load_subscriptions() if subscriptions is None else subscriptions
+    except (OSError, ValueError) as e:
+        print(f"Could not load notification recipients: {e}")
+        return 0
+    if not (recipients or subscriptions) or not alerts:
+        return 0
+
+    own_queue = queue is None
+    try:
+        queue = queue or NotificationQueue()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Could not open the notification outbox: {e}")
+        return 0
+    stations = None
+    queued = 0
+    try:
+        for recipient in recipients:
+            try:
+                min_aqi = recipient.get('min_aqi', 0)
+                matching = [alert for alert in alerts if (alert.get('aqi') or 0) >= min_aqi]
+                near = recipient.get('near')
+                if near and matching:
+                    # One spatial index over this run's alerts answers every recipient's radius
+                    from utils.spatial_index import SpatialIndex
+                    stations = stations or SpatialIndex(alerts)
+                    nearby = {station.get('station_name') for station, _ in stations.within_radius(
+                        near['latitude'], near['longitude'], near.get('radius_km', DEFAULT_NEAR_RADIUS_KM))}
+                    matching = [alert for alert in matching if alert.get('station_name') in nearby]
+                if matching:
+                    queued += queue.enqueue(recipient['id'], matching)
+            except MALFORMED_DEFINITION_ERRORS as e:
+                print(f"Skipping malformed notification recipient {recipient!r}: {e!r}")
+        if subscriptions:
+            try:
+                matches = GeofenceRegistry(subscriptions).match(alerts)
+            except MALFORMED_DEFINITION_ERRORS as e:
+                print(f"Skipping geofenced subscriptions, the definitions are malformed: {e!r}")
+                matches = {}
+            for subscription_id, matching in matches.items():
+                queued += queue.enqueue(subscription_id, matching)
+    except sqlite3.Error as e:
+        print(f"Could not queue alert notifications: {e}")
+    finally:
+        if own_queue:
+            queue.close()
+    return queued
+
+class NotificationDispatcher:
+    """Deliver queued notifications with async workers, one batch per recipient at a time"""
+
+    def __init__(self, queue, sinks, workers=4, batch_size=50, max_attempts=5, base_backoff=30.0, max_backoff=3600.0):
+        self.queue = queue
+        self.sinks = sinks
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.metrics = {'delivered': 0, 'failed_attempts': 0, 'batches': 0, 'busy_seconds': 0.0}
+
+    def backoff(self, attempts):
+        """Capped exponential backoff with jitter"""
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _deliver_recipient(self, recipient_id):
+        sink = self.sinks.get(recipient_id)
+        while True:
+            items = self.queue.claim_batch(recipient_id, self.batch_size)
+            if not items:
+                return
+            self.metrics['batches'] += 1
+            if sink is None:
+                self.queue.mark_failed(items, f"No sink configured for {recipient_id}", 1, self.backoff)
+                continue
+            try:
+                await sink.deliver(recipient_id, [item['alert'] for item in items])
+                self.queue.mark_delivered([item['id'] for item in items])
+                self.metrics['delivered'] += len(items)
+            except Exception as e:
+                self.queue.mark_failed(items, e, self.max_attempts, self.backoff)
+                self.metrics['failed_attempts'] += len(items)
+                return
+
+    async def _worker(self, pending):
+        while True:
+            try:
+                recipient_id = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await self._deliver_recipient(recipient_id)
+
+    async def run_once(self):
+        """Drain everything currently due and return the metrics snapshot"""
+        started = time.perf_counter()
+        pending = asyncio.Queue()
+        for recipient_id in self.queue.due_recipients():
+            pending.put_nowait(recipient_id)
+        await asyncio.gather(*(self._worker(pending) for _ in range(self.workers)))
+        self.metrics['busy_seconds'] += time.perf_counter() - started
+        return self.get_metrics()
+
+    async def run_forever(self, poll_interval=30.0):
+        self.queue.requeue_stale()
+        while True:
+            await self.run_once()
+            await asyncio.sleep(poll_interval)
+
+    def get_metrics(self):
+        """Throughput and queue-depth metrics"""
+        busy = self.metrics['busy_seconds']
+        return {
+            **self.metrics,
+            'throughput_per_second': self.metrics['delivered'] / busy if busy else 0.0,
+            'queue_depth': self.queue.depth()
+        }
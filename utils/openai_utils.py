@@ -1,82 +1,116 @@
-import openai
-import time
 import streamlit as st
 
-from openai import OpenAI
+from utils.answer_cache import ANSWER_CACHE_TTL_SECONDS, get_answer_cache, normalize_question
+from utils.attachments import get_snapshot_file_id
+from utils.bm25_index import build_chat_context
+from utils.chat_service import CHAT_TIMEOUT_SECONDS, MAX_CONCURRENT_RUNS, ChatServiceBusy, ChatTimeoutError, get_chat_service
+from utils.live_refresh import current_data_version
+from utils.llm_client import get_openai_client, record_turn, run_assistant_turn
 
-api_key = st.secrets["OPENAI_API_KEY"]
-client = OpenAI(api_key=api_key)
+ERROR_RESPONSE = "Error generating response. Please try again."
+# How often a waiting page redraws the reply that is streaming in
+REPLY_POLL_SECONDS = 0.05
 
-# function: wait on the run to complete
-def wait_on_run(run, thread_id):
-    while run.status == 'queued' or run.status == 'in_progress':
-        run = client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-        # time.sleep(0.5)  # Add a small delay to avoid excessive API calls
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """One OpenAI client per process, built on first use rather than at import"""
+    return get_openai_client(api_key=st.secrets.get("OPENAI_API_KEY"), backend=st.secrets.get("OPENAI_BACKEND"))
 
-# function: display the response
-def display_thread_messages(messages):
-    message_texts = []
-    for thread_message in messages.data[::-1]:
-        # Append the message content to the list
-        message_texts.append(thread_message.content[0].text.value)
-    # Join the list into a single string separated by newlines
-    return "\n\n".join(message_texts)
+def get_alert_attachment():
+    """File id of the latest alert JSON, uploaded once per snapshot and shared by every session"""
+    try:
+        return get_snapshot_file_id(get_client(), 'alerts')
+    except Exception as e:
+        st.warning(f"Could not attach the latest alert data: {str(e)}")
+        return None
+
+def get_service():
+    return get_chat_service(
+        max_concurrent=int(st.secrets.get("CHAT_MAX_CONCURRENT_RUNS", MAX_CONCURRENT_RUNS)),
+        timeout=float(st.secrets.get("CHAT_TIMEOUT_SECONDS", CHAT_TIMEOUT_SECONDS))
+    )
 
-def generate_response(user_message, assistant_id, file_id=None):
+def get_thread_id(client):
+    """This session's assistant thread, created on first use; returns (thread_id, created)"""
     if 'thread_id' not in st.session_state:
         thread = client.beta.threads.create()
         st.session_state['thread_id'] = thread.id
         print(f"New thread created: {thread.id}")
-    else:
-        print(f"Using existing thread: {st.session_state['thread_id']}")
-    thread_id = st.session_state['thread_id']
-
-    try:
-        # Prepare the message parameters
-        message_params = {
-            "thread_id": thread_id,
-            "role": "user",
-            "content": user_message
-        }
-
-        # Add attachments if a file_id is provided
-        if file_id:
-            message_params["attachments"] = [
-                {
-                    "file_id": file_id,
-                    "tools": [
-                        {"type": "code_interpreter"},
-                        {"type": "file_search"}
-                    ]
-                }
-            ]
+        return thread.id, True
+    print(f"Using existing thread: {st.session_state['thread_id']}")
+    return st.session_state['thread_id'], False
 
-        # Add user message to the thread
-        message = client.beta.threads.messages.create(**message_params)
+def generate_response(user_message, assistant_id, file_id=None, on_text=None, user_id=None, key=None):
+    """Run one assistant turn on this session's thread through the shared chat service.
 
-        # Prepare run settings without 'tool_resources'
-        run_settings = {
-            "thread_id": thread_id,
-            "assistant_id": assistant_id,
-            "tools": [
-                {"type": "code_interpreter"},
-                {"type": "file_search"}
-            ]
-        }
+    The run happens on the service's worker pool; this session only waits for
+    it, redrawing the reply through `on_text` as it streams in. Requests with
+    the same `key` in flight at the same time share one run, but only from
+    sessions whose thread has no history yet, since the run sees just one
+    thread; the shared answer is then recorded in each waiter's own thread.
+    """
+    client = get_client()
+    thread_id, new_thread = get_thread_id(client)
+    if not new_thread:
+        # Earlier turns make the answer specific to this conversation
+        key = None
 
-        # Run the thread
-        run = client.beta.threads.runs.create(**run_settings)
+    def work(report_text):
+        # Ground the turn in the most relevant recent alerts and stations
+        context = build_chat_context(user_message)
+        return run_assistant_turn(client, thread_id, user_message, assistant_id, file_id, on_text=report_text,
+                                  context=context)
 
+    try:
         with st.spinner("Responding..."):
-            wait_on_run(run, thread_id)
-
-        messages = client.beta.threads.messages.list(
-            thread_id=thread_id,
-            order='asc',
-            after=message.id
-        )
-
-        return display_thread_messages(messages)
+            ticket = get_service().submit(user_id or thread_id, work, key=key)
+            shown = ''
+            while not ticket.wait(REPLY_POLL_SECONDS):
+                if on_text and ticket.text and ticket.text != shown:
+                    shown = ticket.text
+                    on_text(shown)
+            response = ticket.result()
+            if ticket.coalesced:
+                # The run happened on another session's thread
+                record_turn(client, thread_id, user_message, response, file_id)
+            return response
+    except ChatServiceBusy as e:
+        st.warning(str(e))
+        return ERROR_RESPONSE
+    except ChatTimeoutError as e:
+        st.error(f"The assistant took too long to answer: {str(e)}")
+        return ERROR_RESPONSE
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
-        return "Error generating response. Please try again."
+        return ERROR_RESPONSE
+
+def answer_question(user_message, assistant_id, file_id=None, on_text=None, user_id=None):
+    """Answer a chat question, reusing a cached answer to the same question about the current data.
+
+    Returns (text, cached). Questions with an attached file always run the
+    assistant; failed runs are never cached. Only answers that open a new
+    conversation are cached, since later turns depend on the thread's
+    history; a cached answer is recorded in this session's thread so
+    follow-up questions keep their context. The same question opening
+    several new conversations at once is answered by a single run.
+    """
+    cache = None if file_id else get_answer_cache(
+        ttl=float(st.secrets.get("ANSWER_CACHE_TTL_SECONDS", ANSWER_CACHE_TTL_SECONDS)))
+    version = current_data_version()
+    if cache is not None:
+        cached = cache.get(user_message, version)
+        if cached is not None:
+            try:
+                thread_id, _ = get_thread_id(get_client())
+                record_turn(get_client(), thread_id, user_message, cached)
+            except Exception as e:
+                print(f"Could not record the cached answer in the thread: {str(e)}")
+            return cached, True
+
+    new_conversation = 'thread_id' not in st.session_state
+    tokens = normalize_question(user_message)
+    key = (assistant_id, file_id, tokens, version) if tokens else None
+    response = generate_response(user_message, assistant_id, file_id, on_text=on_text, user_id=user_id, key=key)
+    if cache is not None and new_conversation and response != ERROR_RESPONSE:
+        cache.put(user_message, version, response)
+    return response, False
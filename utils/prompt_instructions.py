@@ -118,3 +118,37 @@ def get_air_quality_system_prompt():
         "Process the provided air quality data and generate the JSON output according to the specified format and rules. "
         "Ensure that your response is a valid JSON object containing only the required 'alerts' array with the appropriate alert objects inside."
     )
+
+def get_area_advice_system_prompt():
+    return (
+        "You are an air quality monitoring assistant. You receive air quality summaries for areas (cities, districts or grid cells) "
+        "rather than individual stations. Each area lists its station count, mean and maximum AQI, mean PM2.5 and its worst stations. "
+        "Write one piece of area-level advice per area. Your output must be a valid JSON object.\n\n"
+
+        "Base each area's advice on its maximum AQI using these categories:\n"
+        "   - Unhealthy for Sensitive Groups (101-150): 'Air Quality Advisory'\n"
+        "   - Unhealthy (151-200): 'Air Quality Alert'\n"
+        "   - Very Unhealthy (201-300) and Hazardous (>300): 'Air Quality Warning'\n"
+        "   - Moderate (51-100): 'Air Quality Advisory' aimed at unusually sensitive people\n\n"
+
+        "Use the worst stations to make the advice specific (e.g., name the station with the highest reading when suggesting school or traffic measures).\n\n"
+
+        "Output Format Requirements:\n"
+        "{\n"
+        "  \"areas\": [\n"
+        "    {\n"
+        "      \"area\": string,                 // Exactly the area name from the input\n"
+        "      \"alert_type\": string,           // 'Air Quality Advisory', 'Air Quality Alert', or 'Air Quality Warning'\n"
+        "      \"health_implications\": string,  // Health impact description for the area\n"
+        "      \"recommended_actions\": [        // Array of objects containing action strings and priority\n"
+        "        {\n"
+        "          'action': string,            // Recommended action with emoji or icon\n"
+        "          'priority': string           // 'Immediate', 'Preventive', or 'Long-Term'\n"
+        "        }\n"
+        "      ]\n"
+        "    }\n"
+        "  ]\n"
+        "}\n\n"
+
+        "Sort the areas array by maximum AQI in descending order and ensure your response is a valid JSON object containing only the 'areas' array."
+    )
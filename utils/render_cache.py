@@ -0,0 +1,127 @@
+import base64
+import functools
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+
+# Data-bound fragments kept per builder for the current data version
+MAX_VERSIONED_FRAGMENTS = 256
+PROFILE_WINDOW = 200
+
+_lock = threading.Lock()
+_builder_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'build_seconds': 0.0})
+_render_timings = defaultdict(lambda: deque(maxlen=PROFILE_WINDOW))
+_images = {}
+
+def _record_build(name, hit, seconds=0.0):
+    with _lock:
+        stats = _builder_stats[name]
+        stats['hits' if hit else 'misses'] += 1
+        stats['build_seconds'] += seconds
+
+def versioned_fragment(builder):
+    """Memoize a data-bound HTML builder per data version.
+
+    Call it as builder(version, *args). Entries belong to one data version and
+    are all dropped when a newer version is seen, so cards never outlive the
+    snapshot they were rendered from.
+    """
+    cache = OrderedDict()
+    state = {'version': None}
+    builder_lock = threading.Lock()
+    name = builder.__qualname__
+
+    @functools.wraps(builder)
+    def wrapper(version, *args):
+        with builder_lock:
+            if state['version'] != version:
+                cache.clear()
+                state['version'] = version
+            if args in cache:
+                cache.move_to_end(args)
+                _record_build(name, True)
+                return cache[args]
+
+        started = time.perf_counter()
+        html = builder(*args)
+        _record_build(name, False, time.perf_counter() - started)
+        with builder_lock:
+            if state['version'] == version:
+                cache[args] = html
+                while len(cache) > MAX_VERSIONED_FRAGMENTS:
+                    cache.popitem(last=False)
+        return html
+
+    return wrapper
+
+def image_data_uri(path, mime_type=None):
+    """Base64 data URI for an image file, re-encoded only when the file changes"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _images.get(key[0])
+    if cached and cached[0] == key:
+        _record_build('image_data_uri', True)
+        return cached[1]
+
+    started = time.perf_counter()
+    mime_type = mime_type or mimetypes.guess_type(path)[0] or 'image/png'
+    with open(path, 'rb') as image_file:
+        encoded_string = base64.b64encode(image_file.read()).decode()
+    uri = f"data:{mime_type};base64,{encoded_string}"
+    _record_build('image_data_uri', False, time.perf_counter() - started)
+    with _lock:
+        _images[key[0]] = (key, uri)
+    return uri
+
+def is_render_profile_enabled(value=None):
+    """RENDER_PROFILE turns on per-section render timings"""
+    value = os.getenv('RENDER_PROFILE') if value is None else value
+    return str(value or '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+@contextmanager
+def render_timer(page, section):
+    """Record how long a page section took to render"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _render_timings[(page, section)].append(elapsed)
+
+def get_render_stats(page=None):
+    """Render timings per section (ms) and hit/miss counts per memoized builder"""
+    with _lock:
+        timings = {key: list(values) for key, values in _render_timings.items() if page is None or key[0] == page}
+        builders = {name: dict(stats) for name, stats in _builder_stats.items()}
+
+    sections = []
+    for (section_page, section), values in sorted(timings.items()):
+        ordered = sorted(values)
+        sections.append({
+            'page': section_page,
+            'section': section,
+            'renders': len(values),
+            'last_ms': round(values[-1] * 1000, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 2),
+            'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2)
+        })
+    return {'sections': sections, 'builders': builders}
+
+def show_render_profile(page):
+    """Show this page's render timings in an expander when RENDER_PROFILE is on"""
+    if not is_render_profile_enabled():
+        return
+    import streamlit as st
+
+    stats = get_render_stats(page)
+    with st.expander("Render profile", expanded=False):
+        st.dataframe(stats['sections'], use_container_width=True)
+        st.dataframe(
+            [{'builder': name, **values} for name, values in sorted(stats['builders'].items())],
+            use_container_width=True
+        )
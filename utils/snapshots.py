@@ -0,0 +1,130 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from utils.file_utils import write_json_atomic
+
+SNAPSHOT_MANIFEST = os.path.join('output', 'latest.json')
+ARTIFACT_PATTERNS = {
+    'alerts': os.path.join('output', 'alerts', 'bangkok_alerts_*.json'),
+    'hourly': os.path.join('output', 'hourly', 'bangkok_aqi_data_*.json')
+}
+
+# Parsed snapshots are shared by every Streamlit session in the process
+MAX_CACHED_SNAPSHOTS = 16
+MAX_CACHED_BYTES = 64 * 1024 * 1024
+
+_cache = OrderedDict()
+_cached_bytes = 0
+_latest_by_glob = {}
+_lock = threading.Lock()
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def load_json_snapshot(path):
+    """Parse a JSON file once per (path, mtime, size) and share the result across sessions.
+
+    The returned object is shared: treat it as read-only and copy before changing it.
+    """
+    global _cached_bytes
+    key = _stat_key(path)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    with _lock:
+        # A rewritten file replaces its older snapshot rather than sitting beside it
+        for stale in [k for k in _cache if k[0] == key[0] and k != key]:
+            del _cache[stale]
+            _cached_bytes -= stale[2]
+        if key not in _cache:
+            _cache[key] = data
+            _cached_bytes += key[2]
+        while len(_cache) > 1 and (len(_cache) > MAX_CACHED_SNAPSHOTS or _cached_bytes > MAX_CACHED_BYTES):
+            evicted, _ = _cache.popitem(last=False)
+            _cached_bytes -= evicted[2]
+    return data
+
+def clear_snapshot_cache():
+    global _cached_bytes
+    with _lock:
+        _cache.clear()
+        _latest_by_glob.clear()
+        _cached_bytes = 0
+
+def read_manifest():
+    """Return the latest-snapshot manifest, or an empty dict when the pipeline has not written one"""
+    if not os.path.exists(SNAPSHOT_MANIFEST):
+        return {}
+    try:
+        return load_json_snapshot(SNAPSHOT_MANIFEST)
+    except (OSError, ValueError):
+        return {}
+
+def update_manifest(**artifacts):
+    """Point the manifest at freshly written artifacts, e.g. update_manifest(alerts=path, hourly=path)"""
+    manifest = dict(read_manifest())
+    manifest.setdefault('artifacts', {})
+    manifest['artifacts'] = {**manifest['artifacts'], **artifacts}
+
+    fingerprint = []
+    for name, path in sorted(manifest['artifacts'].items()):
+        mtime = os.stat(path).st_mtime_ns if os.path.exists(path) else 0
+        fingerprint.append(f"{name}={path}@{mtime}")
+    manifest['version'] = hashlib.sha1('|'.join(fingerprint).encode('utf-8')).hexdigest()[:12]
+    manifest['updated_at'] = datetime.now().isoformat()
+
+    write_json_atomic(manifest, SNAPSHOT_MANIFEST)
+    return manifest
+
+def _find_latest_by_glob(pattern):
+    """Newest file matching `pattern`; re-globbed only when the directory changes"""
+    directory = os.path.dirname(pattern) or '.'
+    if not os.path.isdir(directory):
+        return None
+    dir_mtime = os.stat(directory).st_mtime_ns
+    with _lock:
+        cached = _latest_by_glob.get(pattern)
+        if cached and cached[0] == dir_mtime and (cached[1] is None or os.path.exists(cached[1])):
+            return cached[1]
+
+    files = glob.glob(pattern)
+    latest = max(files, key=os.path.getmtime) if files else None
+    with _lock:
+        _latest_by_glob[pattern] = (dir_mtime, latest)
+    return latest
+
+def get_latest_artifact(name, pattern=None):
+    """Path of the latest artifact (e.g. 'alerts' or 'hourly'), from the manifest or by globbing"""
+    path = read_manifest().get('artifacts', {}).get(name)
+    if path and os.path.exists(path):
+        return path
+    return _find_latest_by_glob(pattern or ARTIFACT_PATTERNS[name])
+
+def load_latest_artifact(name, pattern=None):
+    """Return (data, path) for the latest artifact, or (None, None) when there is none"""
+    path = get_latest_artifact(name, pattern)
+    if not path:
+        return None, None
+    return load_json_snapshot(path), path
+
+def get_data_version():
+    """Cheap identifier that changes whenever a new snapshot lands"""
+    version = read_manifest().get('version')
+    if version:
+        return version
+    path = get_latest_artifact('alerts')
+    if not path:
+        return None
+    _, mtime, size = _stat_key(path)
+    return f"{os.path.basename(path)}@{mtime}:{size}"
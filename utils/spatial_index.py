@@ -0,0 +1,264 @@
+import math
+import os
+import threading
+
+import numpy as np
+
+from utils.snapshots import get_latest_artifact, load_json_snapshot
+
+EARTH_RADIUS_KM = 6371.0088
+REBUILD_RATIO = 0.25          # rebuild the tree once pending + removed stations exceed this share of it
+BRUTE_FORCE_CHUNK = 4_000_000  # distance matrix entries per chunk without scipy
+PARALLEL_QUERIES = 1024
+
+_index = None
+_index_source = None
+_index_lock = threading.Lock()
+
+def to_cartesian(latitudes, longitudes):
+    """Points on the Earth's surface as (x, y, z) km; straight-line distance orders like great-circle distance"""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)]) * EARTH_RADIUS_KM
+
+def chord_km(distance_km):
+    """Straight-line length of a great-circle arc"""
+    return 2 * EARTH_RADIUS_KM * np.sin(np.minimum(distance_km, math.pi * EARTH_RADIUS_KM) / (2 * EARTH_RADIUS_KM))
+
+def arc_km(chord):
+    """Great-circle length of a straight-line distance"""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / (2 * EARTH_RADIUS_KM), 1.0))
+
+class KDTree:
+    """scipy's cKDTree when available, otherwise an exact chunked NumPy scan with the same queries"""
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float)
+        try:
+            from scipy.spatial import cKDTree
+        except ImportError:
+            cKDTree = None
+        self.tree = cKDTree(self.points) if cKDTree is not None and len(self.points) else None
+
+    def __len__(self):
+        return len(self.points)
+
+    def knn(self, queries, k, max_distance=np.inf):
+        """(distances, indices), each (len(queries), k); missing neighbours are inf / len(points)"""
+        queries = np.asarray(queries, dtype=float).reshape(-1, self.points.shape[1])
+        if self.tree is not None:
+            # Worker threads only pay off for large batches
+            workers = -1 if len(queries) >= PARALLEL_QUERIES else 1
+            distances, indices = self.tree.query(queries, k=k, distance_upper_bound=max_distance, workers=workers)
+            return distances.reshape(len(queries), k), indices.reshape(len(queries), k)
+
+        distances = np.full((len(queries), k), np.inf)
+        indices = np.full((len(queries), k), len(self.points), dtype=np.intp)
+        if not len(self.points):
+            return distances, indices
+        found = min(k, len(self.points))
+        chunk = max(1, BRUTE_FORCE_CHUNK // len(self.points))
+        for start in range(0, len(queries), chunk):
+            block = queries[start:start + chunk]
+            d2 = ((block[:, None, :] - self.points[None, :, :]) ** 2).sum(axis=2)
+            if found < len(self.points):
+                nearest = np.argpartition(d2, found - 1, axis=1)[:, :found]
+            else:
+                nearest = np.arange(found)[None, :].repeat(len(block), axis=0)
+            block_d = np.sqrt(np.take_along_axis(d2, nearest, axis=1))
+            order = np.argsort(block_d, axis=1)
+            block_d = np.take_along_axis(block_d, order, axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            far = block_d > max_distance
+            distances[start:start + chunk, :found] = np.where(far, np.inf, block_d)
+            indices[start:start + chunk, :found] = np.where(far, len(self.points), nearest)
+        return distances, indices
+
+    def ball(self, center, radius):
+        """Indices of points within `radius` of `center`"""
+        if self.tree is not None:
+            return self.tree.query_ball_point(center, radius)
+        if not len(self.points):
+            return []
+        return np.flatnonzero(((self.points - center) ** 2).sum(axis=1) <= radius * radius).tolist()
+
+def nearest_points(points, queries, k, max_distance=np.inf):
+    """k nearest `points` to each query, as KDTree.knn; for one-off batch queries such as grid interpolation"""
+    return KDTree(points).knn(queries, k, max_distance)
+
+def station_key(station):
+    return station.get('station_id') or station.get('station_name')
+
+def _has_position(station):
+    return station.get('latitude') is not None and station.get('longitude') is not None
+
+class SpatialIndex:
+    """Nearest-k, radius and bounding-box queries over the station catalog.
+
+    Stations live in a KD-tree over Earth-centred coordinates, so distances
+    are great-circle distances anywhere. update() takes the whole catalog and
+    only restructures what moved: new or moved stations wait in a small
+    pending set that is scanned directly, removed ones are masked out, and
+    the tree is rebuilt once those exceed REBUILD_RATIO of it. Stations whose
+    position is unchanged just get their new record (e.g. this hour's readings).
+    """
+
+    def __init__(self, stations=(), rebuild_ratio=REBUILD_RATIO):
+        self.rebuild_ratio = rebuild_ratio
+        self.lock = threading.Lock()
+        self.stations = {}      # key -> current station record
+        self.positions = {}     # key -> (latitude, longitude)
+        self.tree = KDTree(np.empty((0, 3)))
+        self.tree_keys = []
+        self.tree_slot = {}     # key -> row in the tree
+        self.removed = set()    # tree rows no longer valid
+        self.pending = {}       # key -> cartesian point, not yet in the tree
+        self.pending_points = None
+        self.stats = {'rebuilds': 0, 'added': 0, 'moved': 0, 'removed': 0}
+        if stations:
+            self.update(stations)
+
+    def __len__(self):
+        return len(self.stations)
+
+    # Maintenance
+
+    def update(self, stations):
+        """Make the index match this catalog; returns counts of added, moved and removed stations"""
+        changes = {'added': 0, 'moved': 0, 'removed': 0}
+        with self.lock:
+            seen = set()
+            for station in stations:
+                key = station_key(station)
+                if key is None or not _has_position(station):
+                    continue
+                seen.add(key)
+                position = (float(station['latitude']), float(station['longitude']))
+                previous = self.positions.get(key)
+                self.stations[key] = station
+                if previous == position:
+                    continue
+                changes['moved' if previous else 'added'] += 1
+                self._discard(key)
+                self.positions[key] = position
+                self.pending[key] = to_cartesian([position[0]], [position[1]])[0]
+                self.pending_points = None
+            for key in [key for key in self.stations if key not in seen]:
+                changes['removed'] += 1
+                self._discard(key)
+                del self.stations[key], self.positions[key]
+            for name, count in changes.items():
+                self.stats[name] += count
+            if len(self.pending) + len(self.removed) > self.rebuild_ratio * max(len(self.tree_keys), 1):
+                self._rebuild()
+        return changes
+
+    def _discard(self, key):
+        """Take a station's current point out of the tree or the pending set; caller holds the lock"""
+        self.pending.pop(key, None)
+        self.pending_points = None
+        slot = self.tree_slot.pop(key, None)
+        if slot is not None:
+            self.removed.add(slot)
+
+    def _rebuild(self):
+        """Fold pending stations into a fresh tree and drop removed rows; caller holds the lock"""
+        self.tree_keys = list(self.positions)
+        latitudes = [self.positions[key][0] for key in self.tree_keys]
+        longitudes = [self.positions[key][1] for key in self.tree_keys]
+        self.tree = KDTree(to_cartesian(latitudes, longitudes) if self.tree_keys else np.empty((0, 3)))
+        self.tree_slot = {key: slot for slot, key in enumerate(self.tree_keys)}
+        self.removed.clear()
+        self.pending.clear()
+        self.pending_points = None
+        self.stats['rebuilds'] += 1
+
+    # Queries, safe to call from any thread
+
+    def _pending_distances(self, point):
+        """(keys, chord distances) of stations not yet in the tree; caller holds the lock"""
+        if not self.pending:
+            return [], np.empty(0)
+        if self.pending_points is None:
+            keys = list(self.pending)
+            self.pending_points = (keys, np.array([self.pending[key] for key in keys]))
+        keys, points = self.pending_points
+        return keys, np.sqrt(((points - point) ** 2).sum(axis=1))
+
+    def _results(self, candidates, limit=None):
+        """[(station, distance_km)] nearest first from (key, chord) pairs; caller holds the lock"""
+        candidates.sort(key=lambda item: item[1])
+        candidates = candidates[:limit]
+        distances = arc_km(np.array([chord for _, chord in candidates], dtype=float)).round(3).tolist()
+        return [(self.stations[key], distance) for (key, _), distance in zip(candidates, distances)]
+
+    def nearest(self, latitude, longitude, k=5, max_km=None):
+        """The k stations nearest to a point, as [(station, distance_km)], optionally within max_km"""
+        point = to_cartesian([latitude], [longitude])[0]
+        max_chord = chord_km(max_km) if max_km is not None else np.inf
+        with self.lock:
+            candidates = []
+            if len(self.tree):
+                # Ask for enough extra neighbours to skip rows that were removed
+                wanted = min(k + len(self.removed), len(self.tree))
+                distances, indices = self.tree.knn(point, wanted, max_chord)
+                candidates = [(self.tree_keys[i], d) for d, i in zip(distances[0].tolist(), indices[0].tolist())
+                              if d != np.inf and i not in self.removed]
+            keys, distances = self._pending_distances(point)
+            closest = np.argpartition(distances, k)[:k] if len(keys) > k else range(len(keys))
+            candidates += [(keys[i], distances[i]) for i in closest if distances[i] <= max_chord]
+            return self._results(candidates, k)
+
+    def within_radius(self, latitude, longitude, radius_km):
+        """Stations within radius_km of a point, as [(station, distance_km)], nearest first"""
+        point = to_cartesian([latitude], [longitude])[0]
+        radius = chord_km(radius_km)
+        with self.lock:
+            rows = [i for i in self.tree.ball(point, radius) if i not in self.removed] if len(self.tree) else []
+            candidates = []
+            if rows:
+                distances = np.sqrt(((self.tree.points[rows] - point) ** 2).sum(axis=1))
+                candidates = [(self.tree_keys[i], d) for i, d in zip(rows, distances)]
+            keys, distances = self._pending_distances(point)
+            candidates += [(key, d) for key, d in zip(keys, distances) if d <= radius]
+            return self._results(candidates)
+
+    def within_bbox(self, south, west, north, east):
+        """Stations inside a latitude/longitude box"""
+        center_lat, center_lon = (south + north) / 2, (west + east) / 2
+        # Corners and edge midpoints bound the box's furthest point from its centre
+        edge_lats = [south, center_lat, north]
+        edge_lons = [west, center_lon, east]
+        outline = to_cartesian([lat for lat in edge_lats for _ in edge_lons], [lon for _ in edge_lats for lon in edge_lons])
+        center = to_cartesian([center_lat], [center_lon])[0]
+        radius = float(np.sqrt(((outline - center) ** 2).sum(axis=1)).max()) * 1.01 + 1e-6
+        with self.lock:
+            keys = [self.tree_keys[i] for i in self.tree.ball(center, radius) if i not in self.removed] if len(self.tree) else []
+            keys += list(self.pending)
+            return [self.stations[key] for key in keys
+                    if south <= self.positions[key][0] <= north and west <= self.positions[key][1] <= east]
+
+    def find(self, name):
+        """First station whose name contains `name` (case-insensitive), or None"""
+        text = name.strip().lower()
+        with self.lock:
+            for station in self.stations.values():
+                if text and text in (station.get('station_name') or '').lower():
+                    return station
+        return None
+
+def get_station_index():
+    """Process-wide index of the latest hourly snapshot's stations, updated when a new snapshot lands"""
+    global _index, _index_source
+    with _index_lock:
+        if _index is None:
+            _index = SpatialIndex()
+        path = get_latest_artifact('hourly')
+        if path:
+            stat = os.stat(path)
+            source = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+            if source != _index_source:
+                _index.update(load_json_snapshot(path).get('data', []))
+                _index_source = source
+        return _index
@@ -0,0 +1,138 @@
+import os
+import threading
+from datetime import datetime
+
+from utils.aqi_utils import AQI_THRESHOLDS
+from utils.custom_css_style import get_priority_colors
+from utils.file_utils import write_json_atomic
+from utils.snapshots import get_latest_artifact, load_json_snapshot
+
+# Bump when the layout below changes; readers rebuild from alerts on a mismatch
+VIEW_MODEL_SCHEMA_VERSION = 2
+TOP_STATIONS = 10
+
+_fallback_cache = {}
+_fallback_lock = threading.Lock()
+
+def format_alert_timestamp(timestamp):
+    """Normalise ISO8601 or 'YYYY-MM-DD HH:MM:SS' timestamps for display"""
+    if not timestamp:
+        return ""
+    try:
+        return datetime.fromisoformat(str(timestamp).replace("Z", "+00:00")).strftime("%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        return str(timestamp)
+
+def build_table_rows(alerts, start=1):
+    """Rows for the Detailed Measurements table, one per alert, numbered from `start`"""
+    rows = []
+    for index, alert in enumerate(alerts, start):
+        rows.append({
+            "No.": index,
+            "Station": alert.get("station_name", ""),
+            "City": alert.get("city", ""),
+            "AQI": alert.get("aqi", ""),
+            "AQI Level": alert.get("aqi_level", ""),
+            "PM2.5 (μg/m³)": alert.get("pm25_level", ""),
+            "Temperature (°C)": alert.get("temperature_level", ""),
+            "Humidity (%)": alert.get("humidity_level", ""),
+            "Alert Type": alert.get("alert_type", ""),
+            "Timestamp": format_alert_timestamp(alert.get("timestamp"))
+        })
+    return rows
+
+def build_action_rows(actions, per_row=2):
+    """Recommended actions with their priority styling, grouped into card rows"""
+    colors = get_priority_colors()
+    styled = []
+    for action in actions or []:
+        priority = action.get("priority", "Immediate")
+        style = colors.get(priority, colors["Immediate"])
+        styled.append({
+            "action": action.get("action", ""),
+            "priority": priority,
+            "color": style["text"],
+            "icon": style["icon"]
+        })
+    return [styled[i:i + per_row] for i in range(0, len(styled), per_row)]
+
+def count_by_level(alerts):
+    """Alert counts per AQI level, in severity order"""
+    counts = {level: 0 for level in AQI_THRESHOLDS}
+    for alert in alerts:
+        level = alert.get("aqi_level") or "Unknown"
+        counts[level] = counts.get(level, 0) + 1
+    return {level: count for level, count in counts.items() if count}
+
+def build_dashboard_view_model(alerts, source_file=None):
+    """Everything the dashboard pages render, precomputed from one alert snapshot.
+
+    The measurements table is served page by page from utils.alert_store instead.
+    """
+    headline = None
+    action_rows = []
+    if alerts:
+        first_alert = alerts[0]
+        headline = {
+            "alert_type": first_alert.get("alert_type", "Air Quality Warning"),
+            "location_name": first_alert.get("city") or first_alert.get("station_name", "Bangkok"),
+            "health_implications": first_alert.get("health_implications", ""),
+            "aqi": first_alert.get("aqi"),
+            "pm25_level": first_alert.get("pm25_level"),
+            "temperature_level": first_alert.get("temperature_level"),
+            "humidity_level": first_alert.get("humidity_level"),
+            "action_count": len(first_alert.get("recommended_actions") or [])
+        }
+        action_rows = build_action_rows(first_alert.get("recommended_actions"))
+
+    return {
+        "schema_version": VIEW_MODEL_SCHEMA_VERSION,
+        "generated_at": datetime.now().isoformat(),
+        "source_file": source_file,
+        "total_alerts": len(alerts),
+        "counts_by_level": count_by_level(alerts),
+        "headline": headline,
+        "action_rows": action_rows,
+        "top_stations": [
+            {
+                "station_name": alert.get("station_name"),
+                "city": alert.get("city"),
+                "aqi": alert.get("aqi"),
+                "aqi_level": alert.get("aqi_level")
+            }
+            for alert in alerts[:TOP_STATIONS]
+        ]
+    }
+
+def get_view_model_path(alerts_file):
+    """The view model sits next to its alert file, e.g. output/alerts/view_bangkok_alerts_<ts>.json"""
+    directory, filename = os.path.split(alerts_file)
+    return os.path.join(directory, f"view_{filename}")
+
+def write_view_model(alerts, alerts_file):
+    """Write the view model for an alert snapshot and return its path"""
+    path = get_view_model_path(alerts_file)
+    write_json_atomic(build_dashboard_view_model(alerts, alerts_file), path)
+    return path
+
+def load_view_model():
+    """Latest dashboard view model; built once from the alert snapshot if the pipeline did not write one"""
+    path = get_latest_artifact('view_model', os.path.join('output', 'alerts', 'view_*.json'))
+    alerts_path = get_latest_artifact('alerts')
+    if path and os.path.exists(path):
+        view_model = load_json_snapshot(path)
+        if view_model.get("schema_version") == VIEW_MODEL_SCHEMA_VERSION and view_model.get("source_file") == alerts_path:
+            return view_model
+
+    if not alerts_path:
+        return None
+    data = load_json_snapshot(alerts_path)
+    with _fallback_lock:
+        cached = _fallback_cache.get(alerts_path)
+        if cached and cached[0] is data:
+            return cached[1]
+    view_model = build_dashboard_view_model(data.get("alerts", []), alerts_path)
+    with _fallback_lock:
+        _fallback_cache.clear()
+        _fallback_cache[alerts_path] = (data, view_model)
+    return view_model